@@ -171,5 +171,53 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'Web_Project/static')] # O la ruta do
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'mediafiles') # Carpeta para archivos media en producción
 
+# --- Caché de PDFs de facturas (sales/cache_pdf.py) ---
+# Fuera de MEDIA_ROOT para que no se sirvan como archivos públicos
+FACTURAS_PDF_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'facturas_pdf')
+FACTURAS_PDF_CACHE_MAX_BYTES = config('FACTURAS_PDF_CACHE_MAX_MB', default=200, cast=int) * 1024 * 1024
+# Cada cuánto vuelve a medir la caché un proceso aunque no haya pasado del máximo (cubre lo de los demás)
+FACTURAS_PDF_CACHE_REVISAR_SEGUNDOS = config('FACTURAS_PDF_CACHE_REVISAR_SEGUNDOS', default=300, cast=float)
+
+# --- Envío de facturas por email (sales/envios.py) ---
+# Máximo de correos por segundo por worker sobre la misma conexión SMTP (0 = sin límite)
+FACTURAS_EMAILS_POR_SEGUNDO = config('FACTURAS_EMAILS_POR_SEGUNDO', default=5, cast=float)
+
+# --- Caché de catálogos: proveedores, marcas, categorías, formas de pago (uglobals/catalogos.py) ---
+# Alias de CACHES compartido entre procesos (p. ej. Redis o Memcached); vacío = solo memoria por proceso
+CATALOGOS_CACHE_ALIAS = config('CATALOGOS_CACHE_ALIAS', default='')
+# Cada cuánto vuelve a mirar un proceso si otro cambió un catálogo
+CATALOGOS_CACHE_REVALIDAR_SEGUNDOS = config('CATALOGOS_CACHE_REVALIDAR_SEGUNDOS', default=5, cast=float)
+CATALOGOS_CACHE_MAX_LOCAL = 32 # Versiones de catálogos guardadas en memoria por proceso
+
+# --- Búsqueda de productos (products/busqueda.py) ---
+BUSQUEDA_PRODUCTOS_MAX_RESULTADOS = 100 # Resultados de ?search=, ordenados por relevancia
+# Con MySQL el índice FULLTEXT de la búsqueda necesita en el servidor (my.cnf, [mysqld]):
+#   innodb_ft_min_token_size = 1  (por defecto 3: descarta las palabras de una o dos letras, p. ej. '6m')
+# Es de arranque: después de cambiarlo, reiniciar y correr 'manage.py reindexar_busqueda --indice'.
+# Las stopwords no hace falta tocarlas: el índice se crea sin ellas (products/busqueda.py).
+
+# --- Autocompletado del POS (products/autocompletar.py): índice de prefijos en memoria por proceso ---
+PRODUCTOS_LOOKUP_RESULTADOS = 10 # Resultados por defecto de /api/productos/lookup/
+PRODUCTOS_LOOKUP_MAX_RESULTADOS = 50 # Máximo que se puede pedir con ?limite=
+# Cada cuánto pide un proceso los productos modificados
+PRODUCTOS_LOOKUP_REFRESCO_SEGUNDOS = config('PRODUCTOS_LOOKUP_REFRESCO_SEGUNDOS', default=2, cast=float)
+# Margen hacia atrás al pedir productos modificados (autocompletado y escaneo)
+PRODUCTOS_CAMBIOS_MARGEN_SEGUNDOS = 30
+# Cada cuánto se reconstruye el índice completo (cubre cambios hechos sin fecha_actualizacion)
+PRODUCTOS_LOOKUP_RECONSTRUIR_SEGUNDOS = config('PRODUCTOS_LOOKUP_RECONSTRUIR_SEGUNDOS', default=900, cast=float)
+
+# --- Escaneo en caja (products/escaneo.py): LRU por proceso de las referencias más escaneadas ---
+ESCANEO_CACHE_MAX = config('ESCANEO_CACHE_MAX', default=5000, cast=int)
+# Cada cuánto mira un proceso si otro cambió productos que tiene guardados
+ESCANEO_CACHE_REVALIDAR_SEGUNDOS = config('ESCANEO_CACHE_REVALIDAR_SEGUNDOS', default=2, cast=float)
+ESCANEO_MAX_REFERENCIAS = 100 # Referencias por petición en el escaneo por lotes
+
+# --- Variantes de las imágenes de productos (products/imagenes.py, worker procesar_imagenes) ---
+PRODUCTOS_IMAGENES_VARIANTES = {'miniatura': 160, 'mediana': 640} # Lado mayor en píxeles
+PRODUCTOS_IMAGENES_CALIDAD = 80 # WebP y JPEG
+# Las variantes se nombran por su contenido y no cambian nunca: caché de un año. En producción
+# el servidor web debe mandar el mismo Cache-Control para MEDIA_URL + 'productos/variantes/'
+PRODUCTOS_IMAGENES_CACHE_SEGUNDOS = 365 * 24 * 3600
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
@@ -1,9 +1,10 @@
 # WEB_PROJECT/urls.py (archivo principal del proyecto)
 
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from rest_framework_simplejwt.views import TokenRefreshView
 from users.views import MyTokenObtainPairView # Make sure this import is correct
+from products.views import servir_variante_imagen
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -13,4 +14,8 @@ urlpatterns = [
 ]
 # NO USAR EN PRODUCCIÓN, para producción se usa un servidor web (Nginx, Apache)
 if settings.DEBUG:
+    # Variantes de imágenes de productos con Cache-Control de un año, antes que el resto de media
+    urlpatterns += [
+        re_path(r'^%s(?P<ruta>productos/variantes/.+)$' % settings.MEDIA_URL.lstrip('/'), servir_variante_imagen),
+    ]
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -1,5 +1,24 @@
 # products/admin.py
 from django.contrib import admin
-from .models import Producto
+from .models import MovimientoStock, Producto
 
-admin.site.register(Producto)
\ No newline at end of file
+admin.site.register(Producto)
+
+
+# El kardex solo se consulta: los movimientos los escribe products/stock.py
+@admin.register(MovimientoStock)
+class MovimientoStockAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'producto', 'tipo', 'cantidad', 'documento')
+    list_filter = ('tipo',)
+    search_fields = ('producto__nombre', 'producto__referencia_producto', 'documento')
+    date_hierarchy = 'fecha'
+    raw_id_fields = ('producto',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,188 @@
+# products/autocompletar.py
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .busqueda import normalizar
+from .models import Producto, ProductoBorrado
+
+# Autocompletado del POS (GET /api/productos/lookup/?q=): en cada proceso hay un índice en
+# memoria con los productos activos, sin consultar la base de datos en cada tecla.
+#   - _claves: lista ordenada de (palabra, id) con la referencia y cada palabra del nombre
+#     ya normalizadas; un prefijo es un rango contiguo que se encuentra con bisect.
+#   - _filas: id -> (id, referencia, nombre, precio_sugerido_venta, stock), lo que se responde.
+#   - _textos: id -> sus palabras, para comprobar las demás palabras de la consulta.
+# Se refresca como mucho cada PRODUCTOS_LOOKUP_REFRESCO_SEGUNDOS leyendo solo los productos
+# con fecha_actualizacion reciente (las ventas y devoluciones también la tocan, así el stock
+# se mantiene al día) y los ids de ProductoBorrado anotados desde entonces, que cubren los
+# borrados hechos en cualquier proceso.
+
+COLUMNAS = ('id', 'referencia_producto', 'nombre', 'precio_sugerido_venta', 'stock')
+MAX_CAMBIOS_INCREMENTALES = 2000 # Con más cambios que estos se reordena la lista entera
+MAX_CLAVES_REVISADAS = 2000 # Tope de claves recorridas por búsqueda (prefijos muy cortos)
+
+
+def _texto(referencia, nombre):
+    # ' palabra1 palabra2 ...' sin repetidas: "alguna palabra empieza por p" es buscar ' p'
+    return ' ' + ' '.join(dict.fromkeys(normalizar(f'{referencia} {nombre}').split()))
+
+
+def _ordenar(textos):
+    return sorted((palabra, producto_id) for producto_id, texto in textos.items() for palabra in texto.split())
+
+
+class IndicePrefijos:
+    def __init__(self):
+        self._lock = threading.Lock() # Protege las estructuras (lecturas y cambios)
+        self._lock_refresco = threading.Lock() # Un solo hilo consulta la base de datos a la vez
+        self._filas = {}
+        self._textos = {}
+        self._claves = []
+        self._construido = False
+        self._desde = None # Momento desde el que se piden cambios en el próximo refresco
+        self._proximo_refresco = 0
+        self._proxima_reconstruccion = 0
+
+    def buscar(self, consulta, limite):
+        """
+        Hasta 'limite' filas de productos activos cuya referencia o alguna palabra del nombre
+        empieza por cada palabra de 'consulta', en orden alfabético de la palabra encontrada.
+        """
+        palabras = normalizar(consulta).split()
+        if not palabras:
+            return []
+        self.refrescar()
+        resultado = []
+        vistos = set()
+        with self._lock:
+            # Se recorre el rango de la palabra con menos claves; las demás se comprueban
+            rangos = {palabra: self._rango(palabra) for palabra in palabras}
+            principal = min(rangos, key=lambda palabra: rangos[palabra][1] - rangos[palabra][0])
+            resto = [' ' + palabra for palabra in rangos if palabra != principal]
+            posicion, fin = rangos[principal]
+            fin = min(fin, posicion + MAX_CLAVES_REVISADAS)
+            while posicion < fin and len(resultado) < limite:
+                producto_id = self._claves[posicion][1]
+                posicion += 1
+                if producto_id in vistos:
+                    continue
+                vistos.add(producto_id)
+                texto = self._textos[producto_id]
+                if all(palabra in texto for palabra in resto):
+                    resultado.append(self._filas[producto_id])
+        return resultado
+
+    def _rango(self, prefijo):
+        # Posiciones [inicio, fin) de las claves que empiezan por 'prefijo'
+        return bisect_left(self._claves, (prefijo,)), bisect_left(self._claves, (prefijo + '\U0010ffff',))
+
+    def refrescar(self, forzar=False):
+        ahora = time.monotonic()
+        if not forzar and self._construido and ahora < self._proximo_refresco:
+            return
+        # Mientras otro hilo refresca se responde con lo que ya hay (salvo la primera vez)
+        if not self._lock_refresco.acquire(blocking=not self._construido):
+            return
+        try:
+            if not forzar and self._construido and ahora < self._proximo_refresco:
+                return
+            if not self._construido or ahora >= self._proxima_reconstruccion:
+                self._reconstruir()
+            else:
+                self._aplicar_cambios()
+            self._proximo_refresco = time.monotonic() + settings.PRODUCTOS_LOOKUP_REFRESCO_SEGUNDOS
+        finally:
+            self._lock_refresco.release()
+
+    def _reconstruir(self):
+        desde = timezone.now()
+        filas = {fila[0]: fila for fila in Producto.objects.filter(activo=True).values_list(*COLUMNAS).iterator(chunk_size=5000)}
+        textos = {producto_id: _texto(fila[1], fila[2]) for producto_id, fila in filas.items()}
+        with self._lock:
+            self._filas, self._textos, self._claves = filas, textos, _ordenar(textos)
+            self._construido = True
+        self._desde = desde
+        self._proxima_reconstruccion = time.monotonic() + settings.PRODUCTOS_LOOKUP_RECONSTRUIR_SEGUNDOS
+
+    def _aplicar_cambios(self):
+        # Se vuelve a pedir un margen hacia atrás: una transacción que tardó en confirmarse
+        # puede traer una fecha_actualizacion anterior al último refresco
+        desde = timezone.now()
+        margen = timedelta(seconds=settings.PRODUCTOS_CAMBIOS_MARGEN_SEGUNDOS)
+        cambios = list(
+            Producto.objects.filter(fecha_actualizacion__gte=self._desde - margen)
+            .values_list(*COLUMNAS, 'activo')
+        )
+        borrados = list(
+            ProductoBorrado.objects.filter(fecha__gte=self._desde - margen).values_list('producto_id', flat=True)
+        )
+        with self._lock:
+            if len(cambios) > MAX_CAMBIOS_INCREMENTALES:
+                for *fila, activo in cambios:
+                    self._guardar_fila(tuple(fila), activo)
+                self._claves = _ordenar(self._textos)
+            else:
+                for *fila, activo in cambios:
+                    self._quitar_claves(fila[0])
+                    if self._guardar_fila(tuple(fila), activo):
+                        for palabra in self._textos[fila[0]].split():
+                            insort(self._claves, (palabra, fila[0]))
+            for producto_id in borrados:
+                if producto_id in self._filas:
+                    self._quitar_claves(producto_id)
+                    del self._filas[producto_id]
+                    del self._textos[producto_id]
+        self._desde = desde
+
+    def _guardar_fila(self, fila, activo):
+        # Debe llamarse con self._lock tomado. Devuelve si el producto queda en el índice.
+        producto_id = fila[0]
+        if not activo:
+            self._filas.pop(producto_id, None)
+            self._textos.pop(producto_id, None)
+            return False
+        self._filas[producto_id] = fila
+        self._textos[producto_id] = _texto(fila[1], fila[2])
+        return True
+
+    def _quitar_claves(self, producto_id):
+        for palabra in self._textos.get(producto_id, '').split():
+            posicion = bisect_left(self._claves, (palabra, producto_id))
+            if posicion < len(self._claves) and self._claves[posicion] == (palabra, producto_id):
+                del self._claves[posicion]
+
+
+
+_indice = IndicePrefijos()
+
+
+def buscar(consulta, limite=None):
+    """
+    Filas (id, referencia_producto, nombre, precio_sugerido_venta, stock) de los productos
+    activos que empiezan por 'consulta' (por defecto PRODUCTOS_LOOKUP_RESULTADOS).
+    """
+    return _indice.buscar(consulta, limite or settings.PRODUCTOS_LOOKUP_RESULTADOS)
+
+
+def anotar_borrado(producto_id):
+    """
+    Anota el borrado del producto para que todos los procesos lo quiten del índice. Las
+    anotaciones más viejas que una reconstrucción completa (más el margen) ya no las lee
+    nadie y se descartan aquí.
+    """
+    ahora = timezone.now()
+    vigencia = settings.PRODUCTOS_LOOKUP_RECONSTRUIR_SEGUNDOS + settings.PRODUCTOS_CAMBIOS_MARGEN_SEGUNDOS
+    ProductoBorrado.objects.filter(fecha__lt=ahora - timedelta(seconds=vigencia)).delete()
+    ProductoBorrado.objects.create(producto_id=producto_id, fecha=ahora)
+
+
+def limpiar():
+    """
+    Descarta el índice de este proceso; se reconstruye en la próxima búsqueda (útil en pruebas).
+    """
+    global _indice
+    _indice = IndicePrefijos()
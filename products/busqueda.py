@@ -0,0 +1,232 @@
+# products/busqueda.py
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, When
+from rest_framework import filters
+
+from .models import BusquedaProducto, Producto
+
+# Búsqueda de productos para el POS (?search=): en vez de cinco icontains con tres joins,
+# cada producto tiene un documento desnormalizado (BusquedaProducto) con su referencia,
+# nombre, marca, proveedor y categoría ya normalizados, y un índice de texto por motor:
+#   - MySQL: FULLTEXT sobre 'terminos' (los trigramas de cada palabra), relevancia nativa,
+#     creado sin stopwords (recrear_indice_fulltext).
+#   - PostgreSQL: pg_trgm (GIN gin_trgm_ops) sobre 'texto', con word_similarity.
+#   - SQLite: tabla FTS5 sobre 'terminos' (pruebas y desarrollo).
+# El motor devuelve los mejores candidatos y aquí se reordenan: palabra exacta, luego
+# prefijo, luego subcadena y por último parecido por trigramas (errores de tipeo).
+# El documento se actualiza en las señales de products/models.py.
+
+LONGITUD_TRIGRAMA = 3
+INDICE_FULLTEXT = 'busqueda_producto_terminos_ft' # MySQL (migraciones 0009 y 0012)
+_SEPARADORES = re.compile(r'[\W_]+')
+SIMILITUD_MINIMA = 0.3 # Parecido por trigramas para aceptar una palabra con errores de tipeo
+
+
+def normalizar(texto):
+    """
+    Minúsculas, sin tildes y solo letras y números separados por un espacio.
+    """
+    texto = (texto or '').lower()
+    if not texto.isascii(): # Quitar tildes solo hace falta fuera de ASCII (lo más común es que no)
+        texto = ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c))
+    return _SEPARADORES.sub(' ', texto).strip()
+
+
+def trigramas(palabra):
+    if len(palabra) <= LONGITUD_TRIGRAMA:
+        return [palabra]
+    return [palabra[i:i + LONGITUD_TRIGRAMA] for i in range(len(palabra) - LONGITUD_TRIGRAMA + 1)]
+
+
+def construir_documento(*partes):
+    """
+    Devuelve (texto, terminos): el texto normalizado de las partes y sus trigramas únicos.
+    """
+    texto = normalizar(' '.join(parte for parte in partes if parte))
+    vistos = dict.fromkeys(trigrama for palabra in texto.split() for trigrama in trigramas(palabra))
+    return texto, ' '.join(vistos)
+
+
+# Columnas de Producto que forman el documento, en el orden de construir_documento
+CAMPOS_DOCUMENTO = ('referencia_producto', 'nombre', 'marca__nombre', 'proveedor__nombre', 'categoria__nombre')
+
+
+def _partes(producto):
+    return (
+        producto.referencia_producto, producto.nombre,
+        producto.marca.nombre if producto.marca_id else '',
+        producto.proveedor.nombre if producto.proveedor_id else '',
+        producto.categoria.nombre if producto.categoria_id else '',
+    )
+
+
+def indexar(productos):
+    """
+    Crea o reemplaza el documento de búsqueda de los productos (con marca, proveedor y
+    categoría cargados) en un solo INSERT ... ON CONFLICT/ON DUPLICATE KEY UPDATE.
+    """
+    _guardar([(producto.pk, *_partes(producto)) for producto in productos])
+
+
+def _guardar(filas):
+    # filas: (id, *CAMPOS_DOCUMENTO)
+    documentos = []
+    for producto_id, *partes in filas:
+        texto, terminos = construir_documento(*partes)
+        documentos.append(BusquedaProducto(producto_id=producto_id, texto=texto, terminos=terminos))
+    if not documentos:
+        return
+    # MySQL no admite indicar la columna del conflicto (usa la clave primaria)
+    objetivo = {'unique_fields': ['producto']} if connection.features.supports_update_conflicts_with_target else {}
+    BusquedaProducto.objects.bulk_create(
+        documentos, update_conflicts=True, update_fields=['texto', 'terminos'], **objetivo,
+    )
+
+
+def indexar_ids(ids, tamano=2000):
+    """
+    Reindexa los productos con esos ids, por lotes de 'tamano' (values_list: sin instanciar modelos).
+    """
+    ids = list(ids)
+    for inicio in range(0, len(ids), tamano):
+        _guardar(Producto.objects.filter(id__in=ids[inicio:inicio + tamano]).values_list('id', *CAMPOS_DOCUMENTO))
+
+
+def reindexar_todo(tamano=2000):
+    """
+    Reconstruye el documento de todos los productos recorriéndolos por lotes (keyset por id).
+    Devuelve la cantidad de productos indexados.
+    """
+    ultimo = 0
+    total = 0
+    while True:
+        lote = list(Producto.objects.filter(id__gt=ultimo).order_by('id').values_list('id', *CAMPOS_DOCUMENTO)[:tamano])
+        if not lote:
+            return total
+        with transaction.atomic():
+            _guardar(lote)
+        ultimo = lote[-1][0]
+        total += len(lote)
+
+
+def recrear_indice_fulltext(conexion=connection):
+    """
+    (Solo MySQL) Vuelve a crear el índice FULLTEXT de 'terminos'. InnoDB fija al crear el
+    índice la lista de stopwords y el largo mínimo de palabra (innodb_ft_min_token_size):
+    la lista por defecto ('com', 'the', 'for', 'de', 'la'...) descartaba esos trigramas, así
+    que se crea con las stopwords desactivadas solo en esta sesión. Hay que volver a
+    llamarlo si cambia innodb_ft_min_token_size (ver settings.py).
+    """
+    tabla = BusquedaProducto._meta.db_table
+    with conexion.cursor() as cursor:
+        cursor.execute("SET SESSION innodb_ft_enable_stopword = OFF")
+        try:
+            # En una sola sentencia: no queda un momento sin índice para MATCH
+            cursor.execute(
+                f"ALTER TABLE {tabla} DROP INDEX {INDICE_FULLTEXT}, ADD FULLTEXT INDEX {INDICE_FULLTEXT} (terminos)"
+            )
+        finally:
+            cursor.execute("SET SESSION innodb_ft_enable_stopword = DEFAULT")
+
+
+def _candidatos(texto, palabras, limite):
+    tabla = BusquedaProducto._meta.db_table
+    terminos = list(dict.fromkeys(t for palabra in palabras for t in trigramas(palabra)))
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            consulta = ' '.join(terminos)
+            cursor.execute(
+                f"SELECT producto_id FROM {tabla} WHERE MATCH (terminos) AGAINST (%s IN NATURAL LANGUAGE MODE) "
+                f"ORDER BY MATCH (terminos) AGAINST (%s IN NATURAL LANGUAGE MODE) DESC LIMIT %s",
+                [consulta, consulta, limite],
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                f"SELECT producto_id FROM {tabla} WHERE %s <%% texto "
+                f"ORDER BY word_similarity(%s, texto) DESC LIMIT %s",
+                [texto, texto, limite],
+            )
+        elif connection.vendor == 'sqlite':
+            consulta = ' OR '.join(f'"{termino}"' for termino in terminos)
+            cursor.execute(
+                f"SELECT rowid FROM {tabla}_fts WHERE {tabla}_fts MATCH %s ORDER BY rank LIMIT %s",
+                [consulta, limite],
+            )
+        else:
+            return list(
+                BusquedaProducto.objects.filter(texto__contains=palabras[0]).values_list('producto_id', flat=True)[:limite]
+            )
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def _similitud(a, b):
+    ta, tb = set(trigramas(a)), set(trigramas(b))
+    return len(ta & tb) / len(ta | tb)
+
+
+def _puntaje(palabras, texto):
+    # Por cada palabra buscada, su mejor coincidencia en el documento; si alguna no se
+    # parece a nada el producto se descarta.
+    # Las palabras con dígitos (referencias, medidas) no admiten errores de tipeo.
+    palabras_documento = texto.split()
+    total = 0
+    for palabra in palabras:
+        admite_errores = palabra.isalpha()
+        mejor = 0
+        for candidata in palabras_documento:
+            if candidata == palabra:
+                mejor = 4
+                break
+            if candidata.startswith(palabra):
+                mejor = max(mejor, 3)
+            elif palabra in candidata:
+                mejor = max(mejor, 2)
+            elif admite_errores and mejor < 1:
+                similitud = _similitud(palabra, candidata)
+                if similitud >= SIMILITUD_MINIMA:
+                    mejor = max(mejor, similitud)
+        if not mejor:
+            return 0
+        total += mejor
+    return total
+
+
+def buscar(consulta, limite=None):
+    """
+    Ids de los productos que coinciden con 'consulta', del más al menos relevante (como
+    mucho 'limite', por defecto BUSQUEDA_PRODUCTOS_MAX_RESULTADOS).
+    """
+    limite = limite or settings.BUSQUEDA_PRODUCTOS_MAX_RESULTADOS
+    texto = normalizar(consulta)
+    palabras = texto.split()
+    if not palabras:
+        return []
+    candidatos = _candidatos(texto, palabras, limite * 4)
+    documentos = BusquedaProducto.objects.filter(producto_id__in=candidatos).values_list('producto_id', 'texto')
+    puntajes = [(_puntaje(palabras, documento), producto_id) for producto_id, documento in documentos]
+    puntajes = sorted((p for p in puntajes if p[0]), key=lambda p: (-p[0], p[1]))
+    return [producto_id for _, producto_id in puntajes[:limite]]
+
+
+class BusquedaProductoFilter(filters.SearchFilter):
+    """
+    SearchFilter que resuelve ?search= con el índice de búsqueda: devuelve los mejores
+    resultados ordenados por relevancia. Las búsquedas de menos de tres caracteres siguen
+    usando los search_fields de la vista (icontains).
+    """
+    def filter_queryset(self, request, queryset, view):
+        terminos = self.get_search_terms(request)
+        if not terminos or len(''.join(terminos)) < LONGITUD_TRIGRAMA:
+            return super().filter_queryset(request, queryset, view)
+        # El GET condicional filtra el mismo queryset dos veces: se busca una sola por petición
+        consulta = ' '.join(terminos)
+        hechas = request.__dict__.setdefault('_busquedas_productos', {})
+        if consulta not in hechas:
+            hechas[consulta] = buscar(consulta)
+        ids = hechas[consulta]
+        orden = Case(*[When(id=producto_id, then=posicion) for posicion, producto_id in enumerate(ids)])
+        return queryset.filter(id__in=ids).order_by(orden) if ids else queryset.none()
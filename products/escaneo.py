@@ -0,0 +1,114 @@
+# products/escaneo.py
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Producto
+
+# Resolución de escaneos en caja (lector de códigos de barras o referencia tecleada): cada
+# proceso guarda en un LRU las ESCANEO_CACHE_MAX referencias más escaneadas con lo que
+# necesita el POS, stock incluido, así un escaneo repetido no consulta la base de datos.
+# Las entradas se descartan:
+#   - al confirmarse un cambio de stock o del producto hecho en este proceso (stock.py y
+#     las señales de models.py llaman a invalidar());
+#   - como mucho ESCANEO_CACHE_REVALIDAR_SEGUNDOS después si el cambio lo hizo otro proceso:
+#     se piden los productos con fecha_actualizacion reciente, como en autocompletar.py.
+# Lo leído dentro de una transacción no se guarda: podría revertirse.
+
+COLUMNAS = ('id', 'referencia_producto', 'nombre', 'precio_sugerido_venta', 'stock', 'activo')
+
+_lock = threading.Lock()
+_entradas = OrderedDict() # referencia -> fila, en orden de uso
+_referencias = {} # id -> referencia de las filas guardadas
+_estado = {'generacion': 0, 'desde': None, 'revisado': None}
+
+
+def _fila(valores):
+    valores['precio_sugerido_venta'] = str(valores['precio_sugerido_venta'])
+    return valores
+
+
+def resolver(referencias):
+    """
+    {referencia: fila} de las referencias que existen (activas o no); las demás no aparecen.
+    Las que no están en el LRU se leen con una sola consulta.
+    """
+    _revisar_cambios()
+    encontradas = {}
+    faltantes = []
+    with _lock:
+        generacion = _estado['generacion']
+        for referencia in referencias:
+            fila = _entradas.get(referencia)
+            if fila is None:
+                faltantes.append(referencia)
+            else:
+                _entradas.move_to_end(referencia)
+                encontradas[referencia] = fila
+    if not faltantes:
+        return encontradas
+
+    leidas = {
+        valores['referencia_producto']: _fila(valores)
+        for valores in Producto.objects.filter(referencia_producto__in=faltantes).values(*COLUMNAS)
+    }
+    encontradas.update(leidas)
+    if connection.in_atomic_block:
+        return encontradas
+    with _lock:
+        # Si mientras se leía se confirmó un cambio, lo leído puede ser anterior: no se guarda
+        if generacion == _estado['generacion']:
+            for referencia, fila in leidas.items():
+                _entradas[referencia] = fila
+                _referencias[fila['id']] = referencia
+            while len(_entradas) > settings.ESCANEO_CACHE_MAX:
+                _, fila = _entradas.popitem(last=False)
+                _referencias.pop(fila['id'], None)
+    return encontradas
+
+
+def invalidar(ids):
+    """
+    Descarta las filas de esos productos cuando la transacción actual se confirma.
+    """
+    ids = list(ids)
+    transaction.on_commit(lambda: _quitar(ids))
+
+
+def _quitar(ids):
+    with _lock:
+        _estado['generacion'] += 1
+        for producto_id in ids:
+            referencia = _referencias.pop(producto_id, None)
+            if referencia is not None:
+                _entradas.pop(referencia, None)
+
+
+def _revisar_cambios():
+    ahora = time.monotonic()
+    if _estado['revisado'] is not None and ahora - _estado['revisado'] < settings.ESCANEO_CACHE_REVALIDAR_SEGUNDOS:
+        return
+    _estado['revisado'] = ahora
+    desde, _estado['desde'] = _estado['desde'], timezone.now()
+    with _lock:
+        hay_entradas = bool(_entradas)
+    if desde is None or not hay_entradas:
+        return
+    # Mismo margen hacia atrás que el autocompletado (transacciones que tardan en confirmarse)
+    margen = timedelta(seconds=settings.PRODUCTOS_CAMBIOS_MARGEN_SEGUNDOS)
+    _quitar(Producto.objects.filter(fecha_actualizacion__gte=desde - margen).values_list('id', flat=True))
+
+
+def limpiar():
+    """
+    Vacía el LRU de este proceso (útil en pruebas).
+    """
+    with _lock:
+        _entradas.clear()
+        _referencias.clear()
+        _estado.update(generacion=0, desde=None, revisado=None)
@@ -0,0 +1,181 @@
+# products/imagenes.py
+import hashlib
+import io
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import Producto
+
+logger = logging.getLogger(__name__)
+
+# Variantes de la imagen de cada producto para los listados y la grilla del POS, que antes
+# bajaban el original en cada tarjeta. Al cambiar la imagen el producto queda con
+# imagen_pendiente=True (señal en models.py) y el worker procesar_imagenes, fuera de la
+# petición, decodifica el original una sola vez y guarda cada tamaño de
+# PRODUCTOS_IMAGENES_VARIANTES en WebP y JPEG junto a los originales:
+#   productos/variantes/<huella>-<variante>.<webp|jpg>
+# La huella es el hash del contenido del original: un mismo nombre siempre tiene el mismo
+# contenido, así que se sirven con caché de un año (immutable) y dos productos con la misma
+# imagen comparten archivos. En imagen_variantes se guarda {'original', 'huella', 'archivos'}.
+
+DIRECTORIO = 'productos/variantes'
+FORMATOS = {
+    # formato: (extensión, formato de Pillow, opciones de guardado)
+    'webp': ('webp', 'WEBP', {'method': 4}),
+    'jpeg': ('jpg', 'JPEG', {'optimize': True, 'progressive': True}),
+}
+
+
+def huella(contenido):
+    return hashlib.sha256(contenido).hexdigest()[:16]
+
+
+def ruta(huella_original, variante, formato):
+    return f'{DIRECTORIO}/{huella_original}-{variante}.{FORMATOS[formato][0]}'
+
+
+def _decodificar(contenido, lado_maximo):
+    imagen = Image.open(io.BytesIO(contenido))
+    # Con JPEG el decodificador puede reducir al leer (1/2, 1/4, 1/8): mucho más rápido
+    imagen.draft('RGB', (lado_maximo, lado_maximo))
+    imagen = ImageOps.exif_transpose(imagen) # Fotos de celular giradas por EXIF
+    if imagen.mode in ('RGBA', 'LA', 'P'):
+        # JPEG no tiene transparencia: se apoya sobre blanco, como se ve en la grilla
+        imagen = imagen.convert('RGBA')
+        fondo = Image.new('RGB', imagen.size, 'white')
+        fondo.paste(imagen, mask=imagen.getchannel('A'))
+        return fondo
+    return imagen.convert('RGB')
+
+
+def generar_variantes(contenido):
+    """
+    (huella, {ruta: bytes}) con cada variante de PRODUCTOS_IMAGENES_VARIANTES en cada
+    formato. El original se decodifica una vez; cada tamaño se reduce del anterior.
+    Lanza OSError, Image.DecompressionBombError u otros errores de Pillow (p. ej. un EXIF
+    mal formado) si no es una imagen válida.
+    """
+    tamanos = sorted(settings.PRODUCTOS_IMAGENES_VARIANTES.items(), key=lambda item: item[1], reverse=True)
+    huella_original = huella(contenido)
+    imagen = _decodificar(contenido, tamanos[0][1])
+    archivos = {}
+    for variante, lado in tamanos:
+        imagen.thumbnail((lado, lado), Image.LANCZOS) # En su lugar, nunca agranda
+        for formato, (_, formato_pil, opciones) in FORMATOS.items():
+            salida = io.BytesIO()
+            imagen.save(salida, formato_pil, quality=settings.PRODUCTOS_IMAGENES_CALIDAD, **opciones)
+            archivos[ruta(huella_original, variante, formato)] = salida.getvalue()
+    return huella_original, archivos
+
+
+def procesar(producto_id, nombre):
+    """
+    Genera las variantes de la imagen 'nombre' del producto y las deja en imagen_variantes,
+    solo si el producto sigue teniendo esa imagen (si cambió mientras tanto, la nueva ya
+    está en la cola). Devuelve True si se generaron; si el archivo falta o no es una imagen
+    el producto sale de la cola sin variantes (se sigue mostrando el original).
+    """
+    try:
+        with default_storage.open(nombre, 'rb') as archivo:
+            contenido = archivo.read()
+        huella_original, archivos = generar_variantes(contenido)
+    except Exception:
+        # Cualquier error de un archivo (no solo OSError: Pillow lanza ValueError, SyntaxError...)
+        # lo saca de la cola; si no, el worker lo volvería a tomar primero y se trabaría ahí
+        logger.warning("No se pudieron generar las variantes de %s (producto %s)", nombre, producto_id, exc_info=True)
+        Producto.objects.filter(pk=producto_id, imagen=nombre).update(
+            imagen_pendiente=False, imagen_variantes={}, fecha_actualizacion=timezone.now(),
+        )
+        return False
+
+    for ruta_variante, datos in archivos.items():
+        if not default_storage.exists(ruta_variante): # Mismo nombre, mismo contenido
+            default_storage.save(ruta_variante, ContentFile(datos))
+    variantes = {
+        'original': nombre,
+        'huella': huella_original,
+        'archivos': {
+            variante: {formato: ruta(huella_original, variante, formato) for formato in FORMATOS}
+            for variante in settings.PRODUCTOS_IMAGENES_VARIANTES
+        },
+    }
+    # fecha_actualizacion cambia el ETag del listado: los clientes ven las URLs nuevas
+    return bool(Producto.objects.filter(pk=producto_id, imagen=nombre).update(
+        imagen_pendiente=False, imagen_variantes=variantes, fecha_actualizacion=timezone.now(),
+    ))
+
+
+def procesar_pendientes(limite=20):
+    """
+    Procesa hasta 'limite' productos de la cola. Devuelve (procesados, generados).
+    Varios workers a la vez a lo sumo repiten trabajo: los archivos se llaman por su contenido.
+    """
+    pendientes = list(
+        Producto.objects.filter(imagen_pendiente=True).order_by('id').values_list('id', 'imagen')[:limite]
+    )
+    generados = 0
+    for producto_id, nombre in pendientes:
+        if not nombre:
+            Producto.objects.filter(pk=producto_id, imagen_pendiente=True).update(imagen_pendiente=False)
+        elif procesar(producto_id, nombre):
+            generados += 1
+    return len(pendientes), generados
+
+
+def sin_variantes(todas=False):
+    """
+    (id, imagen) de los productos con imagen cuyas variantes faltan o son de otra imagen
+    (o de todos los que tienen imagen, con todas=True).
+    """
+    productos = (
+        Producto.objects.exclude(imagen='').exclude(imagen__isnull=True).order_by('id')
+        .values_list('id', 'imagen', 'imagen_variantes').iterator(chunk_size=2000)
+    )
+    for producto_id, nombre, variantes in productos:
+        if todas or (variantes or {}).get('original') != nombre:
+            yield producto_id, nombre
+
+
+def huerfanas(antiguedad=timedelta(hours=1)):
+    """
+    Rutas de variantes guardadas que ya no usa ningún producto. Las más nuevas que
+    'antiguedad' se respetan: pueden ser de un worker que aún no guardó el producto.
+    """
+    limite = timezone.now() - antiguedad
+    en_uso = set()
+    usadas = Producto.objects.exclude(imagen='').exclude(imagen__isnull=True).values_list('imagen_variantes', flat=True)
+    for variantes in usadas.iterator(chunk_size=2000):
+        for formatos in (variantes or {}).get('archivos', {}).values():
+            en_uso.update(formatos.values())
+    try:
+        _, nombres = default_storage.listdir(DIRECTORIO)
+    except FileNotFoundError:
+        return []
+    rutas = (f'{DIRECTORIO}/{nombre}' for nombre in nombres)
+    return [
+        ruta_variante for ruta_variante in rutas
+        if ruta_variante not in en_uso and default_storage.get_modified_time(ruta_variante) < limite
+    ]
+
+
+def urls(variantes, request=None):
+    """
+    {variante: {formato: url}} a partir de imagen_variantes, o None si todavía no hay
+    variantes (el cliente usa la imagen original mientras tanto). Al cambiar la imagen
+    models.py vacía imagen_variantes, así que no hace falta comparar con la imagen actual.
+    """
+    if not variantes:
+        return None
+    resultado = {}
+    for variante, formatos in variantes.get('archivos', {}).items():
+        resultado[variante] = {}
+        for formato, ruta_variante in formatos.items():
+            url = default_storage.url(ruta_variante)
+            resultado[variante][formato] = request.build_absolute_uri(url) if request is not None else url
+    return resultado
@@ -0,0 +1,352 @@
+# products/importacion.py
+import codecs
+import csv
+import os
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from uglobals import catalogos
+from uglobals.exportacion import iterar_en_lotes
+from uglobals.models import Categoria, Marca, Proveedor
+from . import busqueda, escaneo
+from .models import MovimientoStock, Producto
+
+# Carga masiva del catálogo de productos desde CSV o XLSX (comando importar_productos y
+# POST /api/productos/importar/) y su exportación en el mismo formato de columnas.
+# El archivo se lee fila a fila y se procesa por lotes, cada uno en su transacción:
+#   - proveedor, categoría y marca vienen por nombre y se resuelven contra el caché de
+#     catálogos (sin consultas por fila); con crear_catalogos los que falten se crean;
+#   - los productos del lote se buscan por referencia con un solo select_for_update: los que
+#     existen se actualizan con bulk_create(update_conflicts=True) (solo las columnas que trae
+#     el archivo) y los demás se crean con bulk_create (referencia generada si viene vacía);
+#   - los cambios de stock quedan en el kardex (AJUSTE en las actualizaciones, INICIAL en
+#     las altas) y se reindexa la búsqueda de los productos cuyo texto cambió.
+# Una fila con errores no se guarda y se informa con su número; el resto del lote sigue.
+# Una celda vacía deja el valor como está (o el valor por defecto en las altas).
+
+COLUMNAS = [
+    'referencia_producto', 'nombre', 'precio_costo', 'precio_sugerido_venta', 'stock',
+    'proveedor', 'categoria', 'marca', 'activo',
+]
+CATALOGOS = {'proveedor': Proveedor, 'categoria': Categoria, 'marca': Marca}
+CAMPOS_BUSQUEDA = ('referencia_producto', 'nombre', 'proveedor_id', 'categoria_id', 'marca_id')
+MAX_ERRORES_DETALLADOS = 1000 # Errores que se listan; los demás solo se cuentan
+TAMANO_LOTE = 2000
+
+VERDADEROS = {'1', 'true', 'si', 'sí', 'verdadero', 'x', 's'}
+FALSOS = {'0', 'false', 'no', 'falso', 'n'}
+
+
+class ErrorArchivo(Exception):
+    """
+    El archivo no se puede leer o le faltan columnas. Los lotes anteriores al error (si lo
+    hay a mitad del archivo) quedan guardados.
+    """
+
+
+# --- Lectura ---
+
+def leer_csv(archivo):
+    """
+    Filas (número de fila, dict) de un CSV en UTF-8 (con o sin BOM) leído en binario,
+    sin cargarlo entero en memoria.
+    """
+    lector = csv.DictReader(codecs.iterdecode(archivo, 'utf-8-sig'))
+    try:
+        yield from enumerate(lector, start=2)
+    except UnicodeDecodeError:
+        raise ErrorArchivo('El CSV debe estar en UTF-8.')
+    except csv.Error as e:
+        raise ErrorArchivo(f'CSV inválido: {e}')
+
+
+def leer_xlsx(archivo):
+    """
+    Filas (número de fila, dict) de la primera hoja de un XLSX, en modo de solo lectura
+    (openpyxl no carga la hoja entera).
+    """
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ErrorArchivo('Para importar XLSX instale openpyxl; también puede usar CSV.')
+    try:
+        libro = load_workbook(archivo, read_only=True, data_only=True)
+    except Exception:
+        raise ErrorArchivo('No se pudo leer el archivo XLSX.')
+    try:
+        filas = libro.worksheets[0].iter_rows(values_only=True)
+        cabecera = [str(celda).strip() if celda is not None else '' for celda in next(filas, ())]
+        for numero, valores in enumerate(filas, start=2):
+            if any(valor not in (None, '') for valor in valores):
+                yield numero, dict(zip(cabecera, valores))
+    finally:
+        libro.close()
+
+
+def leer_archivo(archivo, nombre):
+    """
+    Elige el lector por la extensión de 'nombre' (.csv o .xlsx).
+    """
+    extension = os.path.splitext(nombre or '')[1].lower()
+    if extension == '.csv':
+        return leer_csv(archivo)
+    if extension == '.xlsx':
+        return leer_xlsx(archivo)
+    raise ErrorArchivo('Formato no soportado: use un archivo .csv o .xlsx.')
+
+
+# --- Conversión de celdas ---
+
+def _texto(valor):
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor) # Códigos numéricos en celdas de Excel
+    return '' if valor is None else str(valor).strip()
+
+
+def _decimal(valor):
+    if isinstance(valor, (int, float, Decimal)):
+        numero = Decimal(str(valor))
+    else:
+        texto = _texto(valor).replace(' ', '')
+        if ',' in texto and '.' not in texto:
+            texto = texto.replace(',', '.') # Coma decimal
+        numero = Decimal(texto)
+    numero = numero.quantize(Decimal('0.01'))
+    if not numero.is_finite() or abs(numero) >= Decimal('100000000'):
+        raise InvalidOperation
+    return numero
+
+
+def _entero(valor):
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return int(_texto(valor))
+
+
+def _booleano(valor):
+    if isinstance(valor, bool):
+        return valor
+    texto = _texto(valor).lower()
+    if texto in VERDADEROS:
+        return True
+    if texto in FALSOS:
+        return False
+    raise ValueError
+
+
+CONVERSIONES = {
+    'precio_costo': (_decimal, 'debe ser un número con hasta 2 decimales'),
+    'precio_sugerido_venta': (_decimal, 'debe ser un número con hasta 2 decimales'),
+    'stock': (_entero, 'debe ser un número entero'),
+    'activo': (_booleano, 'debe ser sí/no o 1/0'),
+}
+LONGITUDES = {'referencia_producto': 50, 'nombre': 255}
+
+
+def _convertir(fila, columnas):
+    """
+    (valores, errores) de una fila: solo las columnas con valor; los catálogos quedan como nombre.
+    """
+    valores = {}
+    errores = {}
+    for columna in columnas:
+        crudo = fila.get(columna)
+        if _texto(crudo) == '':
+            continue
+        if columna in CONVERSIONES:
+            convertir, mensaje = CONVERSIONES[columna]
+            try:
+                valores[columna] = convertir(crudo)
+            except (ValueError, InvalidOperation):
+                errores[columna] = mensaje
+        else:
+            valores[columna] = _texto(crudo)
+            if columna in LONGITUDES and len(valores[columna]) > LONGITUDES[columna]:
+                errores[columna] = f'máximo {LONGITUDES[columna]} caracteres'
+    return valores, errores
+
+
+# --- Importación ---
+
+class Importacion:
+    """
+    Importa filas (número, dict) de leer_archivo(). resultado() resume lo hecho:
+    filas leídas, productos creados y actualizados, y los errores por fila.
+    """
+    def __init__(self, crear_catalogos=False, tamano=TAMANO_LOTE):
+        self.crear_catalogos = crear_catalogos
+        self.tamano = tamano
+        self.filas = self.creados = self.actualizados = self.con_errores = 0
+        self.errores = []
+        # Nombre (sin distinguir mayúsculas) -> id, por catálogo, desde el caché de catálogos.
+        # Proveedor y categoría admiten nombres repetidos: gana el de menor id.
+        self.nombres = {}
+        for campo, modelo in CATALOGOS.items():
+            self.nombres[campo] = {}
+            for pk, objeto in sorted(catalogos.obtener(modelo).objetos.items()):
+                self.nombres[campo].setdefault(objeto.nombre.strip().casefold(), pk)
+        self.catalogos_del_lote = [] # Creados en el lote en curso (se olvidan si se revierte)
+
+    def importar(self, filas):
+        columnas = None
+        lote = []
+        for numero, fila in filas:
+            if columnas is None:
+                columnas = self._validar_cabecera(fila)
+            lote.append((numero, fila))
+            if len(lote) >= self.tamano:
+                self._importar_lote(lote, columnas)
+                lote = []
+        if lote:
+            self._importar_lote(lote, columnas)
+        return self.resultado()
+
+    def resultado(self):
+        return {
+            'filas': self.filas, 'creados': self.creados, 'actualizados': self.actualizados,
+            'con_errores': self.con_errores, 'errores': self.errores,
+        }
+
+    def _validar_cabecera(self, fila):
+        columnas = [columna for columna in COLUMNAS if columna in fila]
+        if 'referencia_producto' not in columnas and 'nombre' not in columnas:
+            raise ErrorArchivo(f"El archivo debe tener la columna 'referencia_producto' o 'nombre'. Columnas: {', '.join(COLUMNAS)}.")
+        return columnas
+
+    def _error(self, numero, referencia, errores):
+        self.con_errores += 1
+        if len(self.errores) < MAX_ERRORES_DETALLADOS:
+            self.errores.append({'fila': numero, 'referencia_producto': referencia, 'errores': errores})
+
+    def _importar_lote(self, lote, columnas):
+        self.filas += len(lote)
+        convertidas = []
+        vistas = set()
+        for numero, fila in lote:
+            valores, errores = _convertir(fila, columnas)
+            referencia = valores.get('referencia_producto')
+            if referencia and referencia in vistas:
+                errores['referencia_producto'] = 'repetida en el mismo lote del archivo'
+            if errores:
+                self._error(numero, referencia, errores)
+                continue
+            if referencia:
+                vistas.add(referencia)
+            convertidas.append((numero, valores))
+        if not convertidas:
+            return
+        self.catalogos_del_lote = []
+        try:
+            with transaction.atomic():
+                self._guardar(convertidas, columnas)
+        except IntegrityError as e:
+            # Otra importación o un alta creó la misma referencia mientras tanto
+            for campo, clave in self.catalogos_del_lote:
+                del self.nombres[campo][clave]
+            for numero, valores in convertidas:
+                self._error(numero, valores.get('referencia_producto'), {'lote': f'no se guardó: {e}'})
+
+    def _guardar(self, convertidas, columnas):
+        referencias = [valores['referencia_producto'] for _, valores in convertidas if 'referencia_producto' in valores]
+        existentes = {
+            producto.referencia_producto: producto
+            for producto in Producto.objects.select_for_update().filter(referencia_producto__in=referencias)
+        }
+        nuevos, actualizados, anteriores = [], [], {}
+        for numero, valores in convertidas:
+            producto = existentes.get(valores.get('referencia_producto'))
+            errores = self._resolver_catalogos(valores, producto is None)
+            if producto is None and 'nombre' not in valores:
+                errores['nombre'] = 'obligatorio para crear el producto'
+            if errores:
+                self._error(numero, valores.get('referencia_producto'), errores)
+                continue
+            if producto is None:
+                nuevos.append(Producto(**valores))
+            else:
+                anteriores[producto.pk] = [getattr(producto, campo) for campo in ('stock', *CAMPOS_BUSQUEDA)]
+                for campo, valor in valores.items():
+                    setattr(producto, campo, valor)
+                actualizados.append(producto)
+
+        if nuevos:
+            Producto.objects.bulk_create(nuevos, batch_size=500) # Referencias, kardex INICIAL y búsqueda
+            self.creados += len(nuevos)
+        if actualizados:
+            self._actualizar(actualizados, columnas, anteriores)
+
+    def _actualizar(self, productos, columnas, anteriores):
+        # Un INSERT ... ON CONFLICT/ON DUPLICATE KEY UPDATE por tanda sobre filas que ya existen
+        # (y están bloqueadas): mucho más barato que el CASE WHEN por fila de bulk_update.
+        # Solo se escriben las columnas del archivo y fecha_actualizacion (auto_now).
+        campos = [f'{columna}_id' if columna in CATALOGOS else columna for columna in columnas if columna != 'referencia_producto']
+        objetivo = {'unique_fields': ['id']} if connection.features.supports_update_conflicts_with_target else {}
+        Producto.objects.bulk_create(
+            productos, batch_size=500, update_conflicts=True, update_fields=[*campos, 'fecha_actualizacion'], **objetivo,
+        )
+        self.actualizados += len(productos)
+
+        ahora = timezone.now()
+        MovimientoStock.objects.bulk_create([
+            MovimientoStock(producto_id=producto.pk, fecha=ahora, cantidad=producto.stock - anteriores[producto.pk][0],
+                            tipo=MovimientoStock.AJUSTE, documento='Importación')
+            for producto in productos if producto.stock != anteriores[producto.pk][0]
+        ])
+        busqueda.indexar_ids([
+            producto.pk for producto in productos
+            if [getattr(producto, campo) for campo in CAMPOS_BUSQUEDA] != anteriores[producto.pk][1:]
+        ])
+        escaneo.invalidar([producto.pk for producto in productos])
+
+    def _resolver_catalogos(self, valores, es_nuevo):
+        errores = {}
+        for campo, modelo in CATALOGOS.items():
+            nombre = valores.pop(campo, None)
+            if nombre is None:
+                if es_nuevo and campo == 'proveedor':
+                    errores[campo] = 'obligatorio para crear el producto'
+                continue
+            clave = nombre.casefold()
+            pk = self.nombres[campo].get(clave)
+            if pk is None and self.crear_catalogos:
+                pk = self.nombres[campo][clave] = modelo.objects.create(nombre=nombre).pk
+                self.catalogos_del_lote.append((campo, clave))
+            if pk is None:
+                errores[campo] = f"'{nombre}' no existe"
+            else:
+                valores[f'{campo}_id'] = pk
+        return errores
+
+
+def importar_productos(filas, crear_catalogos=False, tamano=TAMANO_LOTE):
+    """
+    Importa las filas de leer_archivo() y devuelve el resumen (ver Importacion).
+    """
+    return Importacion(crear_catalogos, tamano).importar(filas)
+
+
+# --- Exportación ---
+
+def exportar_productos():
+    """
+    Filas (dicts con COLUMNAS) de todos los productos, leídas por lotes: se pueden volver a
+    importar tal cual.
+    """
+    productos = Producto.objects.values(
+        'id', 'referencia_producto', 'nombre', 'precio_costo', 'precio_sugerido_venta', 'stock',
+        'proveedor__nombre', 'categoria__nombre', 'marca__nombre', 'activo',
+    )
+    for producto in iterar_en_lotes(productos):
+        yield {
+            'referencia_producto': producto['referencia_producto'],
+            'nombre': producto['nombre'],
+            'precio_costo': producto['precio_costo'],
+            'precio_sugerido_venta': producto['precio_sugerido_venta'],
+            'stock': producto['stock'],
+            'proveedor': producto['proveedor__nombre'],
+            'categoria': producto['categoria__nombre'] or '',
+            'marca': producto['marca__nombre'] or '',
+            'activo': 'si' if producto['activo'] else 'no',
+        }
@@ -0,0 +1,34 @@
+# products/management/commands/cerrar_stock.py
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from products.stock import cerrar_stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Guarda el saldo de stock de cada producto al inicio del día indicado (SaldoStock), "
+        "para que el stock a una fecha no tenga que sumar todo el kardex. Programarlo a diario "
+        "(cron) poco después de medianoche."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help='Día del cierre (AAAA-MM-DD); el corte es su inicio. Por defecto, hoy.')
+        parser.add_argument('--lote', type=int, default=2000, help='Productos calculados por consulta.')
+
+    def handle(self, *args, **options):
+        dia = timezone.localdate()
+        if options['fecha']:
+            try:
+                dia = datetime.strptime(options['fecha'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Formato de fecha inválido. Use AAAA-MM-DD.')
+        # Cortar al inicio del día (y no "ahora") deja fuera las ventas que aún se están registrando
+        corte = timezone.make_aware(datetime.combine(dia, time.min), timezone.get_current_timezone())
+        if corte > timezone.now():
+            raise CommandError('No se puede cerrar una fecha futura.')
+
+        guardados = cerrar_stock(corte, options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'Cierre de stock al {corte:%Y-%m-%d %H:%M}: {guardados} saldos guardados.'))
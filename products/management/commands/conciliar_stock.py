@@ -0,0 +1,29 @@
+# products/management/commands/conciliar_stock.py
+from django.core.management.base import BaseCommand
+
+from products.stock import conciliar_stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Verifica Producto.stock contra el kardex (MovimientoStock) por lotes y lista los "
+        "productos que no cuadran. Con --ajustar registra los movimientos de ajuste."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=2000, help='Productos leídos por consulta.')
+        parser.add_argument('--ajustar', action='store_true',
+                            help='Escribe un movimiento de ajuste por cada diferencia (Producto.stock manda).')
+
+    def handle(self, *args, **options):
+        diferencias = 0
+        for producto_id, nombre, stock, stock_kardex in conciliar_stock(options['lote'], options['ajustar']):
+            diferencias += 1
+            self.stdout.write(f"  {producto_id} {nombre}: stock {stock}, kardex {stock_kardex} ({stock - stock_kardex:+d})")
+
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS('El stock cuadra con el kardex.'))
+        elif options['ajustar']:
+            self.stdout.write(self.style.SUCCESS(f'{diferencias} productos ajustados.'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{diferencias} productos no cuadran. Use --ajustar para corregir el kardex.'))
@@ -0,0 +1,30 @@
+# products/management/commands/exportar_productos.py
+import csv
+
+from django.core.management.base import BaseCommand
+
+from products.importacion import COLUMNAS, exportar_productos
+
+
+class Command(BaseCommand):
+    help = "Escribe todos los productos en CSV (las mismas columnas que importar_productos)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--salida', help='Archivo de salida; sin él se escribe en la salida estándar.')
+
+    def handle(self, *args, **options):
+        if not options['salida']:
+            self._escribir(self.stdout)
+            return
+        with open(options['salida'], 'w', encoding='utf-8', newline='') as salida:
+            total = self._escribir(salida)
+        self.stderr.write(self.style.SUCCESS(f"{total} productos exportados a {options['salida']}."))
+
+    def _escribir(self, salida):
+        escritor = csv.DictWriter(salida, fieldnames=COLUMNAS)
+        escritor.writeheader()
+        total = 0
+        for fila in exportar_productos():
+            escritor.writerow(fila)
+            total += 1
+        return total
@@ -0,0 +1,33 @@
+# products/management/commands/generar_variantes_imagenes.py
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from products.imagenes import huerfanas, procesar, sin_variantes
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera las variantes de las imágenes de productos que no las tienen (imágenes cargadas "
+        "antes del worker procesar_imagenes o con update()/SQL directo)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true',
+                            help='Regenera también las que ya tienen variantes (p. ej. tras cambiar los tamaños).')
+        parser.add_argument('--limpiar', action='store_true',
+                            help='Borra además los archivos de variantes que ya no usa ningún producto.')
+
+    def handle(self, *args, **options):
+        procesados = generados = 0
+        for producto_id, nombre in list(sin_variantes(options['todas'])): # Sin cursor abierto al escribir
+            procesados += 1
+            if procesar(producto_id, nombre):
+                generados += 1
+            else:
+                self.stderr.write(f"  Producto {producto_id}: no se pudo procesar {nombre}")
+        self.stdout.write(self.style.SUCCESS(f'{procesados} imágenes procesadas, {generados} con variantes generadas.'))
+        if options['limpiar']:
+            rutas = huerfanas()
+            for ruta in rutas:
+                default_storage.delete(ruta)
+            self.stdout.write(f'{len(rutas)} variantes sin uso borradas.')
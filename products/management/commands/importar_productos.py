@@ -0,0 +1,36 @@
+# products/management/commands/importar_productos.py
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importacion import COLUMNAS, TAMANO_LOTE, ErrorArchivo, importar_productos, leer_archivo
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea o actualiza productos desde un CSV o XLSX con las columnas "
+        f"{', '.join(COLUMNAS)} (proveedor, categoría y marca por nombre). Los productos se "
+        "buscan por referencia; las filas con errores se listan y no se guardan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo .csv o .xlsx.')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Filas por transacción.')
+        parser.add_argument('--crear-catalogos', action='store_true',
+                            help='Crea los proveedores, categorías y marcas que no existan.')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                resultado = importar_productos(
+                    leer_archivo(archivo, options['archivo']), options['crear_catalogos'], options['lote'],
+                )
+        except (OSError, ErrorArchivo) as e:
+            raise CommandError(str(e))
+
+        for error in resultado['errores']:
+            detalle = '; '.join(f'{campo}: {mensaje}' for campo, mensaje in error['errores'].items())
+            self.stdout.write(f"  Fila {error['fila']} ({error['referencia_producto'] or 'sin referencia'}): {detalle}")
+        resumen = (
+            f"{resultado['filas']} filas: {resultado['creados']} productos creados, "
+            f"{resultado['actualizados']} actualizados, {resultado['con_errores']} con errores."
+        )
+        self.stdout.write(self.style.WARNING(resumen) if resultado['con_errores'] else self.style.SUCCESS(resumen))
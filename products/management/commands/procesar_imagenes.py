@@ -0,0 +1,33 @@
+# products/management/commands/procesar_imagenes.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.imagenes import procesar_pendientes
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker de la cola de imágenes de productos (imagen_pendiente): genera la miniatura y el "
+        "tamaño medio en WebP y JPEG de las imágenes subidas o cambiadas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Procesa lo que esté en cola y termina (útil desde cron).')
+        parser.add_argument('--lote', type=int, default=20, help='Productos tomados por vuelta.')
+        parser.add_argument('--intervalo', type=float, default=5,
+                            help='Segundos de espera cuando no hay nada que procesar.')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                procesados, generados = procesar_pendientes(options['lote'])
+                if procesados:
+                    self.stdout.write(f"{procesados} imágenes procesadas, {generados} con variantes generadas.")
+                if options['una_vez'] and procesados < options['lote']:
+                    break
+                if not procesados:
+                    time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write('Worker detenido.')
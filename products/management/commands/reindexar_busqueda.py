@@ -0,0 +1,26 @@
+# products/management/commands/reindexar_busqueda.py
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from products.busqueda import recrear_indice_fulltext, reindexar_todo
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye el documento de búsqueda (BusquedaProducto) de todos los productos. "
+        "Las altas y cambios ya lo mantienen; usarlo tras cargas hechas con update() o SQL directo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=2000, help='Productos por lote.')
+        parser.add_argument(
+            '--indice', action='store_true',
+            help='Con MySQL, vuelve a crear también el índice FULLTEXT (tras cambiar innodb_ft_min_token_size).',
+        )
+
+    def handle(self, *args, **options):
+        total = reindexar_todo(options['lote'])
+        if options['indice'] and connection.vendor == 'mysql':
+            recrear_indice_fulltext()
+            self.stdout.write('Índice FULLTEXT recreado.')
+        self.stdout.write(self.style.SUCCESS(f'{total} productos indexados.'))
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:40
+
+from django.db import migrations
+from django.db.models import Max
+
+
+def inicializar_secuencia_producto(apps, schema_editor):
+    # Las referencias antiguas se generaban con el id del producto, así que el contador
+    # arranca en el mayor valor entre el último id y el último sufijo numérico usado.
+    Producto = apps.get_model('products', 'Producto')
+    Secuencia = apps.get_model('uglobals', 'Secuencia')
+    ultimo = Producto.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0
+    referencias = Producto.objects.filter(referencia_producto__startswith='PRODKEEPLIC').values_list('referencia_producto', flat=True)
+    for referencia in referencias.iterator():
+        sufijo = referencia[len('PRODKEEPLIC'):]
+        if sufijo.isdigit():
+            ultimo = max(ultimo, int(sufijo))
+    Secuencia.objects.update_or_create(nombre='producto', defaults={'valor': ultimo})
+
+
+def eliminar_secuencia_producto(apps, schema_editor):
+    Secuencia = apps.get_model('uglobals', 'Secuencia')
+    Secuencia.objects.filter(nombre='producto').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+        ('uglobals', '0002_secuencia'),
+    ]
+
+    operations = [
+        migrations.RunPython(inicializar_secuencia_producto, eliminar_secuencia_producto),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_secuencia_producto'),
+        ('uglobals', '0002_secuencia'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['fecha_creacion', 'id'], name='producto_fecha_id_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_indice_fecha_id'),
+        ('uglobals', '0002_secuencia'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['activo', 'stock', 'nombre'], name='producto_activo_stock_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:49
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_indices_reportes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('cantidad', models.IntegerField()),
+                ('tipo', models.CharField(choices=[('Inicial', 'Stock inicial'), ('Venta', 'Venta'), ('Anulacion', 'Anulación de factura'), ('Devolucion', 'Devolución por eliminación'), ('Ajuste', 'Ajuste manual')], max_length=20)),
+                ('documento', models.CharField(blank=True, default='', max_length=50)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos_stock', to='products.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['producto', 'fecha', 'id'], name='movimiento_producto_fecha_idx'), models.Index(fields=['fecha'], name='movimiento_fecha_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SaldoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField()),
+                ('stock', models.IntegerField()),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos_stock', to='products.producto')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'producto'), name='saldo_fecha_producto_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:50
+
+from django.db import migrations
+from django.utils import timezone
+
+
+def registrar_stock_actual(apps, schema_editor):
+    # El kardex empieza con un movimiento 'Inicial' por el stock que tiene hoy cada producto,
+    # así la suma del kardex coincide con Producto.stock desde el primer día.
+    Producto = apps.get_model('products', 'Producto')
+    MovimientoStock = apps.get_model('products', 'MovimientoStock')
+    fecha = timezone.now()
+    lote = []
+    for producto_id, stock in Producto.objects.exclude(stock=0).values_list('id', 'stock').iterator():
+        lote.append(MovimientoStock(producto_id=producto_id, fecha=fecha, cantidad=stock, tipo='Inicial'))
+        if len(lote) >= 2000:
+            MovimientoStock.objects.bulk_create(lote)
+            lote = []
+    MovimientoStock.objects.bulk_create(lote)
+
+
+def eliminar_movimientos(apps, schema_editor):
+    MovimientoStock = apps.get_model('products', 'MovimientoStock')
+    MovimientoStock.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_kardex_stock'),
+    ]
+
+    operations = [
+        migrations.RunPython(registrar_stock_actual, eliminar_movimientos),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_stock_inicial_kardex'),
+        ('uglobals', '0002_secuencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['fecha_actualizacion'], name='producto_actualizacion_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_fecha_actualizacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BusquedaProducto',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='busqueda', serialize=False, to='products.producto')),
+                ('texto', models.TextField()),
+                ('terminos', models.TextField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:00
+
+from django.db import migrations
+
+TABLA = 'products_busquedaproducto'
+
+
+def crear_indice(apps, schema_editor):
+    # Índice de texto propio de cada motor (ver products/busqueda.py)
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(f"ALTER TABLE {TABLA} ADD FULLTEXT INDEX busqueda_producto_terminos_ft (terminos)")
+    elif vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(f"CREATE INDEX busqueda_producto_texto_trgm ON {TABLA} USING gin (texto gin_trgm_ops)")
+    elif vendor == 'sqlite':
+        # Tabla FTS5 de contenido externo, sincronizada con triggers
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {TABLA}_fts USING fts5(terminos, content='{TABLA}', content_rowid='producto_id')"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {TABLA}_ai AFTER INSERT ON {TABLA} BEGIN "
+            f"INSERT INTO {TABLA}_fts(rowid, terminos) VALUES (new.producto_id, new.terminos); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {TABLA}_ad AFTER DELETE ON {TABLA} BEGIN "
+            f"INSERT INTO {TABLA}_fts({TABLA}_fts, rowid, terminos) VALUES ('delete', old.producto_id, old.terminos); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {TABLA}_au AFTER UPDATE ON {TABLA} BEGIN "
+            f"INSERT INTO {TABLA}_fts({TABLA}_fts, rowid, terminos) VALUES ('delete', old.producto_id, old.terminos); "
+            f"INSERT INTO {TABLA}_fts(rowid, terminos) VALUES (new.producto_id, new.terminos); END"
+        )
+
+
+def borrar_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(f"ALTER TABLE {TABLA} DROP INDEX busqueda_producto_terminos_ft")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS busqueda_producto_texto_trgm")
+    elif vendor == 'sqlite':
+        for trigger in ('ai', 'ad', 'au'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {TABLA}_{trigger}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABLA}_fts")
+
+
+def indexar_productos(apps, schema_editor):
+    from products.busqueda import construir_documento
+
+    Producto = apps.get_model('products', 'Producto')
+    BusquedaProducto = apps.get_model('products', 'BusquedaProducto')
+    productos = Producto.objects.select_related('marca', 'proveedor', 'categoria').order_by('id')
+    lote = []
+    for producto in productos.iterator(chunk_size=2000):
+        texto, terminos = construir_documento(
+            producto.referencia_producto, producto.nombre,
+            producto.marca.nombre if producto.marca_id else '',
+            producto.proveedor.nombre if producto.proveedor_id else '',
+            producto.categoria.nombre if producto.categoria_id else '',
+        )
+        lote.append(BusquedaProducto(producto_id=producto.pk, texto=texto, terminos=terminos))
+        if len(lote) >= 2000:
+            BusquedaProducto.objects.bulk_create(lote)
+            lote = []
+    BusquedaProducto.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_busqueda_producto'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, borrar_indice),
+        migrations.RunPython(indexar_productos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_indice_busqueda'),
+        ('uglobals', '0002_secuencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='imagen_pendiente',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='imagen_variantes',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['imagen_pendiente', 'id'], name='producto_imagen_pend_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_imagen_variantes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoBorrado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('producto_id', models.BigIntegerField()),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fecha'], name='producto_borrado_fecha_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:10
+
+from django.db import migrations
+
+
+def recrear_indice(apps, schema_editor):
+    # El FULLTEXT de 0009 se creó con las stopwords por defecto de InnoDB, que dejaban
+    # fuera trigramas como 'com', 'for' o 'the' (ver products/busqueda.py)
+    if schema_editor.connection.vendor == 'mysql':
+        from products.busqueda import recrear_indice_fulltext
+
+        recrear_indice_fulltext(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_producto_borrado'),
+    ]
+
+    operations = [
+        migrations.RunPython(recrear_indice, migrations.RunPython.noop),
+    ]
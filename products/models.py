@@ -1,10 +1,57 @@
 # products/models.py
 from django.db import models
+from django.utils import timezone
 from decimal import Decimal
 from uglobals.models import Proveedor, Categoria, Marca
-from django.db.models.signals import pre_save
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
-from django.db import transaction
+from uglobals.secuencias import reservar
+
+PREFIJO_REFERENCIA = "PRODKEEPLIC"
+
+def asignar_referencias(productos):
+    """
+    Asigna referencias PRODKEEPLIC######### a los productos que no tengan una,
+    reservando todos los números necesarios en una sola operación del contador.
+    """
+    sin_referencia = [producto for producto in productos if not producto.referencia_producto]
+    if sin_referencia:
+        for producto, numero in zip(sin_referencia, reservar('producto', len(sin_referencia))):
+            producto.referencia_producto = f"{PREFIJO_REFERENCIA}{numero:09d}"
+    return productos
+
+# QuerySet propio para que bulk_create (que no dispara señales) también genere referencias
+class ProductoQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = asignar_referencias(list(objs))
+        creados = super().bulk_create(objs, *args, **kwargs)
+        # Con ignore/update_conflicts algunos ya existían: quien lo use registra sus movimientos
+        # y reindexa la búsqueda de los que cambiaron (ver importacion.py)
+        if not kwargs.get('ignore_conflicts') and not kwargs.get('update_conflicts'):
+            registrar_stock_inicial(objs)
+            busqueda.indexar_ids(ids_por_referencia(objs).values())
+        return creados
+
+def ids_por_referencia(productos):
+    # MySQL no devuelve los ids del bulk_create: se buscan por la referencia (única)
+    return dict(
+        Producto.objects.filter(referencia_producto__in=[producto.referencia_producto for producto in productos])
+        .values_list('referencia_producto', 'id')
+    )
+
+def registrar_stock_inicial(productos):
+    """
+    Escribe en el kardex el stock con el que se crearon los productos (bulk_create no
+    dispara post_save).
+    """
+    con_stock = [producto for producto in productos if producto.stock]
+    if not con_stock:
+        return
+    ids = ids_por_referencia(con_stock)
+    MovimientoStock.objects.bulk_create([
+        MovimientoStock(producto_id=ids[producto.referencia_producto], cantidad=producto.stock, tipo=MovimientoStock.INICIAL)
+        for producto in con_stock
+    ])
 
 # Modelo Producto
 class Producto(models.Model):
@@ -19,17 +66,187 @@ class Producto(models.Model):
     # CAMBIO AQUÍ: Ahora es ImageField
     # upload_to='productos/' significa que las imágenes se guardarán en MEDIA_ROOT/productos/
     imagen = models.ImageField(upload_to='productos/', blank=True, null=True)
+    # Miniatura y tamaño medio de la imagen (products/imagenes.py): las genera un worker
+    # cuando imagen_pendiente queda en True al cambiar la imagen
+    imagen_variantes = models.JSONField(default=dict, blank=True)
+    imagen_pendiente = models.BooleanField(default=False)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    # Última modificación, incluidos los cambios de stock (ETag / Last-Modified de la API)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
     activo = models.BooleanField(default=True)
 
+    objects = ProductoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Orden estable del listado y paginación por cursor (fecha_creacion, id)
+            models.Index(fields=['fecha_creacion', 'id'], name='producto_fecha_id_idx'),
+            # Reporte de productos bajo stock: activo=True AND stock <= X ORDER BY stock, nombre
+            models.Index(fields=['activo', 'stock', 'nombre'], name='producto_activo_stock_idx'),
+            models.Index(fields=['fecha_actualizacion'], name='producto_actualizacion_idx'),
+            # Cola de imágenes por procesar (procesar_imagenes)
+            models.Index(fields=['imagen_pendiente', 'id'], name='producto_imagen_pend_idx'),
+        ]
+
     def __str__(self):
         return self.nombre
 
 @receiver(pre_save, sender=Producto)
 def generar_referencia_producto(sender, instance, **kwargs):
+    # Toma el siguiente número del contador 'producto' en vez de leer el último producto
+    # con select_for_update (que bloqueaba la cola de la tabla en cada alta).
     if instance._state.adding and not instance.referencia_producto:
-        with transaction.atomic():
-            last_product = Producto.objects.select_for_update().order_by('-id').first()
-            next_id = (last_product.id if last_product else 0) + 1
-            suffix = f"{next_id:09d}"
-            instance.referencia_producto = f"PRODKEEPLIC{suffix}"
\ No newline at end of file
+        asignar_referencias([instance])
+
+
+# Kardex: cada cambio de stock deja aquí una fila (solo se insertan, nunca se modifican).
+# La suma de 'cantidad' de un producto es su stock; products/stock.py las escribe en bloque
+# junto con el UPDATE de Producto.stock, en la misma transacción.
+class MovimientoStock(models.Model):
+    INICIAL = 'Inicial'
+    VENTA = 'Venta'
+    ANULACION = 'Anulacion'
+    DEVOLUCION = 'Devolucion'
+    AJUSTE = 'Ajuste'
+    TIPOS = [
+        (INICIAL, 'Stock inicial'),
+        (VENTA, 'Venta'),
+        (ANULACION, 'Anulación de factura'),
+        (DEVOLUCION, 'Devolución por eliminación'),
+        (AJUSTE, 'Ajuste manual'),
+    ]
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='movimientos_stock')
+    fecha = models.DateTimeField(default=timezone.now)
+    cantidad = models.IntegerField() # Positiva si entra stock, negativa si sale
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    documento = models.CharField(max_length=50, blank=True, default='') # Ej. número de la factura
+
+    class Meta:
+        indexes = [
+            # Movimientos de un producto y stock a una fecha: rango sobre (producto, fecha)
+            models.Index(fields=['producto', 'fecha', 'id'], name='movimiento_producto_fecha_idx'),
+            models.Index(fields=['fecha'], name='movimiento_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} {self.cantidad:+d} de {self.producto_id} ({self.fecha:%Y-%m-%d %H:%M})"
+
+
+# Saldo de cada producto al cierre 'fecha' (comando cerrar_stock). El stock a una fecha es
+# el último saldo anterior más los movimientos posteriores, sin recorrer todo el kardex.
+class SaldoStock(models.Model):
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='saldos_stock')
+    fecha = models.DateTimeField()
+    stock = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'producto'], name='saldo_fecha_producto_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id}: {self.stock} al {self.fecha:%Y-%m-%d %H:%M}"
+
+
+# Productos borrados: un borrado no deja fecha_actualizacion, así que el autocompletado de
+# cada proceso (autocompletar.py) lee de aquí qué quitar en su próximo refresco.
+class ProductoBorrado(models.Model):
+    producto_id = models.BigIntegerField()
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha'], name='producto_borrado_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} ({self.fecha:%Y-%m-%d %H:%M})"
+
+
+# Los cambios de stock hechos al guardar el producto (alta, edición desde el formulario o
+# el admin) también quedan en el kardex; las ventas pasan por products/stock.py.
+@receiver(pre_save, sender=Producto)
+def recordar_stock_anterior(sender, instance, **kwargs):
+    # También la imagen anterior, para encolar sus variantes si cambia (misma consulta)
+    instance._stock_anterior, instance._imagen_anterior = 0, ''
+    if not instance._state.adding:
+        instance._stock_anterior, instance._imagen_anterior = (
+            Producto.objects.filter(pk=instance.pk).values_list('stock', 'imagen').first() or (0, '')
+        )
+
+
+@receiver(post_save, sender=Producto)
+def registrar_cambio_stock(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'stock' not in update_fields:
+        return
+    diferencia = instance.stock - getattr(instance, '_stock_anterior', 0)
+    if diferencia:
+        MovimientoStock.objects.create(
+            producto=instance, cantidad=diferencia,
+            tipo=MovimientoStock.INICIAL if created else MovimientoStock.AJUSTE,
+        )
+
+
+# Documento de búsqueda de cada producto (products/busqueda.py): texto normalizado con su
+# referencia, nombre, marca, proveedor y categoría, y los trigramas que indexa el motor.
+class BusquedaProducto(models.Model):
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, primary_key=True, related_name='busqueda')
+    texto = models.TextField()
+    terminos = models.TextField()
+
+    def __str__(self):
+        return self.texto
+
+
+from . import autocompletar, busqueda, escaneo # noqa: E402 (usan los modelos de arriba)
+
+CAMPOS_BUSQUEDA = {'referencia_producto', 'nombre', 'marca', 'proveedor', 'categoria'}
+
+@receiver(post_save, sender=Producto)
+def indexar_producto(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or CAMPOS_BUSQUEDA & set(update_fields):
+        busqueda.indexar([instance]) # Con las relaciones que ya tenga cargadas
+
+# El escaneo en caja guarda nombre, precio y stock: cualquier cambio del producto lo descarta
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidar_escaneo(sender, instance, **kwargs):
+    escaneo.invalidar([instance.pk])
+
+# En la misma transacción que el borrado: si se revierte, no queda anotado
+@receiver(post_delete, sender=Producto)
+def anotar_borrado(sender, instance, **kwargs):
+    autocompletar.anotar_borrado(instance.pk)
+
+# Una imagen nueva (o quitada) deja al producto en la cola de imágenes sin variantes; se
+# hace después de guardar porque el nombre definitivo del archivo se decide al guardarlo.
+@receiver(post_save, sender=Producto)
+def encolar_imagen(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'imagen' not in update_fields:
+        return
+    if (instance.imagen.name or '') == (getattr(instance, '_imagen_anterior', '') or ''):
+        return
+    instance.imagen_pendiente, instance.imagen_variantes = bool(instance.imagen), {}
+    Producto.objects.filter(pk=instance.pk).update(
+        imagen_pendiente=instance.imagen_pendiente, imagen_variantes=instance.imagen_variantes,
+    )
+
+# Si cambia el nombre de una marca, proveedor o categoría se reindexan sus productos; al
+# borrar una marca o categoría sus productos quedan sin ella (SET_NULL, sin señales).
+@receiver(post_save, sender=Marca)
+@receiver(post_save, sender=Proveedor)
+@receiver(post_save, sender=Categoria)
+def reindexar_por_catalogo(sender, instance, created, **kwargs):
+    if not created:
+        busqueda.indexar_ids(instance.productos.values_list('id', flat=True))
+
+@receiver(pre_delete, sender=Marca)
+@receiver(pre_delete, sender=Categoria)
+def recordar_productos_catalogo(sender, instance, **kwargs):
+    instance._productos_busqueda = list(instance.productos.values_list('id', flat=True))
+
+@receiver(post_delete, sender=Marca)
+@receiver(post_delete, sender=Categoria)
+def reindexar_sin_catalogo(sender, instance, **kwargs):
+    busqueda.indexar_ids(getattr(instance, '_productos_busqueda', []))
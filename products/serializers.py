@@ -1,23 +1,39 @@
 # products/serializers.py
 from rest_framework import serializers
-from .models import Producto, Proveedor, Categoria, Marca
+from .models import MovimientoStock, Producto, Proveedor, Categoria, Marca
+from uglobals.serializers import ProveedorSerializer, CategoriaSerializer, MarcaSerializer
+from uglobals.campos import CamposDinamicosSerializerMixin
+from uglobals.catalogos import CatalogoRelatedField
+from . import imagenes
+
+
+class VariantesImagenField(serializers.ReadOnlyField):
+    # imagen_variantes como {variante: {formato: url}} (o None si aún no se generaron)
+    def to_representation(self, value):
+        return imagenes.urls(value, self.context.get('request'))
+
+
+class ProductoSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
+    # Con ?expand=proveedor,categoria,marca esas relaciones salen como objeto en vez de id
+    campos_expandibles = ('proveedor', 'categoria', 'marca')
+    expandir_por_defecto = ()
 
-class ProductoSerializer(serializers.ModelSerializer):
     proveedor_nombre = serializers.ReadOnlyField(source='proveedor.nombre')
     categoria_nombre = serializers.ReadOnlyField(source='categoria.nombre')
     marca_nombre = serializers.ReadOnlyField(source='marca.nombre')
 
-    proveedor = serializers.PrimaryKeyRelatedField(
+    # Se validan contra el caché de catálogos, sin consultar en cada escritura
+    proveedor = CatalogoRelatedField(
         queryset=Proveedor.objects.all()
     )
-    categoria = serializers.PrimaryKeyRelatedField(
+    categoria = CatalogoRelatedField(
         queryset=Categoria.objects.all(),
         # Si quieres que la categoría sea opcional como en tu modelo (null=True),
         # deberías agregar blank=True en el modelo y luego aquí:
         # allow_null=True,
         # required=False
     )
-    marca = serializers.PrimaryKeyRelatedField(
+    marca = CatalogoRelatedField(
         queryset=Marca.objects.all(),
         allow_null=True,
         required=False
@@ -26,6 +42,8 @@ class ProductoSerializer(serializers.ModelSerializer):
     # CAMBIO AQUÍ: Ahora es ImageField
     # Lo hacemos no requerido y permitimos nulos, ya que es opcional y puede venir de URL o archivo
     imagen = serializers.ImageField(required=False, allow_null=True)
+    # URLs de la miniatura y el tamaño medio (WebP y JPEG) para listados y la grilla del POS
+    imagen_variantes = VariantesImagenField()
 
     class Meta:
         model = Producto
@@ -40,6 +58,7 @@ class ProductoSerializer(serializers.ModelSerializer):
             'proveedor',
             'categoria',
             'imagen',
+            'imagen_variantes',
             'fecha_creacion',
             'activo',
             'marca_nombre',
@@ -49,4 +68,23 @@ class ProductoSerializer(serializers.ModelSerializer):
         read_only_fields = ['fecha_creacion']
         extra_kwargs = {
             'referencia_producto': {'required': False, 'allow_null': True}
-        }
\ No newline at end of file
+        }
+
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        relaciones = (
+            ('proveedor', ProveedorSerializer),
+            ('categoria', CategoriaSerializer),
+            ('marca', MarcaSerializer),
+        )
+        for nombre, serializer_class in relaciones:
+            if self.debe_expandir(nombre):
+                relacionado = getattr(instance, nombre)
+                representation[nombre] = serializer_class(relacionado).data if relacionado else None
+        return representation
+
+
+class MovimientoStockSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MovimientoStock
+        fields = ['id', 'fecha', 'cantidad', 'tipo', 'documento']
@@ -0,0 +1,203 @@
+# products/stock.py
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import Case, F, Max, Q, Sum, When
+
+from . import escaneo
+from .models import MovimientoStock, Producto, SaldoStock
+
+# Todos los cambios de stock pasan por aquí: cada operación es un único UPDATE con
+# stock = stock ± X (F() + Case/When por producto), nunca un leer-sumar-guardar en Python,
+# así dos ventas o anulaciones simultáneas no se pisan. Cada operación escribe además sus
+# filas del kardex (MovimientoStock) con un bulk_create en la misma transacción.
+
+
+def cantidades_por_producto(pares):
+    """
+    Suma las cantidades de pares (producto_id, cantidad); un producto puede venir en
+    varias líneas. Conserva el orden de aparición.
+    """
+    cantidades = OrderedDict()
+    for producto_id, cantidad in pares:
+        cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+    return cantidades
+
+
+def descontar_stock(cantidades, tipo=MovimientoStock.VENTA, documento=''):
+    """
+    Descuenta {producto_id: cantidad} de una vez. Bloquea los productos con un único
+    select_for_update ordenado por id (dos ventas concurrentes bloquean en el mismo orden,
+    sin deadlocks), valida el stock en memoria y aplica un solo UPDATE condicional.
+    Lanza ValidationError si algún producto no existe o no alcanza. Devuelve {id: Producto}
+    con los valores leídos antes del descuento.
+    """
+    if not cantidades:
+        return {}
+
+    with transaction.atomic():
+        productos = {
+            producto.pk: producto
+            for producto in Producto.objects.select_for_update().filter(id__in=cantidades).order_by('id')
+        }
+        for producto_id, cantidad in cantidades.items():
+            producto = productos.get(producto_id)
+            if producto is None:
+                raise ValidationError(f"Producto con referencia '{producto_id}' no encontrado.")
+            if producto.stock < cantidad:
+                raise ValidationError(
+                    f"Stock insuficiente para el producto '{producto.nombre}'. "
+                    f"Stock actual: {producto.stock}, intentó vender: {cantidad}."
+                )
+
+        # La condición stock >= cantidad se repite en el WHERE como salvaguarda
+        condicion = Q()
+        for producto_id, cantidad in cantidades.items():
+            condicion |= Q(id=producto_id, stock__gte=cantidad)
+        actualizados = Producto.objects.filter(condicion).update(
+            stock=_sumar(cantidades, -1), fecha_actualizacion=timezone.now(),
+        )
+        if actualizados != len(cantidades):
+            raise ValidationError("El stock cambió mientras se registraba la venta. Intente de nuevo.")
+        _registrar_movimientos(cantidades, -1, tipo, documento)
+        escaneo.invalidar(cantidades)
+    return productos
+
+
+def devolver_stock(cantidades, tipo=MovimientoStock.DEVOLUCION, documento=''):
+    """
+    Devuelve {producto_id: cantidad} al inventario en un solo UPDATE (anulaciones,
+    detalles eliminados). Devuelve el número de productos actualizados.
+    """
+    cantidades = {producto_id: cantidad for producto_id, cantidad in cantidades.items() if cantidad}
+    if not cantidades:
+        return 0
+    with transaction.atomic():
+        actualizados = Producto.objects.filter(id__in=cantidades).update(
+            stock=_sumar(cantidades, 1), fecha_actualizacion=timezone.now(),
+        )
+        _registrar_movimientos(cantidades, 1, tipo, documento)
+        escaneo.invalidar(cantidades)
+    return actualizados
+
+
+def _registrar_movimientos(cantidades, signo, tipo, documento):
+    fecha = timezone.now()
+    MovimientoStock.objects.bulk_create([
+        MovimientoStock(producto_id=producto_id, fecha=fecha, cantidad=signo * cantidad, tipo=tipo, documento=documento)
+        for producto_id, cantidad in cantidades.items() if cantidad
+    ])
+
+
+def _sumar(cantidades, signo):
+    return Case(
+        *[When(id=producto_id, then=F('stock') + signo * cantidad) for producto_id, cantidad in cantidades.items()],
+        default=F('stock'),
+    )
+
+
+def movimientos_producto(producto_id, desde=None, hasta=None):
+    """
+    Movimientos del kardex de un producto en [desde, hasta], en orden cronológico
+    (rango sobre el índice (producto, fecha, id)).
+    """
+    movimientos = MovimientoStock.objects.filter(producto_id=producto_id)
+    if desde is not None:
+        movimientos = movimientos.filter(fecha__gte=desde)
+    if hasta is not None:
+        movimientos = movimientos.filter(fecha__lte=hasta)
+    return movimientos.order_by('fecha', 'id')
+
+
+def stock_en_fecha(fecha=None, productos=None):
+    """
+    Stock según el kardex al momento 'fecha' (None = ahora) de los productos indicados
+    (ids; None = todos los que tienen movimientos), como {producto_id: stock}.
+    Parte del último cierre (SaldoStock) anterior a la fecha y suma solo los movimientos
+    posteriores a él.
+    """
+    saldos = SaldoStock.objects.all()
+    movimientos = MovimientoStock.objects.all()
+    if fecha is not None:
+        saldos = saldos.filter(fecha__lte=fecha)
+        movimientos = movimientos.filter(fecha__lte=fecha)
+    if productos is not None:
+        productos = list(productos)
+        saldos = saldos.filter(producto_id__in=productos)
+        movimientos = movimientos.filter(producto_id__in=productos)
+
+    # Los cierres se toman para todos los productos a la vez: basta el último corte
+    corte = saldos.aggregate(corte=Max('fecha'))['corte']
+    stock = {}
+    if corte is not None:
+        stock = dict(saldos.filter(fecha=corte).values_list('producto_id', 'stock'))
+        movimientos = movimientos.filter(fecha__gt=corte)
+    for producto_id, cantidad in movimientos.values('producto_id').annotate(total=Sum('cantidad')).values_list('producto_id', 'total'):
+        stock[producto_id] = stock.get(producto_id, 0) + cantidad
+    return stock
+
+
+def cerrar_stock(fecha, tamano=2000):
+    """
+    Guarda el saldo al corte 'fecha' (SaldoStock) de cada producto con movimientos hasta
+    entonces, calculado por lotes de 'tamano' productos. Todo el cierre va en una
+    transacción: stock_en_fecha nunca ve un corte a medias. Si ya había un cierre en esa
+    fecha se reemplaza. Devuelve el número de saldos guardados.
+    """
+    ids = list(
+        MovimientoStock.objects.filter(fecha__lte=fecha).order_by('producto_id')
+        .values_list('producto_id', flat=True).distinct()
+    )
+    guardados = 0
+    with transaction.atomic():
+        SaldoStock.objects.filter(fecha=fecha).delete()
+        for inicio in range(0, len(ids), tamano):
+            saldos = stock_en_fecha(fecha, ids[inicio:inicio + tamano])
+            SaldoStock.objects.bulk_create([
+                SaldoStock(producto_id=producto_id, fecha=fecha, stock=stock) for producto_id, stock in saldos.items()
+            ])
+            guardados += len(saldos)
+    return guardados
+
+
+def conciliar_stock(tamano=2000, ajustar=False):
+    """
+    Compara Producto.stock con el kardex recorriendo los productos por lotes de 'tamano'
+    (keyset por id: la memoria no crece con el catálogo). Genera (producto_id, nombre,
+    stock, stock_kardex) por cada diferencia; con ajustar=True además escribe un movimiento
+    de ajuste para que el kardex vuelva a cuadrar con Producto.stock.
+    """
+    ultimo = 0
+    while True:
+        lote = list(
+            Producto.objects.filter(id__gt=ultimo).order_by('id').values_list('id', 'nombre', 'stock')[:tamano]
+        )
+        if not lote:
+            return
+        ultimo = lote[-1][0]
+        kardex = stock_en_fecha(productos=[producto_id for producto_id, _, _ in lote])
+        sospechosos = [producto_id for producto_id, _, stock in lote if stock != kardex.get(producto_id, 0)]
+        if sospechosos:
+            yield from _confirmar_diferencias(sospechosos, ajustar)
+
+
+def _confirmar_diferencias(ids, ajustar):
+    # Una venta entre las dos lecturas del lote da un falso descuadre: se vuelven a leer
+    # con los productos bloqueados (las ventas escriben stock y kardex en la misma transacción)
+    with transaction.atomic():
+        productos = list(Producto.objects.select_for_update().filter(id__in=ids).order_by('id').values_list('id', 'nombre', 'stock'))
+        kardex = stock_en_fecha(productos=ids)
+        diferencias = [
+            (producto_id, nombre, stock, kardex.get(producto_id, 0))
+            for producto_id, nombre, stock in productos if stock != kardex.get(producto_id, 0)
+        ]
+        if ajustar:
+            fecha = timezone.now()
+            MovimientoStock.objects.bulk_create([
+                MovimientoStock(producto_id=producto_id, fecha=fecha, cantidad=stock - stock_kardex,
+                                tipo=MovimientoStock.AJUSTE, documento='Conciliación')
+                for producto_id, _, stock, stock_kardex in diferencias
+            ])
+    yield from diferencias
@@ -0,0 +1,539 @@
+# products/tests.py
+import importlib
+import io
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.apps import apps
+from django.core.management import call_command
+from django.db import connection
+from django.core.files.storage import default_storage
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from PIL import Image
+
+from products import autocompletar, escaneo, imagenes
+from products.models import PREFIJO_REFERENCIA, MovimientoStock, Producto, SaldoStock
+from products.views import servir_variante_imagen
+from products.stock import cerrar_stock, conciliar_stock, movimientos_producto, stock_en_fecha
+from sales.models import Cliente
+from sales.services import registrar_factura
+from uglobals import versiones
+from uglobals.models import Categoria, FormaPago, Marca, Proveedor, Secuencia
+from uglobals.secuencias import reservar
+from users.models import Usuario
+
+
+class ReferenciaProductoTest(TestCase):
+    def setUp(self):
+        self.proveedor = Proveedor.objects.create(nombre='Proveedor')
+
+    def _productos(self, *referencias):
+        return [Producto(nombre=f'Producto {i}', proveedor=self.proveedor, referencia_producto=referencia)
+                for i, referencia in enumerate(referencias)]
+
+    def test_bulk_create_reserva_una_vez_y_respeta_las_existentes(self):
+        with mock.patch('products.models.reservar', wraps=reservar) as reservar_mock:
+            Producto.objects.bulk_create(self._productos(None, 'MANUAL-1', None, None))
+        reservar_mock.assert_called_once_with('producto', 3)
+        referencias = list(Producto.objects.order_by('nombre').values_list('referencia_producto', flat=True))
+        self.assertEqual(referencias, [
+            f'{PREFIJO_REFERENCIA}000000001', 'MANUAL-1', f'{PREFIJO_REFERENCIA}000000002', f'{PREFIJO_REFERENCIA}000000003',
+        ])
+
+        # Las altas siguientes continúan el contador, también una a una
+        Producto.objects.bulk_create(self._productos(None, None))
+        suelto = Producto.objects.create(nombre='Suelto', proveedor=self.proveedor)
+        self.assertEqual(suelto.referencia_producto, f'{PREFIJO_REFERENCIA}000000006')
+        self.assertEqual(Producto.objects.filter(referencia_producto__startswith=PREFIJO_REFERENCIA).count(), 6)
+
+    def test_migracion_arranca_despues_del_mayor_sufijo(self):
+        migracion = importlib.import_module('products.migrations.0002_secuencia_producto')
+        Producto.objects.bulk_create(self._productos(f'{PREFIJO_REFERENCIA}000000500', f'{PREFIJO_REFERENCIA}X', 'OTRA-900'))
+        Secuencia.objects.filter(nombre='producto').delete()
+        migracion.inicializar_secuencia_producto(apps, None)
+        self.assertEqual(Secuencia.objects.get(nombre='producto').valor, 500)
+        producto = Producto.objects.create(nombre='Nuevo', proveedor=self.proveedor)
+        self.assertEqual(producto.referencia_producto, f'{PREFIJO_REFERENCIA}000000501')
+
+
+class KardexStockTest(TestCase):
+    def setUp(self):
+        self.producto = Producto.objects.create(
+            nombre='Producto', proveedor=Proveedor.objects.create(nombre='Proveedor'),
+            categoria=Categoria.objects.create(nombre='Categoria'), marca=Marca.objects.create(nombre='Marca'),
+            stock=20, precio_sugerido_venta=Decimal('10.00'),
+        )
+        self.datos_factura = {
+            'cliente': Cliente.objects.create(nombre='Cliente', email='cliente@keeplic.com'),
+            'forma_pago': FormaPago.objects.create(metodo='Efectivo'),
+            'usuario': Usuario.objects.create_user('cajero', 'cajero@keeplic.com', 'clave'),
+        }
+
+    def _vender(self, cantidad):
+        return registrar_factura(dict(self.datos_factura), [{'producto': self.producto, 'cantidad': cantidad}])
+
+    def _en(self, momento):
+        return mock.patch('django.utils.timezone.now', return_value=momento)
+
+    def test_cada_cambio_de_stock_queda_en_el_kardex(self):
+        factura = self._vender(3)
+        self.client.post(f'/api/facturas/{factura.pk}/anular/')
+        self.producto.refresh_from_db()
+        self.producto.stock = 25
+        self.producto.save()
+
+        movimientos = list(movimientos_producto(self.producto.pk).values_list('tipo', 'cantidad', 'documento'))
+        self.assertEqual(movimientos, [
+            (MovimientoStock.INICIAL, 20, ''),
+            (MovimientoStock.VENTA, -3, factura.id_factura),
+            (MovimientoStock.ANULACION, 3, factura.id_factura),
+            (MovimientoStock.AJUSTE, 5, ''),
+        ])
+        self.assertEqual(stock_en_fecha(productos=[self.producto.pk]), {self.producto.pk: 25})
+
+    def test_stock_en_fecha_parte_del_ultimo_cierre(self):
+        ayer = timezone.now() - timedelta(days=1)
+        MovimientoStock.objects.filter(producto=self.producto).update(fecha=ayer - timedelta(hours=1))
+        with self._en(ayer + timedelta(hours=1)):
+            self._vender(4)
+        self.assertEqual(cerrar_stock(ayer), 1)
+        self.assertEqual(SaldoStock.objects.get().stock, 20)
+        self._vender(6)
+
+        # El cierre reemplaza todos los movimientos anteriores: solo se suman los posteriores
+        MovimientoStock.objects.filter(fecha__lte=ayer).delete()
+        self.assertEqual(stock_en_fecha(ayer)[self.producto.pk], 20)
+        self.assertEqual(stock_en_fecha(ayer + timedelta(hours=2))[self.producto.pk], 16)
+        self.assertEqual(stock_en_fecha()[self.producto.pk], 10)
+
+    def test_conciliar_detecta_y_ajusta_diferencias(self):
+        self._vender(2)
+        Producto.objects.filter(pk=self.producto.pk).update(stock=30) # Cambio por fuera del kardex
+
+        self.assertEqual(list(conciliar_stock(tamano=1)), [(self.producto.pk, 'Producto', 30, 18)])
+        salida = io.StringIO()
+        call_command('conciliar_stock', '--ajustar', stdout=salida)
+        self.assertIn('+12', salida.getvalue())
+        self.assertEqual(list(conciliar_stock()), [])
+
+    def test_api_movimientos_y_stock_en_fecha(self):
+        self._vender(5)
+        url = f'/api/productos/{self.producto.referencia_producto}'
+        respuesta = self.client.get(f'{url}/movimientos/?limit=1')
+        self.assertEqual([m['cantidad'] for m in respuesta.data['results']], [20])
+        siguiente = self.client.get(respuesta.data['next'])
+        self.assertEqual([m['tipo'] for m in siguiente.data['results']], [MovimientoStock.VENTA])
+
+        hoy = timezone.localdate().isoformat()
+        self.assertEqual(self.client.get(f'{url}/stock-en-fecha/?fecha={hoy}').data['stock'], 15)
+        self.assertEqual(self.client.get(f'{url}/stock-en-fecha/?fecha=2000-01-01').data['stock'], 0)
+        self.assertEqual(self.client.get(f'{url}/stock-en-fecha/?fecha=ayer').status_code, 400)
+
+
+class BusquedaProductoTest(TestCase):
+    def setUp(self):
+        proveedor = Proveedor.objects.create(nombre='Ferretería Central')
+        herramientas = Categoria.objects.create(nombre='Herramientas')
+        self.marca = Marca.objects.create(nombre='Stanley')
+        self.martillo = Producto.objects.create(nombre='Martillo de uña', proveedor=proveedor, categoria=herramientas, marca=self.marca)
+        self.tornillo = Producto.objects.create(nombre='Tornillo galvanizado 6mm', proveedor=proveedor, categoria=herramientas)
+        self.torno = Producto.objects.create(nombre='Torno de banco', proveedor=proveedor, categoria=herramientas)
+        Producto.objects.bulk_create([
+            Producto(nombre=f'Destornillador {i}', proveedor=proveedor, categoria=herramientas) for i in range(3)
+        ])
+
+    def _nombres(self, consulta):
+        respuesta = self.client.get('/api/productos/', {'search': consulta})
+        return [producto['nombre'] for producto in respuesta.data]
+
+    def test_prefijo_y_relevancia(self):
+        nombres = self._nombres('torn')
+        self.assertEqual(nombres[:2], ['Tornillo galvanizado 6mm', 'Torno de banco']) # Prefijo antes que subcadena
+        self.assertEqual(len(nombres), 5)
+
+    def test_tolera_errores_de_tipeo_y_tildes(self):
+        self.assertEqual(self._nombres('martiyo')[0], 'Martillo de uña')
+        self.assertEqual(self._nombres('una martillo'), ['Martillo de uña'])
+
+    def test_busca_por_marca_y_referencia(self):
+        self.assertEqual(self._nombres('stanley'), ['Martillo de uña'])
+        self.assertEqual(self._nombres(self.torno.referencia_producto), ['Torno de banco'])
+
+    def test_el_documento_sigue_los_cambios(self):
+        self.marca.nombre = 'Truper'
+        self.marca.save()
+        self.assertEqual(self._nombres('truper'), ['Martillo de uña'])
+        self.marca.delete()
+        self.assertEqual(self._nombres('truper'), [])
+        self.tornillo.nombre = 'Perno hexagonal'
+        self.tornillo.save()
+        self.assertEqual(self._nombres('perno'), ['Perno hexagonal'])
+        self.tornillo.delete()
+        self.assertEqual(self._nombres('perno'), [])
+
+    def test_busqueda_corta_usa_los_campos_de_la_vista(self):
+        self.assertEqual(self._nombres('6m'), ['Tornillo galvanizado 6mm'])
+
+
+@override_settings(PRODUCTOS_LOOKUP_REFRESCO_SEGUNDOS=0)
+class AutocompletarProductoTest(TestCase):
+    def setUp(self):
+        autocompletar.limpiar()
+        self.addCleanup(autocompletar.limpiar)
+        datos = {'proveedor': Proveedor.objects.create(nombre='Proveedor'), 'categoria': Categoria.objects.create(nombre='Categoria')}
+        self.martillo = Producto.objects.create(nombre='Martillo de uña', stock=4, precio_sugerido_venta=Decimal('25.50'), **datos)
+        self.tornillo = Producto.objects.create(nombre='Tornillo 6mm', stock=100, **datos)
+        self.torno = Producto.objects.create(nombre='Torno de banco', stock=2, **datos)
+        Producto.objects.create(nombre='Tornillo inactivo', activo=False, **datos)
+
+    def _lookup(self, consulta, **parametros):
+        respuesta = self.client.get('/api/productos/lookup/', {'q': consulta, **parametros})
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.data
+
+    def test_prefijo_de_referencia_o_palabras_del_nombre(self):
+        self.assertEqual([p['nombre'] for p in self._lookup('torn')], ['Tornillo 6mm', 'Torno de banco'])
+        self.assertEqual([p['nombre'] for p in self._lookup('torn ban')], ['Torno de banco'])
+        self.assertEqual([p['nombre'] for p in self._lookup('torn', limite=1)], ['Tornillo 6mm'])
+        self.assertEqual(self._lookup(self.martillo.referencia_producto.lower()), [{
+            'id': self.martillo.pk, 'referencia_producto': self.martillo.referencia_producto,
+            'nombre': 'Martillo de uña', 'precio_sugerido_venta': '25.50', 'stock': 4,
+        }])
+        self.assertEqual([p['nombre'] for p in self._lookup('UNA')], ['Martillo de uña'])
+
+    def test_se_actualiza_con_los_cambios_de_productos(self):
+        with self.assertNumQueries(1):
+            self._lookup('torn') # Construye el índice
+        registrar_factura({
+            'cliente': Cliente.objects.create(nombre='Cliente', email='cliente@keeplic.com'),
+            'forma_pago': FormaPago.objects.create(metodo='Efectivo'),
+            'usuario': Usuario.objects.create_user('cajero', 'cajero@keeplic.com', 'clave'),
+        }, [{'producto': self.torno, 'cantidad': 2}])
+        self.tornillo.nombre = 'Perno 6mm'
+        self.tornillo.save()
+        self.martillo.activo = False
+        self.martillo.save()
+        Producto.objects.create(nombre='Tornamesa', proveedor=self.torno.proveedor, categoria=self.torno.categoria)
+        # Solo se leen los productos modificados y los borrados
+        with self.assertNumQueries(2):
+            resultado = self._lookup('torn')
+        self.assertEqual([(p['nombre'], p['stock']) for p in resultado], [('Tornamesa', 0), ('Torno de banco', 0)])
+        self.assertEqual(self._lookup('mart'), [])
+        self.assertEqual([p['nombre'] for p in self._lookup('pern')], ['Perno 6mm'])
+
+        Producto.objects.get(nombre='Perno 6mm').delete()
+        self.assertEqual(self._lookup('pern'), [])
+
+    def test_borrar_y_crear_entre_refrescos(self):
+        self._lookup('torn')
+        # La cantidad de activos no cambia: el borrado se ve por la anotación
+        self.torno.delete()
+        Producto.objects.create(nombre='Tornamesa', proveedor=self.torno.proveedor, categoria=self.torno.categoria)
+        self.assertEqual([p['nombre'] for p in self._lookup('torn')], ['Tornamesa', 'Tornillo 6mm'])
+
+    def test_limite_invalido(self):
+        respuesta = self.client.get('/api/productos/lookup/', {'q': 'torn', 'limite': 'diez'})
+        self.assertEqual(respuesta.status_code, 400)
+
+
+@override_settings(ESCANEO_CACHE_MAX=2, ESCANEO_CACHE_REVALIDAR_SEGUNDOS=60)
+class EscaneoProductoTest(TransactionTestCase):
+    def setUp(self):
+        escaneo.limpiar()
+        self.addCleanup(escaneo.limpiar)
+        datos = {'proveedor': Proveedor.objects.create(nombre='Proveedor'), 'categoria': Categoria.objects.create(nombre='Categoria')}
+        self.productos = [
+            Producto.objects.create(nombre=f'Producto {i}', stock=10, precio_sugerido_venta=Decimal('5.00'), **datos)
+            for i in range(3)
+        ]
+        self.referencias = [producto.referencia_producto for producto in self.productos]
+
+    def _escanear(self, referencia):
+        return self.client.get('/api/productos/escanear/', {'referencia': referencia})
+
+    def test_escaneo_repetido_sale_del_cache_hasta_que_cambia_el_stock(self):
+        respuesta = self._escanear(self.referencias[0])
+        self.assertEqual(respuesta.data, {
+            'id': self.productos[0].pk, 'referencia_producto': self.referencias[0], 'nombre': 'Producto 0',
+            'precio_sugerido_venta': '5.00', 'stock': 10, 'activo': True,
+        })
+        with self.assertNumQueries(0):
+            self.assertEqual(self._escanear(self.referencias[0]).data['stock'], 10)
+
+        registrar_factura({
+            'cliente': Cliente.objects.create(nombre='Cliente', email='cliente@keeplic.com'),
+            'forma_pago': FormaPago.objects.create(metodo='Efectivo'),
+            'usuario': Usuario.objects.create_user('cajero', 'cajero@keeplic.com', 'clave'),
+        }, [{'producto': self.productos[0], 'cantidad': 4}])
+        self.assertEqual(self._escanear(self.referencias[0]).data['stock'], 6)
+
+        # Un cambio hecho por otro proceso se ve al revalidar
+        Producto.objects.filter(pk=self.productos[0].pk).update(stock=1, fecha_actualizacion=timezone.now())
+        self.assertEqual(self._escanear(self.referencias[0]).data['stock'], 6)
+        with override_settings(ESCANEO_CACHE_REVALIDAR_SEGUNDOS=0):
+            self.assertEqual(self._escanear(self.referencias[0]).data['stock'], 1)
+
+        self.assertEqual(self._escanear('NO-EXISTE').status_code, 404)
+
+    def test_lote_en_una_consulta_y_lru_acotado(self):
+        self._escanear(self.referencias[0])
+        pedidas = [self.referencias[1], 'NO-EXISTE', self.referencias[0], self.referencias[1]]
+        with self.assertNumQueries(1): # Solo las que no están en el cache
+            respuesta = self.client.post('/api/productos/escanear/', {'referencias': pedidas}, content_type='application/json')
+        self.assertEqual(
+            [fila and fila['nombre'] for fila in respuesta.data['productos']],
+            ['Producto 1', None, 'Producto 0', 'Producto 1'],
+        )
+        self.assertEqual(respuesta.data['no_encontradas'], ['NO-EXISTE'])
+
+        # Con ESCANEO_CACHE_MAX=2 entra la tercera y sale la menos usada (Producto 1)
+        self._escanear(self.referencias[0])
+        self._escanear(self.referencias[2])
+        with self.assertNumQueries(0):
+            self._escanear(self.referencias[0])
+            self._escanear(self.referencias[2])
+        with self.assertNumQueries(1):
+            self._escanear(self.referencias[1])
+
+        respuesta = self.client.post('/api/productos/escanear/', {'referencias': 'X'}, content_type='application/json')
+        self.assertEqual(respuesta.status_code, 400)
+
+
+class ImportacionProductoTest(TestCase):
+    def setUp(self):
+        self.proveedor = Proveedor.objects.create(nombre='Ferretería Central')
+        Categoria.objects.create(nombre='Herramientas')
+        self.existente = Producto.objects.create(
+            nombre='Martillo', proveedor=self.proveedor, stock=5, precio_sugerido_venta=Decimal('20.00'),
+        )
+
+    def _importar(self, contenido, **datos):
+        archivo = SimpleUploadedFile('productos.csv', contenido.encode('utf-8'), content_type='text/csv')
+        return self.client.post('/api/productos/importar/', {'archivo': archivo, **datos})
+
+    def test_crea_y_actualiza_por_referencia_con_errores_por_fila(self):
+        respuesta = self._importar(
+            'referencia_producto,nombre,precio_sugerido_venta,stock,proveedor,categoria,marca\n'
+            f'{self.existente.referencia_producto},,"25,50",8,,,\n'
+            ',Destornillador,12.00,10,ferretería central,Herramientas,\n'
+            ',Serrucho,caro,1,Ferretería Central,,\n'
+            ',Taladro,90,2,Proveedor Nuevo,,\n'
+            'REF-NUEVA,,5,1,Ferretería Central,,\n'
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(
+            {clave: respuesta.data[clave] for clave in ('filas', 'creados', 'actualizados', 'con_errores')},
+            {'filas': 5, 'creados': 1, 'actualizados': 1, 'con_errores': 3},
+        )
+        self.assertEqual([(error['fila'], list(error['errores'])) for error in respuesta.data['errores']], [
+            (4, ['precio_sugerido_venta']), (5, ['proveedor']), (6, ['nombre']),
+        ])
+
+        self.existente.refresh_from_db()
+        self.assertEqual((self.existente.nombre, self.existente.precio_sugerido_venta, self.existente.stock),
+                         ('Martillo', Decimal('25.50'), 8))
+        destornillador = Producto.objects.get(nombre='Destornillador')
+        self.assertTrue(destornillador.referencia_producto.startswith('PRODKEEPLIC'))
+        self.assertEqual(destornillador.proveedor, self.proveedor)
+        self.assertEqual(destornillador.categoria.nombre, 'Herramientas')
+        # Los cambios de stock quedan en el kardex
+        self.assertEqual(stock_en_fecha(productos=[self.existente.pk, destornillador.pk]),
+                         {self.existente.pk: 8, destornillador.pk: 10})
+        self.assertEqual(MovimientoStock.objects.get(producto=self.existente, documento='Importación').cantidad, 3)
+
+    def test_crear_catalogos_y_exportacion_importable(self):
+        respuesta = self._importar('nombre,proveedor,marca\nTaladro,Proveedor Nuevo,Bosch\n', crear_catalogos='true')
+        self.assertEqual(respuesta.data['creados'], 1)
+        self.assertEqual(Producto.objects.get(nombre='Taladro').marca.nombre, 'Bosch')
+
+        respuesta = self.client.get('/api/productos/exportar/')
+        exportado = b''.join(respuesta.streaming_content).decode('utf-8')
+        self.assertEqual(exportado.splitlines()[0], ','.join(
+            ['referencia_producto', 'nombre', 'precio_costo', 'precio_sugerido_venta', 'stock', 'proveedor', 'categoria', 'marca', 'activo'],
+        ))
+        self.assertIn(',Taladro,0.00,0.00,0,Proveedor Nuevo,,Bosch,si', exportado)
+
+        # Reimportar lo exportado no cambia nada
+        respuesta = self._importar(exportado)
+        self.assertEqual((respuesta.data['creados'], respuesta.data['actualizados'], respuesta.data['con_errores']), (0, 2, 0))
+        self.assertEqual(MovimientoStock.objects.filter(documento='Importación').count(), 0)
+
+    def test_archivo_invalido(self):
+        self.assertEqual(self._importar('precio,stock\n1,2\n').status_code, 400)
+        archivo = SimpleUploadedFile('productos.txt', b'nombre\nX\n')
+        self.assertEqual(self.client.post('/api/productos/importar/', {'archivo': archivo}).status_code, 400)
+
+    def test_comando(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8', delete=False) as archivo:
+            archivo.write('nombre,proveedor,stock\nLlave inglesa,Ferretería Central,4\nAlicate,Otro,1\n')
+        self.addCleanup(os.remove, archivo.name)
+        salida = io.StringIO()
+        call_command('importar_productos', archivo.name, stdout=salida)
+        self.assertIn('2 filas: 1 productos creados, 0 actualizados, 1 con errores.', salida.getvalue())
+        self.assertIn("Fila 3 (sin referencia): proveedor: 'Otro' no existe", salida.getvalue())
+        self.assertEqual(Producto.objects.get(nombre='Llave inglesa').stock, 4)
+
+
+def imagen_prueba(color='red', tamano=(1200, 900), formato='JPEG'):
+    salida = io.BytesIO()
+    Image.new('RGB', tamano, color).save(salida, formato)
+    return salida.getvalue()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ImagenesProductoTest(TestCase):
+    def setUp(self):
+        self.proveedor = Proveedor.objects.create(nombre='Proveedor')
+        self.categoria = Categoria.objects.create(nombre='Categoria')
+
+    def _crear(self, nombre, contenido):
+        return self.client.post('/api/productos/', {
+            'nombre': nombre, 'proveedor': self.proveedor.pk, 'categoria': self.categoria.pk,
+            'imagen': SimpleUploadedFile(f'{nombre}.jpg', contenido, content_type='image/jpeg'),
+        })
+
+    def test_variantes_generadas_fuera_de_la_peticion(self):
+        respuesta = self._crear('Foto', imagen_prueba())
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertIsNone(respuesta.data['imagen_variantes'])
+        producto = Producto.objects.get(nombre='Foto')
+        self.assertTrue(producto.imagen_pendiente)
+
+        self.assertEqual(imagenes.procesar_pendientes(), (1, 1))
+        self.assertEqual(imagenes.procesar_pendientes(), (0, 0))
+        variantes = self.client.get(f'/api/productos/{producto.referencia_producto}/').data['imagen_variantes']
+        self.assertEqual(set(variantes), {'miniatura', 'mediana'})
+        huella = imagenes.huella(imagen_prueba())
+        self.assertTrue(variantes['miniatura']['webp'].endswith(f'/media/productos/variantes/{huella}-miniatura.webp'))
+        with default_storage.open(imagenes.ruta(huella, 'mediana', 'jpeg')) as archivo:
+            self.assertEqual(Image.open(archivo).size, (640, 480))
+        with default_storage.open(imagenes.ruta(huella, 'miniatura', 'webp')) as archivo:
+            imagen = Image.open(archivo)
+            self.assertEqual((imagen.format, imagen.size), ('WEBP', (160, 120)))
+
+        # Otra imagen vuelve a encolar el producto y deja de mostrar las variantes viejas
+        producto.imagen = SimpleUploadedFile('otra.png', imagen_prueba('blue', formato='PNG'))
+        producto.save()
+        producto.refresh_from_db()
+        self.assertEqual((producto.imagen_pendiente, producto.imagen_variantes), (True, {}))
+        producto.nombre = 'Foto editada'
+        producto.save() # Sin cambiar la imagen no se encola de nuevo
+        self.assertEqual(imagenes.procesar_pendientes(), (1, 1))
+        producto.refresh_from_db()
+        self.assertEqual(producto.imagen_variantes['huella'], imagenes.huella(imagen_prueba('blue', formato='PNG')))
+
+    def test_no_guarda_variantes_de_una_imagen_reemplazada(self):
+        self._crear('Foto', imagen_prueba())
+        producto = Producto.objects.get(nombre='Foto')
+        nombre_anterior = producto.imagen.name
+        producto.imagen = SimpleUploadedFile('nueva.jpg', imagen_prueba('green'))
+        producto.save()
+        self.assertFalse(imagenes.procesar(producto.pk, nombre_anterior))
+        producto.refresh_from_db()
+        self.assertTrue(producto.imagen_pendiente)
+
+    def test_archivo_que_no_es_imagen_sale_de_la_cola(self):
+        producto = Producto.objects.create(nombre='Roto', proveedor=self.proveedor, categoria=self.categoria)
+        producto.imagen = SimpleUploadedFile('roto.jpg', b'no es una imagen')
+        producto.save()
+        with self.assertLogs('products.imagenes', 'WARNING'):
+            self.assertEqual(imagenes.procesar_pendientes(), (1, 0))
+        producto.refresh_from_db()
+        self.assertEqual((producto.imagen_pendiente, producto.imagen_variantes), (False, {}))
+
+    def test_cualquier_error_al_decodificar_saca_el_producto_de_la_cola(self):
+        self._crear('Exif roto', imagen_prueba())
+        self._crear('Sana', imagen_prueba('green'))
+        llamadas = []
+
+        def exif_roto_la_primera_vez(imagen):
+            llamadas.append(imagen)
+            if len(llamadas) == 1:
+                raise SyntaxError('EXIF mal formado')
+            return imagen
+
+        with mock.patch('products.imagenes.ImageOps.exif_transpose', side_effect=exif_roto_la_primera_vez):
+            with self.assertLogs('products.imagenes', 'WARNING'):
+                self.assertEqual(imagenes.procesar_pendientes(), (2, 1))
+        self.assertEqual(
+            dict(Producto.objects.values_list('nombre', 'imagen_pendiente')), {'Exif roto': False, 'Sana': False},
+        )
+        self.assertEqual(Producto.objects.get(nombre='Exif roto').imagen_variantes, {})
+
+    def test_comando_para_imagenes_existentes_y_cache_larga(self):
+        self._crear('Foto', imagen_prueba())
+        self._crear('Copia', imagen_prueba())
+        # Imágenes cargadas sin pasar por la cola (como las anteriores a esta versión)
+        Producto.objects.update(imagen_pendiente=False)
+        default_storage.save('productos/variantes/0000000000000000-miniatura.webp', io.BytesIO(b'vieja'))
+        salida = io.StringIO()
+        with mock.patch('products.imagenes.timezone.now', return_value=timezone.now() + timedelta(hours=2)):
+            call_command('generar_variantes_imagenes', '--limpiar', stdout=salida)
+        self.assertIn('2 imágenes procesadas, 2 con variantes generadas.', salida.getvalue())
+        self.assertIn('1 variantes sin uso borradas.', salida.getvalue())
+        # La misma imagen en dos productos comparte los archivos
+        rutas = {producto.imagen_variantes['archivos']['miniatura']['jpeg'] for producto in Producto.objects.all()}
+        self.assertEqual(len(rutas), 1)
+        self.assertEqual(len(default_storage.listdir('productos/variantes')[1]), 4)
+
+        salida = io.StringIO()
+        call_command('generar_variantes_imagenes', stdout=salida)
+        self.assertIn('0 imágenes procesadas', salida.getvalue())
+
+        respuesta = servir_variante_imagen(RequestFactory().get('/'), rutas.pop())
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Cache-Control'], 'public, max-age=31536000, immutable')
+
+
+@override_settings(CATALOGOS_CACHE_REVALIDAR_SEGUNDOS=3600)
+class ListadosConsultasProductoTest(TestCase):
+    """
+    Los listados de productos hacen las mismas consultas con pocas o muchas filas (sin N+1).
+    """
+    LISTADOS = [
+        '/api/productos/',
+        '/api/productos/?expand=proveedor,categoria,marca',
+        '/api/productos/?fields=id,nombre,marca_nombre',
+        '/api/productos/?search=producto',
+    ]
+
+    def setUp(self):
+        versiones.limpiar()
+        self.addCleanup(versiones.limpiar)
+        self.creados = 0
+
+    def _agregar(self, cantidad):
+        # Cada vuelta suma un producto con sus catálogos y un ajuste de stock al primero
+        for _ in range(cantidad):
+            i = self.creados = self.creados + 1
+            Producto.objects.create(
+                nombre=f'Producto {i}', stock=10, proveedor=Proveedor.objects.create(nombre=f'Proveedor {i}'),
+                categoria=Categoria.objects.create(nombre=f'Categoria {i}'), marca=Marca.objects.create(nombre=f'Marca {i}'),
+            )
+            primero = Producto.objects.earliest('id')
+            primero.stock += 1
+            primero.save()
+
+    def _consultas(self, url):
+        self.client.get(url) # Las versiones de las tablas quedan recordadas en ambas mediciones
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200, url)
+        return len(consultas)
+
+    def test_consultas_no_crecen_con_las_filas(self):
+        self._agregar(2)
+        listados = self.LISTADOS + [f'/api/productos/{Producto.objects.earliest("id").referencia_producto}/movimientos/']
+        pocas = {url: self._consultas(url) for url in listados}
+        self._agregar(5)
+        for url in listados:
+            with self.subTest(url=url):
+                self.assertEqual(self._consultas(url), pocas[url])
+
@@ -1,24 +1,79 @@
 # products/views.py
-from rest_framework import viewsets, filters # Asegúrate de importar 'filters'
+from rest_framework import viewsets
 from django_filters.rest_framework import DjangoFilterBackend # ¡Importa esto también! (Necesitarás instalar django-filter)
+from datetime import datetime, time
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from .models import Producto
-from .serializers import ProductoSerializer
+from uglobals.models import Categoria, Marca, Proveedor
+from .serializers import MovimientoStockSerializer, ProductoSerializer
+from .stock import movimientos_producto, stock_en_fecha
+from .busqueda import BusquedaProductoFilter
+from . import autocompletar, escaneo
+from .importacion import COLUMNAS, ErrorArchivo, exportar_productos, importar_productos, leer_archivo
+from rest_framework.parsers import FormParser, MultiPartParser
+from uglobals.exportacion import CSVRenderer, NDJSONRenderer, respuesta_streaming
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+from uglobals.campos import CamposDinamicosViewMixin
+from uglobals.condicional import GetCondicionalMixin
+from uglobals.paginacion import PaginacionKeyset, PaginacionOpcional
 
 
-class ProductoViewSet(viewsets.ModelViewSet):
-    queryset = Producto.objects.all().order_by('-fecha_creacion') # <-- ¡CAMBIO CLAVE AQUÍ!
+# Modo cursor (cabecera X-Paginacion: cursor): keyset sobre (fecha_creacion, id)
+class ProductoCursorPagination(PaginacionKeyset):
+    ordenamiento = ('-fecha_creacion', '-id')
+
+# Sin la cabecera la lista sale completa, como siempre
+class ProductoPagination(PaginacionOpcional):
+    paginacion_cursor = ProductoCursorPagination
+
+# Kardex de un producto: siempre por cursor, en orden cronológico (índice producto, fecha, id)
+class MovimientoStockPagination(PaginacionKeyset):
+    ordenamiento = ('fecha', 'id')
+
+
+def leer_momento(valor, fin_del_dia=False):
+    """
+    Convierte "AAAA-MM-DD" o "AAAA-MM-DDTHH:MM[:SS]" en un datetime con zona horaria.
+    Una fecha sola es el inicio del día (o su final, con fin_del_dia). None si no es válido.
+    """
+    try:
+        dia = parse_date(valor)
+        momento = parse_datetime(valor) if dia is None else datetime.combine(dia, time.max if fin_del_dia else time.min)
+    except ValueError:
+        return None
+    if momento is None:
+        return None
+    if timezone.is_naive(momento):
+        momento = timezone.make_aware(momento, timezone.get_current_timezone())
+    return momento
+
+
+# En lecturas acepta ?fields= y ?expand=proveedor,categoria,marca; el queryset carga solo lo pedido.
+# GET condicional: ETag del listado/detalle según fecha_actualizacion y los catálogos que muestra.
+class ProductoViewSet(GetCondicionalMixin, CamposDinamicosViewMixin, viewsets.ModelViewSet):
+    queryset = Producto.objects.all().order_by('-fecha_creacion', '-id') # <-- ¡CAMBIO CLAVE AQUÍ!
     serializer_class = ProductoSerializer
+    pagination_class = ProductoPagination
+    campo_modificacion = 'fecha_actualizacion'
+    modelos_relacionados = (Proveedor, Categoria, Marca)
     
     # 1. Configurar la clave de búsqueda en la URL
     # Esto es CRUCIAL para que DRF use 'referencia_producto' en URLs como /api/productos/PROD001/
     lookup_field = 'referencia_producto'
 
     # 2. Configurar los filtros para la búsqueda
-    # Usaremos 'SearchFilter' de DRF para la búsqueda general (por referencia, nombre, etc.)
+    # ?search= usa el índice de búsqueda (products/busqueda.py): resultados por relevancia,
+    # con prefijos y errores de tipeo. Con menos de 3 caracteres usa los search_fields.
     # Y 'DjangoFilterBackend' si en el futuro quieres filtros exactos por campos específicos (ej. ?categoria=1)
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, BusquedaProductoFilter]
     
-    # Define los campos por los cuales se puede buscar.
+    # Define los campos por los cuales se puede buscar (búsquedas cortas).
     # '__nombre' es para campos de relaciones (ForeignKey) y busca por el nombre de esa relación.
     search_fields = [
         'referencia_producto',
@@ -30,4 +85,102 @@ class ProductoViewSet(viewsets.ModelViewSet):
     ]
     
     # Opcional: Define campos para filtros exactos (ej. /api/productos/?activo=true)
-    # filterset_fields = ['categoria', 'proveedor', 'activo']
\ No newline at end of file
+    # filterset_fields = ['categoria', 'proveedor', 'activo']
+
+    # Autocompletado del POS: ?q= (prefijo de la referencia o de palabras del nombre) y ?limite=.
+    # Responde desde el índice en memoria del proceso, sin serializador ni consultas por tecla.
+    @action(detail=False, methods=['get'], url_path='lookup')
+    def lookup(self, request):
+        try:
+            limite = int(request.query_params.get('limite', settings.PRODUCTOS_LOOKUP_RESULTADOS))
+        except ValueError:
+            return Response({'error': "'limite' debe ser un número entero."}, status=status.HTTP_400_BAD_REQUEST)
+        limite = min(max(limite, 1), settings.PRODUCTOS_LOOKUP_MAX_RESULTADOS)
+        filas = autocompletar.buscar(request.query_params.get('q', ''), limite)
+        return Response([
+            {'id': producto_id, 'referencia_producto': referencia, 'nombre': nombre,
+             'precio_sugerido_venta': str(precio), 'stock': stock}
+            for producto_id, referencia, nombre, precio, stock in filas
+        ])
+
+    # Escaneo en caja por referencia exacta, con el stock, desde el LRU de escaneo.py:
+    #   GET  ?referencia=X                -> el producto, o 404
+    #   POST {"referencias": [X, Y, ...]} -> {"productos": [...], "no_encontradas": [...]}, en el
+    #        orden recibido (null donde no existe); para lectores que acumulan escaneos sin red
+    @action(detail=False, methods=['get', 'post'], url_path='escanear')
+    def escanear(self, request):
+        if request.method == 'GET':
+            referencia = request.query_params.get('referencia', '').strip()
+            fila = escaneo.resolver([referencia]).get(referencia) if referencia else None
+            if fila is None:
+                return Response({'error': f"Producto con referencia '{referencia}' no encontrado."},
+                                status=status.HTTP_404_NOT_FOUND)
+            return Response(fila)
+
+        referencias = request.data.get('referencias')
+        if not isinstance(referencias, list) or not all(isinstance(referencia, str) for referencia in referencias):
+            return Response({'error': "'referencias' debe ser una lista de referencias."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(referencias) > settings.ESCANEO_MAX_REFERENCIAS:
+            return Response({'error': f"Máximo {settings.ESCANEO_MAX_REFERENCIAS} referencias por petición."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        referencias = [referencia.strip() for referencia in referencias]
+        filas = escaneo.resolver(dict.fromkeys(referencias))
+        return Response({
+            'productos': [filas.get(referencia) for referencia in referencias],
+            'no_encontradas': [referencia for referencia in dict.fromkeys(referencias) if referencia not in filas],
+        })
+
+    # Carga masiva: multipart con 'archivo' (.csv o .xlsx, columnas de importacion.COLUMNAS) y
+    # opcionalmente crear_catalogos=true. Responde el resumen con los errores por fila.
+    @action(detail=False, methods=['post'], url_path='importar', parser_classes=[MultiPartParser, FormParser])
+    def importar(self, request):
+        archivo = request.FILES.get('archivo')
+        if archivo is None:
+            return Response({'error': "Adjunte el archivo en el campo 'archivo'."}, status=status.HTTP_400_BAD_REQUEST)
+        crear_catalogos = str(request.data.get('crear_catalogos', '')).lower() in ('1', 'true', 'si', 'sí')
+        try:
+            resultado = importar_productos(leer_archivo(archivo, archivo.name), crear_catalogos)
+        except ErrorArchivo as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(resultado, status=status.HTTP_200_OK)
+
+    # Exportación en streaming (?format=csv, por defecto, o ?format=ndjson), importable tal cual
+    @action(detail=False, methods=['get'], url_path='exportar', renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def exportar(self, request):
+        return respuesta_streaming(exportar_productos(), COLUMNAS, request.accepted_renderer.format, 'productos')
+
+    # Kardex del producto: ?desde= y ?hasta= (AAAA-MM-DD o AAAA-MM-DDTHH:MM), paginado por cursor
+    @action(detail=True, methods=['get'], url_path='movimientos')
+    def movimientos(self, request, referencia_producto=None):
+        producto = self.get_object()
+        rango = {}
+        for parametro in ('desde', 'hasta'):
+            valor = request.query_params.get(parametro)
+            if valor:
+                rango[parametro] = leer_momento(valor, fin_del_dia=parametro == 'hasta')
+                if rango[parametro] is None:
+                    return Response({'error': f"Formato de fecha de '{parametro}' inválido. Use AAAA-MM-DD."},
+                                    status=status.HTTP_400_BAD_REQUEST)
+        paginador = MovimientoStockPagination()
+        pagina = paginador.paginate_queryset(movimientos_producto(producto.pk, **rango), request, view=self)
+        return paginador.get_paginated_response(MovimientoStockSerializer(pagina, many=True).data)
+
+    # Stock que tenía el producto al final del día (o en el momento) ?fecha=, según el kardex
+    @action(detail=True, methods=['get'], url_path='stock-en-fecha')
+    def stock_a_fecha(self, request, referencia_producto=None):
+        producto = self.get_object()
+        momento = leer_momento(request.query_params.get('fecha', ''), fin_del_dia=True)
+        if momento is None:
+            return Response({'error': "Indique 'fecha' en formato AAAA-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+        stock = stock_en_fecha(momento, [producto.pk]).get(producto.pk, 0)
+        return Response({'referencia_producto': producto.referencia_producto, 'fecha': momento, 'stock': stock})
+
+
+def servir_variante_imagen(request, ruta):
+    """
+    Sirve una variante de imagen de MEDIA_ROOT con caché larga (solo en desarrollo, ver
+    Web_Project/urls.py): el nombre cambia si cambia el contenido.
+    """
+    respuesta = serve(request, ruta, document_root=settings.MEDIA_ROOT)
+    patch_cache_control(respuesta, public=True, max_age=settings.PRODUCTOS_IMAGENES_CACHE_SEGUNDOS, immutable=True)
+    return respuesta
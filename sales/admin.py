@@ -1,11 +1,33 @@
 # sales/admin.py
 from django.contrib import admin
-from .models import Cliente, Factura, DetalleVenta
+from django.http import StreamingHttpResponse
+from .models import Cliente, Factura, DetalleVenta, EnvioFactura
+from .lotes_pdf import zip_facturas
 
 admin.site.register(Cliente)
-admin.site.register(Factura)
+
+@admin.register(Factura)
+class FacturaAdmin(admin.ModelAdmin):
+    list_display = ('id_factura', 'fecha', 'cliente', 'total', 'estado')
+    list_filter = ('estado', 'forma_pago')
+    search_fields = ('id_factura', 'cliente__nombre')
+    date_hierarchy = 'fecha' # Para elegir un mes y exportar todas sus facturas
+    actions = ['descargar_pdfs']
+
+    @admin.action(description='Descargar PDFs de las facturas seleccionadas (ZIP)')
+    def descargar_pdfs(self, request, queryset):
+        respuesta = StreamingHttpResponse(zip_facturas(queryset), content_type='application/zip')
+        respuesta['Content-Disposition'] = 'attachment; filename="facturas.zip"'
+        return respuesta
+
 admin.site.register(DetalleVenta)
 
+@admin.register(EnvioFactura)
+class EnvioFacturaAdmin(admin.ModelAdmin):
+    list_display = ('factura', 'destinatario', 'estado', 'intentos', 'proximo_intento', 'fecha_envio')
+    list_filter = ('estado',)
+    search_fields = ('factura__id_factura', 'destinatario')
+
 # Opcional: Para una mejor visualización de DetalleVenta en el admin de Factura
 # class DetalleVentaInline(admin.TabularInline):
 #     model = DetalleVenta
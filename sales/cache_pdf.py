@@ -0,0 +1,149 @@
+# sales/cache_pdf.py
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+# Caché en disco de los PDF de facturas, direccionada por contenido: cada archivo se guarda
+# como '<id de factura>/<huella>.pdf', donde la huella resume todo lo que se imprime (líneas,
+# total, estado, cliente...). Si algo cambia la huella cambia y la versión vieja deja de
+# leerse; invalidar() además la borra en cuanto se sabe que la factura cambió.
+# El tamaño total se limita a FACTURAS_PDF_CACHE_MAX_BYTES sacando los menos usados (LRU
+# por fecha de modificación, que se actualiza en cada acierto). Para no recorrer la caché en
+# cada guardado, cada proceso lleva un tamaño estimado (lo medido más lo que guardó menos lo
+# que borró) y solo la recorre si pasa del máximo o cada FACTURAS_PDF_CACHE_REVISAR_SEGUNDOS
+# (lo que guardan los demás procesos); al recortar baja a MARGEN_RECORTE del máximo.
+
+MARGEN_RECORTE = 0.9
+
+_lock = threading.Lock()
+_estado = {'bytes': None, 'proxima_revision': 0} # bytes=None: aún no se midió en este proceso
+
+
+def _directorio():
+    return settings.FACTURAS_PDF_CACHE_DIR
+
+
+def _directorio_factura(factura_id):
+    return os.path.join(_directorio(), str(factura_id))
+
+
+def _ruta(factura_id, huella):
+    return os.path.join(_directorio_factura(factura_id), f'{huella}.pdf')
+
+
+def leer(factura_id, huella):
+    """
+    Devuelve los bytes del PDF cacheado o None si no está.
+    """
+    ruta = _ruta(factura_id, huella)
+    try:
+        with open(ruta, 'rb') as archivo:
+            contenido = archivo.read()
+        os.utime(ruta) # Marca el acceso para el LRU
+        return contenido
+    except FileNotFoundError:
+        return None
+
+
+def guardar(factura_id, huella, contenido):
+    """
+    Guarda el PDF (escritura atómica con os.replace), borra las versiones anteriores de la
+    misma factura y recorta la caché si el tamaño estimado superó el máximo.
+    """
+    directorio = _directorio_factura(factura_id)
+    os.makedirs(directorio, exist_ok=True)
+    invalidar(factura_id, conservar=huella)
+    descriptor, temporal = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.write(contenido)
+        os.replace(temporal, _ruta(factura_id, huella))
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    maximo = settings.FACTURAS_PDF_CACHE_MAX_BYTES
+    with _lock:
+        if _estado['bytes'] is not None:
+            _estado['bytes'] += len(contenido)
+        revisar = (
+            _estado['bytes'] is None or _estado['bytes'] > maximo or time.monotonic() >= _estado['proxima_revision']
+        )
+        if revisar:
+            _estado['proxima_revision'] = time.monotonic() + settings.FACTURAS_PDF_CACHE_REVISAR_SEGUNDOS
+    if revisar:
+        total = recortar(maximo, objetivo=int(maximo * MARGEN_RECORTE))
+        with _lock:
+            _estado['bytes'] = total
+
+
+def invalidar(factura_id, conservar=None):
+    """
+    Borra los PDF cacheados de la factura (menos el de la huella 'conservar', si se indica).
+    """
+    conservar = f'{conservar}.pdf' if conservar else None
+    try:
+        entradas = list(os.scandir(_directorio_factura(factura_id)))
+    except FileNotFoundError:
+        return
+    liberados = 0
+    for entrada in entradas:
+        if entrada.name.endswith('.pdf') and entrada.name != conservar:
+            try:
+                liberados += entrada.stat().st_size
+            except FileNotFoundError:
+                continue
+            _borrar(entrada.path)
+    with _lock:
+        if _estado['bytes'] is not None:
+            _estado['bytes'] -= liberados
+
+
+def recortar(max_bytes=None, objetivo=None):
+    """
+    Si la caché pasa de 'max_bytes', elimina los PDF usados hace más tiempo hasta dejarla
+    en 'objetivo' (por defecto, el mismo máximo). Devuelve el tamaño con el que queda.
+    """
+    if max_bytes is None:
+        max_bytes = settings.FACTURAS_PDF_CACHE_MAX_BYTES
+    if objetivo is None:
+        objetivo = max_bytes
+    archivos = []
+    total = 0
+    for raiz, _, nombres in os.walk(_directorio()):
+        for nombre in nombres:
+            if not nombre.endswith('.pdf'):
+                continue
+            ruta = os.path.join(raiz, nombre)
+            try:
+                estado = os.stat(ruta)
+            except FileNotFoundError:
+                continue
+            archivos.append((estado.st_mtime, estado.st_size, ruta))
+            total += estado.st_size
+    if total <= max_bytes:
+        return total
+    for _, tamano, ruta in sorted(archivos):
+        if total <= objetivo:
+            break
+        _borrar(ruta)
+        total -= tamano
+    return total
+
+
+def limpiar():
+    """
+    Olvida el tamaño medido en este proceso; se vuelve a medir al próximo guardado (útil en pruebas).
+    """
+    with _lock:
+        _estado.update(bytes=None, proxima_revision=0)
+
+
+def _borrar(ruta):
+    try:
+        os.remove(ruta)
+    except FileNotFoundError:
+        pass # Otro proceso ya la borró
@@ -0,0 +1,190 @@
+# sales/envios.py
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import transaction
+from django.db.models import F, Prefetch, Q
+from django.utils import timezone
+
+from .models import DetalleVenta, EnvioFactura, Factura
+from .utils import build_invoice_email, get_invoice_pdf
+
+ESPERA_BASE = 30 # Segundos antes del primer reintento; se duplica en cada intento fallido
+ESPERA_MAXIMA = 3600
+DURACION_BLOQUEO = 300 # Un envío en 'Procesando' más tiempo que esto se da por abandonado
+
+
+def encolar_envio(factura, destinatario):
+    """
+    Crea el envío de la factura (o devuelve el que ya está en cola para el mismo
+    destinatario, así un doble clic no manda dos correos).
+    """
+    with transaction.atomic():
+        envio = EnvioFactura.objects.select_for_update().filter(
+            factura=factura, destinatario=destinatario,
+            estado__in=[EnvioFactura.PENDIENTE, EnvioFactura.PROCESANDO],
+        ).first()
+        if envio is None:
+            envio = EnvioFactura.objects.create(factura=factura, destinatario=destinatario)
+    return envio
+
+
+def encolar_envios(facturas):
+    """
+    Encola el envío de cada factura al email de su cliente (con cliente cargado), en bloque.
+    Las que ya tienen un envío en cola para ese email no se duplican.
+    Devuelve (encoladas, ya_en_cola, omitidas) donde omitidas es [(factura, motivo)].
+    """
+    omitidas = []
+    pares = {}
+    for factura in facturas:
+        if not factura.cliente or not factura.cliente.email:
+            omitidas.append((factura, 'El cliente de esta factura no tiene un email registrado.'))
+        else:
+            pares[(factura.pk, factura.cliente.email)] = factura
+
+    with transaction.atomic():
+        en_cola = set(EnvioFactura.objects.select_for_update().filter(
+            factura_id__in={factura_id for factura_id, _ in pares},
+            estado__in=[EnvioFactura.PENDIENTE, EnvioFactura.PROCESANDO],
+        ).values_list('factura_id', 'destinatario'))
+        nuevos = [
+            EnvioFactura(factura=factura, destinatario=destinatario)
+            for (factura_id, destinatario), factura in pares.items() if (factura_id, destinatario) not in en_cola
+        ]
+        EnvioFactura.objects.bulk_create(nuevos)
+    return len(nuevos), len(pares) - len(nuevos), omitidas
+
+
+def espera_reintento(intentos):
+    return timedelta(seconds=min(ESPERA_BASE * 2 ** (intentos - 1), ESPERA_MAXIMA))
+
+
+def reclamar_envios(limite):
+    """
+    Marca como 'Procesando' hasta 'limite' envíos listos (pendientes cuyo próximo intento
+    ya llegó, o en proceso con el bloqueo vencido) y los devuelve. Con skip_locked varios
+    workers pueden trabajar a la vez sin tomar el mismo envío.
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            EnvioFactura.objects.select_for_update(skip_locked=True).filter(
+                Q(estado=EnvioFactura.PENDIENTE, proximo_intento__lte=ahora)
+                | Q(estado=EnvioFactura.PROCESANDO, bloqueado_hasta__lt=ahora)
+            ).order_by('proximo_intento').values_list('id', flat=True)[:limite]
+        )
+        EnvioFactura.objects.filter(id__in=ids).update(
+            estado=EnvioFactura.PROCESANDO,
+            bloqueado_hasta=ahora + timedelta(seconds=DURACION_BLOQUEO),
+            intentos=F('intentos') + 1,
+        )
+    return list(EnvioFactura.objects.filter(id__in=ids).order_by('proximo_intento'))
+
+
+class LimiteEnvio:
+    """
+    Espacia los envíos para no pasar de 'por_segundo' correos por segundo (0 = sin límite).
+    """
+    def __init__(self, por_segundo):
+        self.intervalo = 1 / por_segundo if por_segundo else 0
+        self.siguiente = time.monotonic()
+
+    def esperar(self):
+        ahora = time.monotonic()
+        if ahora < self.siguiente:
+            time.sleep(self.siguiente - ahora)
+        self.siguiente = max(ahora, self.siguiente) + self.intervalo
+
+
+def enviar_lote(envios, por_segundo=None):
+    """
+    Genera los PDF (con la caché) y envía los correos de 'envios' sobre una sola conexión
+    de get_connection(). Cada mensaje va por separado con send_messages para que un error
+    no tumbe a los demás; si el servidor corta la conexión se reabre y se sigue.
+    Devuelve {id de envío: (enviado, error)}.
+    """
+    if por_segundo is None:
+        por_segundo = settings.FACTURAS_EMAILS_POR_SEGUNDO
+    detalles = Prefetch('detalle_ventas', queryset=DetalleVenta.objects.select_related('producto').order_by('id'))
+    facturas = Factura.objects.select_related('cliente', 'forma_pago', 'usuario').prefetch_related(detalles).in_bulk(
+        [envio.factura_id for envio in envios]
+    )
+
+    resultados = {}
+    mensajes = []
+    for envio in envios:
+        factura = facturas.get(envio.factura_id)
+        if factura is None:
+            resultados[envio.pk] = (False, "Factura no encontrada para enviar email.")
+            continue
+        try:
+            pdf, _ = get_invoice_pdf(factura, list(factura.detalle_ventas.all()))
+        except Exception as e:
+            resultados[envio.pk] = (False, f"Error al construir el PDF: {e}")
+            continue
+        mensajes.append((envio, build_invoice_email(factura, envio.destinatario, pdf)))
+
+    if not mensajes:
+        return resultados
+
+    conexion = get_connection()
+    limite = LimiteEnvio(por_segundo)
+    try:
+        conexion.open()
+    except Exception as e:
+        return {**resultados, **{envio.pk: (False, f"Error al conectar con el servidor de correo: {e}") for envio, _ in mensajes}}
+    try:
+        for envio, mensaje in mensajes:
+            limite.esperar()
+            try:
+                conexion.send_messages([mensaje])
+                resultados[envio.pk] = (True, '')
+            except Exception as e:
+                resultados[envio.pk] = (False, f"Error al enviar el email: {e}")
+                _reabrir(conexion)
+    finally:
+        conexion.close()
+    return resultados
+
+
+def _reabrir(conexion):
+    # Tras un error SMTP la sesión puede quedar cerrada o a medias: se empieza una nueva
+    try:
+        conexion.close()
+        conexion.open()
+    except Exception:
+        pass # El siguiente mensaje fallará y quedará para reintento
+
+
+def registrar_resultado(envio, enviado, error):
+    """
+    Guarda el resultado de un intento. Si falló, el envío queda 'Pendiente' con el próximo
+    intento más lejos, o 'Fallido' cuando se agotan los intentos.
+    """
+    ahora = timezone.now()
+    if enviado:
+        cambios = {'estado': EnvioFactura.ENVIADO, 'fecha_envio': ahora, 'ultimo_error': ''}
+    elif envio.intentos >= envio.max_intentos:
+        cambios = {'estado': EnvioFactura.FALLIDO, 'ultimo_error': error}
+    else:
+        cambios = {
+            'estado': EnvioFactura.PENDIENTE, 'ultimo_error': error,
+            'proximo_intento': ahora + espera_reintento(envio.intentos),
+        }
+    EnvioFactura.objects.filter(pk=envio.pk).update(bloqueado_hasta=None, **cambios)
+
+
+def procesar_pendientes(limite=20):
+    """
+    Procesa un lote de envíos listos sobre una misma conexión SMTP. Devuelve (procesados, enviados).
+    """
+    envios = reclamar_envios(limite)
+    if not envios:
+        return 0, 0
+    resultados = enviar_lote(envios)
+    for envio in envios:
+        registrar_resultado(envio, *resultados[envio.pk])
+    return len(envios), sum(1 for enviado, _ in resultados.values() if enviado)
@@ -0,0 +1,124 @@
+# sales/lotes_pdf.py
+import os
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.db.models import Prefetch
+
+from .models import DetalleVenta
+from .utils import invoice_pdf_data, pdf_filename, render_invoice_pdf_data
+
+TAMANO_LOTE = 500 # Facturas leídas por consulta
+EN_VUELO_POR_PROCESO = 4 # PDFs encargados por proceso a la vez (limita la memoria)
+
+
+def datos_facturas(queryset, tamano=TAMANO_LOTE):
+    """
+    Recorre las facturas del queryset como dicts planos (invoice_pdf_data), leyendo por
+    lotes de 'tamano': una consulta para las facturas con cliente, forma de pago y usuario,
+    y otra para todos sus detalles con el producto.
+    """
+    ids = list(queryset.order_by('fecha', 'id').values_list('id', flat=True))
+    detalles = Prefetch('detalle_ventas', queryset=DetalleVenta.objects.select_related('producto').order_by('id'))
+    for inicio in range(0, len(ids), tamano):
+        lote = ids[inicio:inicio + tamano]
+        facturas = {
+            factura.pk: factura
+            for factura in queryset.model.objects.filter(id__in=lote)
+            .select_related('cliente', 'forma_pago', 'usuario').prefetch_related(detalles)
+        }
+        for factura_id in lote:
+            factura = facturas[factura_id]
+            yield invoice_pdf_data(factura, factura.detalle_ventas.all())
+
+
+def _iniciar_proceso():
+    # Con 'spawn' (macOS/Windows) el proceso hijo arranca sin Django configurado
+    django.setup()
+
+
+def _renderizar(data):
+    return pdf_filename(data['id_factura']), render_invoice_pdf_data(data)
+
+
+def renderizar_en_paralelo(datos, procesos=None):
+    """
+    Renderiza los dicts de 'datos' en un ProcessPoolExecutor y devuelve (nombre, bytes) en
+    el mismo orden. Solo hay EN_VUELO_POR_PROCESO PDFs pendientes por proceso, así que
+    ni los datos ni los PDF se acumulan en memoria.
+    """
+    procesos = procesos or os.cpu_count() or 1
+    # Los hijos solo reciben dicts y nunca tocan la base de datos (ni la conexión heredada)
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso) as ejecutor:
+        pendientes = deque()
+        for data in datos:
+            pendientes.append(ejecutor.submit(_renderizar, data))
+            if len(pendientes) >= procesos * EN_VUELO_POR_PROCESO:
+                yield pendientes.popleft().result()
+        while pendientes:
+            yield pendientes.popleft().result()
+
+
+class _Tuberia:
+    """
+    Destino de escritura no posicionable para ZipFile: acumula lo escrito hasta que se
+    vacía con leer(). Así el ZIP sale por partes (respuesta HTTP en streaming).
+    """
+    def __init__(self):
+        self.partes = []
+        self.posicion = 0
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self.posicion
+
+    def flush(self):
+        pass
+
+    def leer(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+
+class Estadisticas:
+    def __init__(self):
+        self.facturas = 0
+        self.bytes = 0
+        self.inicio = time.perf_counter()
+
+    @property
+    def segundos(self):
+        return time.perf_counter() - self.inicio
+
+    @property
+    def pdfs_por_segundo(self):
+        return self.facturas / self.segundos if self.segundos else 0
+
+    def __str__(self):
+        return (f"{self.facturas} PDFs, {self.bytes / 1024 / 1024:.1f} MB en {self.segundos:.1f} s "
+                f"({self.pdfs_por_segundo:.1f} PDFs/s)")
+
+
+def zip_facturas(queryset, procesos=None, estadisticas=None):
+    """
+    Genera un ZIP con el PDF de cada factura del queryset y lo entrega por partes (bytes).
+    Los PDF ya vienen comprimidos, así que se guardan sin volver a comprimir (ZIP_STORED)
+    y el proceso principal solo lee datos y escribe el ZIP.
+    """
+    estadisticas = estadisticas or Estadisticas()
+    tuberia = _Tuberia()
+    with zipfile.ZipFile(tuberia, 'w', compression=zipfile.ZIP_STORED) as archivo_zip:
+        for nombre, contenido in renderizar_en_paralelo(datos_facturas(queryset), procesos):
+            archivo_zip.writestr(nombre, contenido)
+            estadisticas.facturas += 1
+            estadisticas.bytes += len(contenido)
+            yield tuberia.leer()
+    yield tuberia.leer() # Directorio central del ZIP
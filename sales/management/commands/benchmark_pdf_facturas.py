@@ -0,0 +1,55 @@
+# sales/management/commands/benchmark_pdf_facturas.py
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales import utils
+from sales.models import Factura
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide PDFs de factura por segundo: 'antes' reconstruye estilos, logo y bloques fijos en "
+        "cada PDF y lo escribe y relee de disco; 'después' usa la plantilla cacheada y BytesIO."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--facturas', type=int, default=50, help='Facturas (las más recientes) a renderizar.')
+        parser.add_argument('--repeticiones', type=int, default=3)
+
+    def handle(self, *args, **options):
+        facturas = list(
+            Factura.objects.select_related('cliente', 'forma_pago', 'usuario').order_by('-id')[:options['facturas']]
+        )
+        if not facturas:
+            raise CommandError('No hay facturas para renderizar.')
+        detalles = {factura.pk: list(factura.detalle_ventas.select_related('producto').order_by('id')) for factura in facturas}
+
+        with tempfile.TemporaryDirectory() as directorio:
+            def antes(factura):
+                self.limpiar_cache()
+                ruta = os.path.join(directorio, utils.invoice_pdf_filename(factura))
+                with open(ruta, 'wb') as archivo:
+                    archivo.write(utils.render_invoice_pdf(factura, detalles[factura.pk]))
+                with open(ruta, 'rb') as archivo:
+                    return archivo.read()
+
+            def despues(factura):
+                return utils.render_invoice_pdf(factura, detalles[factura.pk])
+
+            for etiqueta, renderizar in (('antes (sin caché, a disco)', antes), ('después (plantilla cacheada, BytesIO)', despues)):
+                mejor = 0
+                for _ in range(options['repeticiones']):
+                    inicio = time.perf_counter()
+                    for factura in facturas:
+                        renderizar(factura)
+                    mejor = max(mejor, len(facturas) / (time.perf_counter() - inicio))
+                self.stdout.write(f"{etiqueta}: {mejor:.1f} PDFs/s")
+
+    @staticmethod
+    def limpiar_cache():
+        utils._estilos.cache_clear()
+        utils._logo_bytes.cache_clear()
+        utils._plantilla_local.__dict__.clear()
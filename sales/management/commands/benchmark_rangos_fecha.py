@@ -0,0 +1,117 @@
+# sales/management/commands/benchmark_rangos_fecha.py
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from products.models import Producto
+from sales.models import Cliente, DetalleVenta, Factura
+from sales.reportes import filtrar_rango_fechas, rango_de_dias
+from uglobals.models import FormaPago, Proveedor
+from users.models import Usuario
+
+PREFIJO_BENCHMARK = 'BENCH'
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara plan y tiempo de los filtros de reportes antes (fecha__date) y después "
+        "(rango semiabierto sobre la columna). Con --crear inserta facturas sintéticas; "
+        "usar solo en una base de pruebas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--crear', type=int, default=0,
+                            help='Facturas sintéticas a insertar antes de medir (ej. 3000000).')
+        parser.add_argument('--dias-historia', type=int, default=730,
+                            help='Días hacia atrás en los que se reparten las facturas creadas.')
+        parser.add_argument('--dias', type=int, default=30, help='Tamaño del rango consultado.')
+        parser.add_argument('--repeticiones', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if options['crear']:
+            self.crear_facturas(options['crear'], options['dias_historia'])
+
+        hasta = timezone.localdate()
+        desde = hasta - timedelta(days=options['dias'])
+        desde_dt, hasta_dt = rango_de_dias(desde, hasta)
+
+        facturas_antes = Factura.objects.filter(fecha__date__gte=desde, fecha__date__lte=hasta)
+        facturas_despues = filtrar_rango_fechas(Factura.objects.all(), 'fecha', desde_dt, hasta_dt)
+        detalles_antes = DetalleVenta.objects.filter(factura__fecha__date__gte=desde, factura__fecha__date__lte=hasta)
+        detalles_despues = filtrar_rango_fechas(DetalleVenta.objects.all(), 'factura__fecha', desde_dt, hasta_dt)
+
+        casos = [
+            ('ganancias-por-fecha',
+             lambda qs: qs.aggregate(total=Sum('total')), facturas_antes, facturas_despues),
+            ('rendimiento-empleados',
+             lambda qs: list(qs.values('usuario__id').annotate(total=Sum('total'), n=Count('id'))),
+             facturas_antes, facturas_despues),
+            ('ingresos-detallados',
+             lambda qs: list(qs.values_list('id', 'cantidad', 'precio_unitario')), detalles_antes, detalles_despues),
+        ]
+
+        total = Factura.objects.count()
+        self.stdout.write(f"Motor: {connection.vendor} | facturas: {total} | rango: {desde} a {hasta}\n")
+        for nombre, ejecutar, antes, despues in casos:
+            self.stdout.write(self.style.MIGRATE_HEADING(nombre))
+            for etiqueta, queryset in (('antes (fecha__date)', antes), ('después (rango)', despues)):
+                tiempos = []
+                for _ in range(options['repeticiones']):
+                    inicio = time.perf_counter()
+                    ejecutar(queryset)
+                    tiempos.append((time.perf_counter() - inicio) * 1000)
+                self.stdout.write(f"  {etiqueta}: mediana {statistics.median(tiempos):.1f} ms")
+                for linea in queryset.explain().splitlines():
+                    self.stdout.write(f"      {linea}")
+
+    def crear_facturas(self, cantidad, dias_historia, lote=10000):
+        proveedor, _ = Proveedor.objects.get_or_create(nombre='Proveedor benchmark')
+        producto = Producto.objects.filter(nombre='Producto benchmark').first() or Producto.objects.create(
+            nombre='Producto benchmark', proveedor=proveedor, precio_costo=Decimal('5.00'),
+            precio_sugerido_venta=Decimal('10.00'),
+        )
+        cliente, _ = Cliente.objects.get_or_create(email='benchmark@keeplic.com', defaults={'nombre': 'Cliente benchmark'})
+        forma_pago, _ = FormaPago.objects.get_or_create(metodo='Benchmark')
+        usuario = Usuario.objects.filter(username='benchmark').first() or Usuario.objects.create_user(
+            'benchmark', 'benchmark-user@keeplic.com', None)
+
+        # Las fechas deben quedar repartidas en el pasado: se desactiva auto_now_add mientras se insertan
+        campo_fecha = Factura._meta.get_field('fecha')
+        ya_creadas = Factura.objects.filter(id_factura__startswith=PREFIJO_BENCHMARK).count()
+        ahora = timezone.now()
+        segundos = dias_historia * 86400
+        campo_fecha.auto_now_add = False
+        try:
+            for inicio in range(0, cantidad, lote):
+                numeros = range(ya_creadas + inicio, ya_creadas + min(inicio + lote, cantidad))
+                with transaction.atomic():
+                    Factura.objects.bulk_create([
+                        Factura(
+                            id_factura=f'{PREFIJO_BENCHMARK}{numero:015d}',
+                            fecha=ahora - timedelta(seconds=random.randrange(segundos)),
+                            cliente=cliente, forma_pago=forma_pago, usuario=usuario,
+                            total=Decimal('10.00'), estado='Completada',
+                        )
+                        for numero in numeros
+                    ])
+                    # MySQL no devuelve los ids de bulk_create: se leen por número de factura
+                    ids = Factura.objects.filter(
+                        id_factura__in=[f'{PREFIJO_BENCHMARK}{numero:015d}' for numero in numeros]
+                    ).values_list('id', flat=True)
+                    DetalleVenta.objects.bulk_create([
+                        DetalleVenta(factura_id=factura_id, producto=producto, cantidad=1,
+                                     precio_unitario=Decimal('10.00'), subtotal=Decimal('10.00'),
+                                     costo_unitario=producto.precio_costo)
+                        for factura_id in ids
+                    ])
+                self.stdout.write(f"  {inicio + len(numeros)}/{cantidad} facturas creadas", ending='\r')
+        finally:
+            campo_fecha.auto_now_add = True
+        self.stdout.write('')
@@ -0,0 +1,45 @@
+# sales/management/commands/exportar_pdfs_facturas.py
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.lotes_pdf import Estadisticas, zip_facturas
+from sales.models import Factura
+from sales.reportes import filtrar_rango_fechas, leer_fecha, rango_de_dias
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta a un ZIP el PDF de cada factura de un rango de fechas (p. ej. el cierre del mes), "
+        "renderizando en paralelo con un proceso por núcleo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', required=True, help='Primer día (AAAA-MM-DD).')
+        parser.add_argument('--hasta', required=True, help='Último día (AAAA-MM-DD), incluido.')
+        parser.add_argument('--salida', help='Archivo ZIP de salida (por defecto facturas_<desde>_<hasta>.zip).')
+        parser.add_argument('--procesos', type=int, default=None,
+                            help='Procesos para renderizar (por defecto, uno por núcleo).')
+        parser.add_argument('--incluir-anuladas', action='store_true')
+
+    def handle(self, *args, **options):
+        try:
+            desde = leer_fecha(options['desde'], 'inicio')
+            hasta = leer_fecha(options['hasta'], 'fin')
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        facturas = filtrar_rango_fechas(Factura.objects.all(), 'fecha', *rango_de_dias(desde, hasta))
+        if not options['incluir_anuladas']:
+            facturas = facturas.exclude(estado='Anulada')
+
+        salida = options['salida'] or f'facturas_{desde:%Y%m%d}_{hasta:%Y%m%d}.zip'
+        estadisticas = Estadisticas()
+        with open(salida, 'wb') as archivo:
+            for parte in zip_facturas(facturas, options['procesos'], estadisticas):
+                archivo.write(parte)
+                if estadisticas.facturas % 100 == 0:
+                    self.stdout.write(f"  {estadisticas}", ending='\r')
+
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(f"{os.path.abspath(salida)}: {estadisticas}"))
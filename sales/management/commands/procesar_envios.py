@@ -0,0 +1,33 @@
+# sales/management/commands/procesar_envios.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from sales.envios import procesar_pendientes
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker de la cola de envíos de facturas por email (EnvioFactura): genera los PDF y "
+        "envía los correos pendientes, reintentando los fallidos. Se pueden correr varios a la vez."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Procesa lo que esté listo y termina (útil desde cron).')
+        parser.add_argument('--lote', type=int, default=20, help='Envíos tomados por vuelta.')
+        parser.add_argument('--intervalo', type=float, default=5,
+                            help='Segundos de espera cuando no hay nada que procesar.')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                procesados, enviados = procesar_pendientes(options['lote'])
+                if procesados:
+                    self.stdout.write(f"{procesados} envíos procesados, {enviados} enviados.")
+                if options['una_vez'] and procesados < options['lote']:
+                    break
+                if not procesados:
+                    time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write('Worker detenido.')
@@ -0,0 +1,30 @@
+# sales/management/commands/reconstruir_resumenes.py
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.reportes import leer_fecha
+from sales.resumenes import reconstruir
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula los resúmenes diarios de ventas (por usuario, cliente y producto) a partir "
+        "de las facturas. Ejecutarlo una vez después de migrar y cuando se sospeche un desfase."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Primer día a recalcular (AAAA-MM-DD). Por defecto, todo el historial.')
+        parser.add_argument('--hasta', help='Último día a recalcular (AAAA-MM-DD), incluido.')
+
+    def handle(self, *args, **options):
+        try:
+            desde = leer_fecha(options['desde'], 'inicio')
+            hasta = leer_fecha(options['hasta'], 'fin')
+        except ValueError as e:
+            raise CommandError(str(e))
+        if desde and hasta and desde > hasta:
+            raise CommandError('--desde no puede ser posterior a --hasta.')
+
+        creadas = reconstruir(desde, hasta)
+        for modelo, filas in creadas.items():
+            self.stdout.write(f"  {modelo}: {filas} filas")
+        self.stdout.write(self.style.SUCCESS('Resúmenes diarios reconstruidos.'))
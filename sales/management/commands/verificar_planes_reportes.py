@@ -0,0 +1,108 @@
+# sales/management/commands/verificar_planes_reportes.py
+import json
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+# Tablas grandes que nunca deberían recorrerse completas en un reporte
+TABLAS_VIGILADAS = ('sales_factura', 'sales_detalleventa', 'products_producto')
+
+
+def endpoints_a_verificar(desde, hasta):
+    """
+    Rutas de los reportes y filtros más usados, con un rango de fechas de ejemplo.
+    """
+    rango = f'start_date={desde:%Y-%m-%d}&end_date={hasta:%Y-%m-%d}'
+    return [
+        '/api/reportes/productos-mas-vendidos/',
+        f'/api/reportes/ganancias-por-fecha/?{rango}',
+        f'/api/reportes/ingresos-detallados/?{rango}',
+        '/api/reportes/productos-bajo-stock/?umbral=10',
+        f'/api/reportes/rendimiento-empleados/?{rango}',
+        f'/api/reportes/ventas-por-cliente/?{rango}',
+        f'/api/facturas/?estado=Completada&fecha__gte={desde:%Y-%m-%d}T00:00:00&limit=50',
+    ]
+
+
+def tablas_recorridas_completas(plan):
+    """
+    Devuelve las tablas que el plan lee completas (sin índice), según el motor:
+    MySQL 'access_type: ALL', PostgreSQL 'Seq Scan' y SQLite 'SCAN tabla' sin índice.
+    """
+    if connection.vendor == 'mysql':
+        tablas = []
+
+        def recorrer(nodo):
+            if isinstance(nodo, dict):
+                if nodo.get('access_type') == 'ALL':
+                    tablas.append(nodo.get('table_name'))
+                for valor in nodo.values():
+                    recorrer(valor)
+            elif isinstance(nodo, list):
+                for valor in nodo:
+                    recorrer(valor)
+
+        recorrer(json.loads(plan))
+        return tablas
+    if connection.vendor == 'postgresql':
+        return re.findall(r'Seq Scan on (\w+)', plan)
+    # SQLite: "SCAN tabla" o "SCAN tabla USING [COVERING] INDEX ..."
+    return [
+        linea.split()[1]
+        for linea in (l.strip() for l in plan.splitlines())
+        if linea.startswith('SCAN ') and ' USING ' not in linea
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Ejecuta los endpoints de reportes, hace EXPLAIN de cada consulta que lanzan y "
+        "falla si alguna recorre completa una tabla grande (factura, detalle de venta, producto). "
+        "Pensado para correr contra una base con volumen real de datos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=30,
+                            help='Tamaño del rango de fechas usado en los reportes (por defecto 30).')
+        parser.add_argument('--tablas', nargs='+', default=list(TABLAS_VIGILADAS),
+                            help='Tablas que no pueden recorrerse completas.')
+
+    def handle(self, *args, **options):
+        hasta = timezone.localdate()
+        desde = hasta - timedelta(days=options['dias'])
+        tablas_vigiladas = set(options['tablas'])
+        factory = APIRequestFactory()
+        prefijo = connection.ops.explain_query_prefix('JSON' if connection.vendor == 'mysql' else None)
+
+        fallos = []
+        for ruta in endpoints_a_verificar(desde, hasta):
+            match = resolve(ruta.split('?')[0])
+            with CaptureQueriesContext(connection) as consultas:
+                respuesta = match.func(factory.get(ruta), *match.args, **match.kwargs)
+            if respuesta.status_code >= 400:
+                raise CommandError(f'{ruta} respondió {respuesta.status_code}: {respuesta.data}')
+
+            for consulta in consultas.captured_queries:
+                if not consulta['sql'].lstrip().upper().startswith('SELECT'):
+                    continue
+                with connection.cursor() as cursor:
+                    cursor.execute(f"{prefijo} {consulta['sql']}")
+                    # La última columna trae el plan en los tres motores (texto, JSON o detalle de SQLite)
+                    plan = '\n'.join(str(fila[-1]) for fila in cursor.fetchall())
+                completas = sorted(set(tablas_recorridas_completas(plan)) & tablas_vigiladas)
+                if completas:
+                    fallos.append((ruta, completas, consulta['sql'], plan))
+                    self.stdout.write(self.style.ERROR(f"FULL SCAN {ruta}: {', '.join(completas)}"))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'OK {ruta}'))
+
+        if fallos:
+            detalle = '\n\n'.join(f'{ruta} ({", ".join(tablas)})\n{sql}\n{plan}' for ruta, tablas, sql, plan in fallos)
+            raise CommandError(f'{len(fallos)} consulta(s) de reportes sin índice:\n\n{detalle}')
+        self.stdout.write(self.style.SUCCESS('Todas las consultas de reportes usan índices.'))
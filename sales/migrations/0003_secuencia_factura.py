@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:20
+
+from django.db import migrations
+
+
+def inicializar_secuencia_factura(apps, schema_editor):
+    # El contador arranca en el mayor id_factura numérico existente
+    Factura = apps.get_model('sales', 'Factura')
+    Secuencia = apps.get_model('uglobals', 'Secuencia')
+    ultimo = 0
+    for id_factura in Factura.objects.values_list('id_factura', flat=True).iterator():
+        if id_factura and id_factura.isdigit():
+            ultimo = max(ultimo, int(id_factura))
+    Secuencia.objects.update_or_create(nombre='factura', defaults={'valor': ultimo})
+
+
+def eliminar_secuencia_factura(apps, schema_editor):
+    Secuencia = apps.get_model('uglobals', 'Secuencia')
+    Secuencia.objects.filter(nombre='factura').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0002_initial'),
+        ('uglobals', '0002_secuencia'),
+    ]
+
+    operations = [
+        migrations.RunPython(inicializar_secuencia_factura, eliminar_secuencia_factura),
+    ]
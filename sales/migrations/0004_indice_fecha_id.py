@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0003_secuencia_factura'),
+        ('uglobals', '0002_secuencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['fecha', 'id'], name='factura_fecha_id_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_indices_reportes'),
+        ('sales', '0004_indice_fecha_id'),
+        ('uglobals', '0002_secuencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='detalleventa',
+            index=models.Index(fields=['producto', 'factura', 'cantidad'], name='detalle_producto_factura_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['usuario', 'fecha'], name='factura_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['cliente', 'fecha'], name='factura_cliente_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['estado', 'fecha'], name='factura_estado_fecha_idx'),
+        ),
+    ]
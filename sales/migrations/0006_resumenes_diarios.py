@@ -0,0 +1,106 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:30
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def llenar_resumenes(apps, schema_editor):
+    # Los reportes leen solo los resúmenes: se llenan con las ventas que ya existen (como
+    # 'manage.py reconstruir_resumenes', pero con los modelos de esta migración). Las
+    # facturas anuladas no cuentan; el costo es el precio_costo actual de cada producto.
+    Factura = apps.get_model('sales', 'Factura')
+    DetalleVenta = apps.get_model('sales', 'DetalleVenta')
+    zona = timezone.get_current_timezone()
+    facturas = Factura.objects.exclude(estado='Anulada')
+    detalles = DetalleVenta.objects.exclude(factura__estado='Anulada')
+    costo = Sum(F('cantidad') * F('producto__precio_costo'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+    for nombre, campo in (('ResumenDiarioUsuario', 'usuario_id'), ('ResumenDiarioCliente', 'cliente_id'),
+                          ('ResumenDiarioProducto', 'producto_id')):
+        modelo = apps.get_model('sales', nombre)
+        filas = {}
+        origen = campo if campo == 'producto_id' else f'factura__{campo}'
+        por_lineas = detalles.values(dia=TruncDate('factura__fecha', tzinfo=zona), clave=F(origen)).annotate(
+            ingresos=Sum('subtotal'), costo=costo, cantidad=Sum('cantidad'),
+            numero_facturas=Count('factura', distinct=True),
+        ).order_by()
+        for fila in por_lineas:
+            filas[(fila['dia'], fila['clave'])] = {
+                'ingresos': fila['ingresos'], 'costo': fila['costo'] or Decimal('0.00'),
+                'cantidad': fila['cantidad'], 'numero_facturas': fila['numero_facturas'],
+            }
+        if campo != 'producto_id':
+            # Las facturas se cuentan desde Factura para incluir las que no tienen detalles
+            por_factura = facturas.values(dia=TruncDate('fecha', tzinfo=zona), clave=F(campo)).annotate(
+                numero=Count('id')
+            ).order_by()
+            for fila in por_factura:
+                filas.setdefault((fila['dia'], fila['clave']), {})['numero_facturas'] = fila['numero']
+        modelo.objects.bulk_create(
+            [modelo(dia=dia, **{campo: clave}, **metricas) for (dia, clave), metricas in filas.items()],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_indices_reportes'),
+        ('sales', '0005_indices_reportes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiarioCliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('ingresos', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('costo', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('numero_facturas', models.IntegerField(default=0)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to='sales.cliente')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('dia', 'cliente'), name='resumen_dia_cliente_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenDiarioProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('ingresos', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('costo', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('numero_facturas', models.IntegerField(default=0)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to='products.producto')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('dia', 'producto'), name='resumen_dia_producto_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenDiarioUsuario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('ingresos', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('costo', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('numero_facturas', models.IntegerField(default=0)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('dia', 'usuario'), name='resumen_dia_usuario_unico')],
+            },
+        ),
+        # Al revertir, las tablas se borran con sus filas
+        migrations.RunPython(llenar_resumenes, migrations.RunPython.noop),
+    ]
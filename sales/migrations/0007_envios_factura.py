@@ -0,0 +1,34 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:35
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0006_resumenes_diarios'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnvioFactura',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('destinatario', models.EmailField(max_length=254)),
+                ('estado', models.CharField(choices=[('Pendiente', 'Pendiente'), ('Procesando', 'Procesando'), ('Enviado', 'Enviado'), ('Fallido', 'Fallido')], default='Pendiente', max_length=20)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('max_intentos', models.PositiveIntegerField(default=5)),
+                ('proximo_intento', models.DateTimeField(default=django.utils.timezone.now)),
+                ('bloqueado_hasta', models.DateTimeField(blank=True, null=True)),
+                ('ultimo_error', models.TextField(blank=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_envio', models.DateTimeField(blank=True, null=True)),
+                ('factura', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='envios', to='sales.factura')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'proximo_intento'], name='envio_estado_proximo_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0007_envios_factura'),
+        ('uglobals', '0002_secuencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='factura',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['fecha_actualizacion'], name='factura_actualizacion_idx'),
+        ),
+    ]
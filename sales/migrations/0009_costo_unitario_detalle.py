@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:40
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copiar_costo_actual(apps, schema_editor):
+    # El costo al momento de las ventas anteriores no se guardó: se toma el precio_costo
+    # actual de cada producto, el mismo con el que la migración 0006 llenó los resúmenes.
+    DetalleVenta = apps.get_model('sales', 'DetalleVenta')
+    Producto = apps.get_model('products', 'Producto')
+    DetalleVenta.objects.update(
+        costo_unitario=Subquery(Producto.objects.filter(pk=OuterRef('producto_id')).values('precio_costo')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0008_fecha_actualizacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detalleventa',
+            name='costo_unitario',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=10),
+        ),
+        migrations.RunPython(copiar_costo_actual, migrations.RunPython.noop),
+    ]
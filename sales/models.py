@@ -1,11 +1,17 @@
 # sales/models.py
 from django.db import models, transaction
-from django.core.exceptions import ValidationError
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
 from decimal import Decimal
 
 # Importaciones de modelos desde otras apps
 from uglobals.models import FormaPago # Desde la app 'globals'
-from products.models import Producto # Desde la app 'products'
+from uglobals.secuencias import siguiente
+from uglobals import versiones
+from . import cache_pdf
+from products.models import MovimientoStock, Producto # Desde la app 'products'
+from products.stock import descontar_stock, devolver_stock
 from users.models import Usuario     # Desde la app 'users'
 
 # Modelo Cliente
@@ -26,16 +32,27 @@ class Factura(models.Model):
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     estado = models.CharField(max_length=50, default='Pendiente')
     usuario = models.ForeignKey(Usuario, on_delete=models.PROTECT, related_name='facturas_creadas')
+    # Última modificación de la factura o de sus detalles (ETag / Last-Modified de la API)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Orden estable del listado y paginación por cursor (fecha, id)
+            models.Index(fields=['fecha', 'id'], name='factura_fecha_id_idx'),
+            models.Index(fields=['fecha_actualizacion'], name='factura_actualizacion_idx'),
+            # Reportes por rango de fechas agrupados por empleado / cliente y filtro por estado
+            models.Index(fields=['usuario', 'fecha'], name='factura_usuario_fecha_idx'),
+            models.Index(fields=['cliente', 'fecha'], name='factura_cliente_fecha_idx'),
+            models.Index(fields=['estado', 'fecha'], name='factura_estado_fecha_idx'),
+        ]
 
     def save(self, *args, **kwargs):
-        if not self.id_factura or self.id_factura == '00000000000':
-            last_factura = Factura.objects.all().order_by('-id').first()
-            if last_factura and last_factura.id_factura and last_factura.id_factura.isdigit():
-                new_id_num = int(last_factura.id_factura) + 1
-                self.id_factura = str(new_id_num).zfill(11)
-            else:
-                self.id_factura = '00000000001'
-        super().save(*args, **kwargs)
+        # El número se toma del contador 'factura' (uglobals.Secuencia) dentro de la misma
+        # transacción del INSERT: no hay colisiones entre cajas y un rollback no deja huecos.
+        with transaction.atomic():
+            if not self.id_factura or self.id_factura == '00000000000':
+                self.id_factura = str(siguiente('factura')).zfill(11)
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Factura #{self.id_factura} - {self.cliente.nombre} ({self.total})"
@@ -48,38 +65,134 @@ class DetalleVenta(models.Model):
     cantidad = models.IntegerField()
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, editable=False)
+    # precio_costo del producto al venderlo: los resúmenes suman y restan con este costo
+    costo_unitario = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'), editable=False)
+
+    class Meta:
+        indexes = [
+            # Cubre "cantidad vendida por producto" sin leer la tabla (cantidad va en el índice)
+            models.Index(fields=['producto', 'factura', 'cantidad'], name='detalle_producto_factura_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         self.subtotal = self.cantidad * self.precio_unitario
 
-        is_new_creation = self.pk is None
-        original_cantidad = 0
-        if not is_new_creation:
-            original_detalle = DetalleVenta.objects.get(pk=self.pk)
-            original_cantidad = original_detalle.cantidad
-
-        cantidad_a_deducir = self.cantidad if is_new_creation else (self.cantidad - original_cantidad)
+        # Ajuste de stock: en un alta se descuenta la cantidad; en una edición solo la
+        # diferencia (o todo, si cambió el producto). Siempre con UPDATE atómicos (products/stock.py).
+        # En la misma transacción los resúmenes diarios restan la línea anterior y suman la nueva.
+        anterior = original = None
+        if self.pk is not None:
+            anterior = original = DetalleVenta.objects.filter(pk=self.pk).values(
+                'producto_id', 'cantidad', 'subtotal', 'costo_unitario'
+            ).first()
+        if original is None or original['producto_id'] != self.producto_id:
+            self.costo_unitario = self.producto.precio_costo
 
         with transaction.atomic():
-            try:
-                product_for_update = Producto.objects.select_for_update().get(pk=self.producto.pk)
-
-                if product_for_update.stock >= cantidad_a_deducir:
-                    product_for_update.stock -= cantidad_a_deducir
-                    product_for_update.save()
-                    print(f"Stock para {product_for_update.nombre} (Ref: {product_for_update.referencia_producto}) actualizado. Nuevo stock: {product_for_update.stock}")
-                else:
-                    raise ValidationError(
-                        f"Stock insuficiente para el producto '{product_for_update.nombre}'. "
-                        f"Stock actual: {product_for_update.stock}, intentó vender: {self.cantidad}."
-                    )
-            except Producto.DoesNotExist:
-                raise ValidationError(f"Producto con referencia '{self.producto.pk}' no encontrado.")
-            except Exception as e:
-                print(f"Error inesperado deduciendo stock para {self.producto.nombre}: {e}")
-                raise ValidationError(f"Error interno al actualizar stock: {e}")
-
-        super().save(*args, **kwargs)
+            documento = self.factura.id_factura
+            vigente = self.factura.estado != 'Anulada' # Las anuladas no cuentan en los resúmenes
+            if vigente and anterior:
+                resumenes.restar_detalle(DetalleVenta(pk=self.pk, factura=self.factura, **anterior))
+            if original and original['producto_id'] != self.producto_id:
+                devolver_stock({original['producto_id']: original['cantidad']}, MovimientoStock.AJUSTE, documento)
+                original = None
+            diferencia = self.cantidad - (original['cantidad'] if original else 0)
+            if diferencia > 0:
+                descontar_stock({self.producto_id: diferencia}, MovimientoStock.VENTA, documento)
+            elif diferencia < 0:
+                devolver_stock({self.producto_id: -diferencia}, MovimientoStock.AJUSTE, documento)
+            super().save(*args, **kwargs)
+            if vigente:
+                resumenes.sumar_detalle(self)
+
+    def __str__(self):
+        return f"Detalle de Venta para {self.factura.id_factura} - {self.producto.nombre}"
+
+# Cualquier cambio en la factura (completar, anular, editar) o en sus detalles descarta sus
+# PDF cacheados (sales/cache_pdf.py). La huella del contenido ya evita servir uno viejo;
+# esto libera el espacio enseguida.
+@receiver(post_save, sender=Factura)
+@receiver(post_delete, sender=Factura)
+def invalidar_pdf_factura(sender, instance, created=False, **kwargs):
+    if not created:
+        cache_pdf.invalidar(instance.pk)
+
+@receiver(post_save, sender=DetalleVenta)
+@receiver(post_delete, sender=DetalleVenta)
+def invalidar_pdf_detalle(sender, instance, **kwargs):
+    cache_pdf.invalidar(instance.factura_id)
+    # La factura cambia con sus detalles (su ETag en la API también)
+    Factura.objects.filter(pk=instance.factura_id).update(fecha_actualizacion=timezone.now())
+
+# Clientes: tabla pequeña, se valida con su versión (uglobals/versiones.py)
+@receiver(post_save, sender=Cliente)
+@receiver(post_delete, sender=Cliente)
+def invalidar_version_cliente(sender, **kwargs):
+    versiones.invalidar(sender)
+
+# --- Resúmenes diarios de ventas (rollups) ---
+# Se mantienen de forma incremental desde sales/resumenes.py (al registrar, anular o eliminar
+# facturas y al agregar, editar o eliminar detalles) y se reconstruyen con
+# 'manage.py reconstruir_resumenes'; la migración 0006 los llena con las ventas anteriores.
+# Las facturas anuladas no suman. Los reportes leen estas tablas: su costo depende del
+# número de días del rango, no del número de ventas.
+class ResumenDiarioBase(models.Model):
+    dia = models.DateField()
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    costo = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    cantidad = models.IntegerField(default=0) # Unidades vendidas
+    numero_facturas = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+class ResumenDiarioUsuario(ResumenDiarioBase):
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='resumenes_diarios')
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['dia', 'usuario'], name='resumen_dia_usuario_unico')]
+
+class ResumenDiarioCliente(ResumenDiarioBase):
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='resumenes_diarios')
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['dia', 'cliente'], name='resumen_dia_cliente_unico')]
+
+class ResumenDiarioProducto(ResumenDiarioBase):
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='resumenes_diarios')
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['dia', 'producto'], name='resumen_dia_producto_unico')]
+
+# --- Cola de envíos de facturas por email ---
+# 'send_pdf_email' solo encola; 'manage.py procesar_envios' (sales/envios.py) genera el PDF
+# y lo envía fuera de la petición, con reintentos y espera creciente entre intentos.
+class EnvioFactura(models.Model):
+    PENDIENTE = 'Pendiente'
+    PROCESANDO = 'Procesando'
+    ENVIADO = 'Enviado'
+    FALLIDO = 'Fallido'
+    ESTADOS = [(PENDIENTE, PENDIENTE), (PROCESANDO, PROCESANDO), (ENVIADO, ENVIADO), (FALLIDO, FALLIDO)]
+
+    factura = models.ForeignKey(Factura, on_delete=models.CASCADE, related_name='envios')
+    destinatario = models.EmailField()
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=PENDIENTE)
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=5)
+    proximo_intento = models.DateTimeField(default=timezone.now) # No se procesa antes de esta fecha
+    bloqueado_hasta = models.DateTimeField(null=True, blank=True) # Si el worker muere, se libera al vencer
+    ultimo_error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_envio = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # El worker busca trabajos por estado y fecha de próximo intento
+            models.Index(fields=['estado', 'proximo_intento'], name='envio_estado_proximo_idx'),
+        ]
 
     def __str__(self):
-        return f"Detalle de Venta para {self.factura.id_factura} - {self.producto.nombre}"
\ No newline at end of file
+        return f"Envío de {self.factura.id_factura} a {self.destinatario} ({self.estado})"
+
+
+from . import resumenes # noqa: E402 (usa los modelos de arriba)
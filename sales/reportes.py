@@ -0,0 +1,74 @@
+# sales/reportes.py
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+FORMATO_FECHA = '%Y-%m-%d'
+
+
+def leer_rango_fechas(request):
+    """
+    Lee 'start_date' y 'end_date' (YYYY-MM-DD) de la URL y los convierte en un rango
+    semiabierto [desde, hasta) de datetimes en la zona horaria configurada:
+    desde = start_date 00:00 y hasta = día siguiente a end_date 00:00.
+    Cualquiera de los dos puede ser None si no viene en la URL.
+    Lanza ValueError con un mensaje para el cliente si el formato es inválido.
+    """
+    return rango_de_dias(*leer_dias(request))
+
+
+def leer_dias(request):
+    """
+    Lee 'start_date' y 'end_date' (YYYY-MM-DD) como date, ambos incluidos (o None).
+    Es lo que usan los reportes que leen los resúmenes diarios.
+    Lanza ValueError con un mensaje para el cliente si el formato es inválido.
+    """
+    return (
+        leer_fecha(request.query_params.get('start_date'), 'inicio'),
+        leer_fecha(request.query_params.get('end_date'), 'fin'),
+    )
+
+
+def filtrar_dias(queryset, dia_inicio, dia_fin, campo='dia'):
+    """Filtra una columna DateField (por defecto 'dia') entre dos date incluidos."""
+    if dia_inicio is not None:
+        queryset = queryset.filter(**{f'{campo}__gte': dia_inicio})
+    if dia_fin is not None:
+        queryset = queryset.filter(**{f'{campo}__lte': dia_fin})
+    return queryset
+
+
+def rango_de_dias(dia_inicio, dia_fin):
+    """
+    Convierte dos date (ambos incluidos, cualquiera puede ser None) en el rango
+    semiabierto [dia_inicio 00:00, día siguiente a dia_fin 00:00) en la zona horaria configurada.
+    """
+    desde = _inicio_del_dia(dia_inicio) if dia_inicio else None
+    hasta = _inicio_del_dia(dia_fin + timedelta(days=1)) if dia_fin else None
+    return desde, hasta
+
+
+def filtrar_rango_fechas(queryset, campo, desde, hasta):
+    """
+    Filtra 'campo' con comparaciones directas (campo >= desde AND campo < hasta) en lugar
+    de campo__date, que envuelve la columna en un DATE() e impide usar su índice.
+    """
+    if desde is not None:
+        queryset = queryset.filter(**{f'{campo}__gte': desde})
+    if hasta is not None:
+        queryset = queryset.filter(**{f'{campo}__lt': hasta})
+    return queryset
+
+
+def leer_fecha(valor, nombre):
+    """Convierte "AAAA-MM-DD" en date (None si viene vacío); 'nombre' se usa en el mensaje de error."""
+    if not valor:
+        return None
+    try:
+        return datetime.strptime(valor, FORMATO_FECHA).date()
+    except ValueError:
+        raise ValueError(f"Formato de fecha de {nombre} inválido. Use AAAA-MM-DD.")
+
+
+def _inicio_del_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min), timezone.get_current_timezone())
@@ -0,0 +1,176 @@
+# sales/resumenes.py
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .reportes import filtrar_dias, filtrar_rango_fechas, rango_de_dias
+from .models import DetalleVenta, Factura, ResumenDiarioCliente, ResumenDiarioProducto, ResumenDiarioUsuario
+
+METRICAS = ('ingresos', 'costo', 'cantidad', 'numero_facturas')
+
+# Tabla de resumen -> campo de la factura (o del detalle) por el que agrupa
+DIMENSIONES = (
+    (ResumenDiarioUsuario, 'usuario_id'),
+    (ResumenDiarioCliente, 'cliente_id'),
+    (ResumenDiarioProducto, 'producto_id'),
+)
+
+
+def _metricas_vacias():
+    return {'ingresos': Decimal('0.00'), 'costo': Decimal('0.00'), 'cantidad': 0, 'numero_facturas': 0}
+
+
+def sumar_factura(factura, detalles):
+    """
+    Suma a los resúmenes del día una factura recién registrada con sus detalles.
+    """
+    _aplicar_factura(factura, detalles, 1)
+
+
+def restar_factura(factura, detalles=None):
+    """
+    Resta de los resúmenes una factura que se anula o se elimina.
+    """
+    if detalles is None:
+        detalles = factura.detalle_ventas.all()
+    _aplicar_factura(factura, detalles, -1)
+
+
+def sumar_detalle(detalle):
+    """
+    Suma a los resúmenes un detalle que se agrega (o queda tras editarse) en una factura
+    vigente. La factura ya contaba; el producto empieza a contarla si es su primera línea.
+    """
+    _aplicar_detalle(detalle, 1)
+
+
+def restar_detalle(detalle):
+    """
+    Resta de los resúmenes un detalle que se elimina de una factura vigente (o su versión
+    anterior al editarlo). La factura sigue contando; el producto deja de contarla si no le
+    quedan más líneas de él.
+    """
+    _aplicar_detalle(detalle, -1)
+
+
+def _aplicar_detalle(detalle, signo):
+    factura = detalle.factura
+    metricas = _metricas_detalle(detalle)
+    sin_factura = dict(metricas, numero_facturas=0)
+    otra_linea = DetalleVenta.objects.filter(
+        factura_id=detalle.factura_id, producto_id=detalle.producto_id
+    ).exclude(pk=detalle.pk).exists()
+    dia = timezone.localdate(factura.fecha)
+    _incrementar(ResumenDiarioUsuario, 'usuario_id', dia, {factura.usuario_id: sin_factura}, signo)
+    _incrementar(ResumenDiarioCliente, 'cliente_id', dia, {factura.cliente_id: sin_factura}, signo)
+    _incrementar(ResumenDiarioProducto, 'producto_id', dia,
+                 {detalle.producto_id: sin_factura if otra_linea else metricas}, signo)
+
+
+def _metricas_detalle(detalle):
+    # Con el costo guardado en la línea al vender: sumar y restar usan siempre el mismo,
+    # aunque después cambie el precio_costo del producto
+    return {
+        'ingresos': detalle.subtotal,
+        'costo': detalle.cantidad * detalle.costo_unitario,
+        'cantidad': detalle.cantidad,
+        'numero_facturas': 1,
+    }
+
+
+def _aplicar_factura(factura, detalles, signo):
+    total = _metricas_vacias()
+    total['numero_facturas'] = 1
+    por_producto = defaultdict(_metricas_vacias)
+    for detalle in detalles:
+        metricas = _metricas_detalle(detalle)
+        for nombre in ('ingresos', 'costo', 'cantidad'):
+            total[nombre] += metricas[nombre]
+            por_producto[detalle.producto_id][nombre] += metricas[nombre]
+        por_producto[detalle.producto_id]['numero_facturas'] = 1
+
+    dia = timezone.localdate(factura.fecha)
+    _incrementar(ResumenDiarioUsuario, 'usuario_id', dia, {factura.usuario_id: total}, signo)
+    _incrementar(ResumenDiarioCliente, 'cliente_id', dia, {factura.cliente_id: total}, signo)
+    if por_producto:
+        _incrementar(ResumenDiarioProducto, 'producto_id', dia, por_producto, signo)
+
+
+def _incrementar(modelo, campo, dia, valores, signo):
+    """
+    Suma (o resta) 'valores' {clave: métricas} a las filas (dia, clave) de 'modelo' con un
+    solo INSERT ... ON CONFLICT DO UPDATE (ON DUPLICATE KEY UPDATE en MySQL) que crea las
+    filas que faltan y a las existentes les suma (metrica = metrica + nuevo). Sin leer
+    antes: dos procesos que tocan el mismo día no chocan con la clave única ni se pisan.
+    """
+    if not valores:
+        return
+    q = connection.ops.quote_name
+    tabla = q(modelo._meta.db_table)
+    columnas = ['dia', modelo._meta.get_field(campo).column, *METRICAS]
+    # Claves ordenadas: dos sentencias sobre las mismas filas las bloquean en el mismo orden
+    filas = [(dia, clave, *(signo * valores[clave][metrica] for metrica in METRICAS)) for clave in sorted(valores)]
+    if connection.vendor == 'mysql':
+        conflicto = 'ON DUPLICATE KEY UPDATE ' + ', '.join(
+            f'{q(metrica)} = {q(metrica)} + VALUES({q(metrica)})' for metrica in METRICAS
+        )
+    else:
+        conflicto = f'ON CONFLICT ({q(columnas[0])}, {q(columnas[1])}) DO UPDATE SET ' + ', '.join(
+            f'{q(metrica)} = {tabla}.{q(metrica)} + EXCLUDED.{q(metrica)}' for metrica in METRICAS
+        )
+    fila_sql = '(' + ', '.join(['%s'] * len(columnas)) + ')'
+    sql = (
+        f'INSERT INTO {tabla} ({", ".join(q(columna) for columna in columnas)}) '
+        f'VALUES {", ".join([fila_sql] * len(filas))} {conflicto}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [connection.ops.adapt_datefield_value(valor) if i == 0 else valor
+                             for fila in filas for i, valor in enumerate(fila)])
+
+
+def reconstruir(desde=None, hasta=None):
+    """
+    Recalcula los resúmenes desde las facturas (no anuladas) y sus detalles.
+    'desde' y 'hasta' son date incluidos; sin ellos se recalcula todo el historial.
+    Devuelve el número de filas creadas por tabla.
+    """
+    inicio, fin = rango_de_dias(desde, hasta)
+    zona = timezone.get_current_timezone()
+    facturas = filtrar_rango_fechas(Factura.objects.exclude(estado='Anulada'), 'fecha', inicio, fin)
+    detalles = filtrar_rango_fechas(
+        DetalleVenta.objects.exclude(factura__estado='Anulada'), 'factura__fecha', inicio, fin
+    )
+    costo = Sum(F('cantidad') * F('costo_unitario'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+    creadas = {}
+    with transaction.atomic():
+        for modelo, campo in DIMENSIONES:
+            filtrar_dias(modelo.objects.all(), desde, hasta).delete()
+
+            filas = defaultdict(_metricas_vacias)
+            origen = campo if campo == 'producto_id' else f'factura__{campo}'
+            por_lineas = detalles.values(dia=TruncDate('factura__fecha', tzinfo=zona), clave=F(origen)).annotate(
+                ingresos=Sum('subtotal'), costo=costo, cantidad=Sum('cantidad'),
+                numero_facturas=Count('factura', distinct=True),
+            ).order_by()
+            for fila in por_lineas:
+                filas[(fila['dia'], fila['clave'])].update(
+                    ingresos=fila['ingresos'], costo=fila['costo'] or Decimal('0.00'), cantidad=fila['cantidad'],
+                    numero_facturas=fila['numero_facturas'],
+                )
+            if campo != 'producto_id':
+                # Las facturas se cuentan desde Factura para incluir las que no tienen detalles
+                por_factura = facturas.values(dia=TruncDate('fecha', tzinfo=zona), clave=F(campo)).annotate(
+                    numero=Count('id')
+                ).order_by()
+                for fila in por_factura:
+                    filas[(fila['dia'], fila['clave'])]['numero_facturas'] = fila['numero']
+
+            objetos = [modelo(dia=dia, **{campo: clave}, **metricas) for (dia, clave), metricas in filas.items()]
+            modelo.objects.bulk_create(objetos, batch_size=1000)
+            creadas[modelo.__name__] = len(objetos)
+    return creadas
@@ -1,9 +1,8 @@
 # sales/serializers.py
 from rest_framework import serializers
-from decimal import Decimal
-from django.db import transaction
+from django.db.models import Prefetch
 # Importa modelos de su propia aplicación
-from .models import Cliente, Factura, DetalleVenta, FormaPago
+from .models import Cliente, Factura, DetalleVenta, EnvioFactura, FormaPago
 # Importa modelos y serializadores de otras aplicaciones
 from products.models import Producto # Modelo de 'products'
 from products.serializers import ProductoSerializer # Serializador de 'products'
@@ -11,6 +10,9 @@ from uglobals.models import FormaPago # Modelo de 'uglobals'
 from users.models import Usuario    # Modelo de 'users'
 from uglobals.serializers import FormaPagoSerializer # Serializador de 'uglobals'
 from users.serializers import UsuarioSerializer # Serializador de 'users'
+from uglobals.campos import CamposDinamicosSerializerMixin
+from uglobals.catalogos import CatalogoRelatedField
+from .services import registrar_factura
 
 
 class ClienteSerializer(serializers.ModelSerializer):
@@ -35,28 +37,43 @@ class DetalleVentaSerializer(serializers.ModelSerializer):
         # 'producto_details' es para la salida, 'producto' es para la entrada.
         fields = ['id', 'producto_details', 'producto', 'cantidad', 'precio_unitario', 'subtotal']
         read_only_fields = ['subtotal']
+        # Sin precio se usa el precio_sugerido_venta del producto (ver validate)
+        extra_kwargs = {'precio_unitario': {'required': False}}
 
     # Opcional: Asegúrate de que el precio unitario sea el del producto si no se envía
     def validate(self, data):
         # 'producto' en 'data' ya será el objeto Producto resuelto por PrimaryKeyRelatedField
         if self.instance is None and 'precio_unitario' not in data and 'producto' in data:
-            data['precio_unitario'] = data['producto'].precio_venta
+            data['precio_unitario'] = data['producto'].precio_sugerido_venta
         elif self.instance and 'precio_unitario' not in data and 'producto' in data:
-            data['precio_unitario'] = self.instance.precio_unitario if self.instance.precio_unitario else data['producto'].precio_venta
+            data['precio_unitario'] = self.instance.precio_unitario if self.instance.precio_unitario else data['producto'].precio_sugerido_venta
         return data
 
+# Salida de un detalle dentro de FacturaSerializer; el producto lo añade la factura
+# (una sola vez por producto) en vez de serializarlo aquí.
+class DetalleVentaLecturaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DetalleVenta
+        fields = ['id', 'cantidad', 'precio_unitario', 'subtotal']
+
 # --- Serializador de Factura ---
-class FacturaSerializer(serializers.ModelSerializer):
+class FacturaSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
+    # Relaciones que pueden salir anidadas (?expand=); sin ?expand salen todas, como siempre
+    campos_expandibles = ('cliente', 'forma_pago', 'usuario', 'detalle_ventas')
+
     # Serializador anidado para los detalles de venta
     # Many=True porque una factura tiene muchos detalles
     # Aquí, DetalleVentaSerializer se encargará de usar 'producto_details' para la salida
     # y 'producto' para la entrada.
-    detalle_ventas = DetalleVentaSerializer(many=True, required=False)
+    # write_only: la salida de los detalles se arma en to_representation (una sola pasada).
+    detalle_ventas = DetalleVentaSerializer(many=True, required=False, write_only=True)
 
     # Claves foráneas: usar PrimaryKeyRelatedField para escritura
     cliente = serializers.PrimaryKeyRelatedField(queryset=Cliente.objects.all())
-    forma_pago = serializers.PrimaryKeyRelatedField(queryset=FormaPago.objects.all())
+    forma_pago = CatalogoRelatedField(queryset=FormaPago.objects.all()) # Validada contra el caché de catálogos
     usuario = serializers.PrimaryKeyRelatedField(queryset=Usuario.objects.all())
+    # Nombre del cliente sin anidar el objeto completo (útil con ?fields=)
+    cliente_nombre = serializers.ReadOnlyField(source='cliente.nombre')
 
     class Meta:
         model = Factura
@@ -65,23 +82,8 @@ class FacturaSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         detalle_ventas_data = validated_data.pop('detalle_ventas', [])
-
-        with transaction.atomic():
-            factura = Factura.objects.create(**validated_data)
-            total_factura = Decimal('0.00')
-
-            for detalle_data in detalle_ventas_data:
-                # 'detalle_data' ya contendrá el objeto Producto resuelto por el serializador anidado
-                if 'precio_unitario' not in detalle_data:
-                    detalle_data['precio_unitario'] = detalle_data['producto'].precio_venta
-
-                detalle = DetalleVenta.objects.create(factura=factura, **detalle_data)
-                total_factura += detalle.subtotal
-
-            factura.total = total_factura
-            factura.save()
-
-        return factura
+        # Toda la lógica de stock y totales vive en sales/services.py
+        return registrar_factura(validated_data, detalle_ventas_data)
 
     def update(self, instance, validated_data):
         detalle_ventas_data = validated_data.pop('detalle_ventas', [])
@@ -93,40 +95,66 @@ class FacturaSerializer(serializers.ModelSerializer):
 
     # ESTO ES CLAVE: Sobreescribimos to_representation para la lectura (GET)
     # y así podemos anidar el ProductoSerializer completo para los detalles de venta.
+    # Trabaja sobre los objetos ya cargados por FacturaViewSet.get_queryset (select_related +
+    # Prefetch), así que no lanza consultas por factura. Cada cliente, forma de pago, usuario
+    # y producto se serializa una sola vez por respuesta y se reutiliza en las demás facturas.
     def to_representation(self, instance):
         representation = super().to_representation(instance)
 
         # Serialización de campos de clave foránea para la lectura (objetos completos)
-        if instance.cliente:
-            representation['cliente'] = ClienteSerializer(instance.cliente).data
-        else:
-            representation['cliente'] = None
-
-        if instance.forma_pago:
-            representation['forma_pago'] = FormaPagoSerializer(instance.forma_pago).data
-        else:
-            representation['forma_pago'] = None
+        if self.debe_expandir('cliente'):
+            representation['cliente'] = self._serializar_relacion(ClienteSerializer, instance.cliente)
+        if self.debe_expandir('forma_pago'):
+            representation['forma_pago'] = self._serializar_relacion(FormaPagoSerializer, instance.forma_pago)
+        if self.debe_expandir('usuario'):
+            representation['usuario'] = self._serializar_relacion(UsuarioSerializer, instance.usuario)
 
-        if instance.usuario:
-            representation['usuario'] = UsuarioSerializer(instance.usuario).data
-        else:
-            representation['usuario'] = None
+        if 'detalle_ventas' not in self.fields:
+            return representation
 
         # Serialización ANIDADA de detalle_ventas para la lectura (objetos de producto completos)
-        detalle_ventas_representation = []
-        for detalle_venta in instance.detalle_ventas.all():
-            # Obtenemos la representación básica del DetalleVenta (que incluye el ID del producto)
-            detalle_rep = DetalleVentaSerializer(detalle_venta).data
-            
-            # Ahora, reemplazamos el ID del producto con la representación completa del ProductoSerializer
-            # Esto es lo que el frontend necesita para mostrar los detalles del producto en la factura.
-            if detalle_venta.producto: # Asegurarse de que el producto exista
-                detalle_rep['producto'] = ProductoSerializer(detalle_venta.producto).data
+        # Sin expandir, cada detalle lleva solo el id del producto.
+        detalles = list(instance.detalle_ventas.all())
+        detalle_ventas_representation = DetalleVentaLecturaSerializer(detalles, many=True).data
+        for detalle_rep, detalle_venta in zip(detalle_ventas_representation, detalles):
+            if self.debe_expandir('detalle_ventas'):
+                detalle_rep['producto'] = self._serializar_relacion(ProductoSerializer, detalle_venta.producto)
             else:
-                detalle_rep['producto'] = None # O un valor por defecto si el producto no existe/fue eliminado
-
-            detalle_ventas_representation.append(detalle_rep)
+                detalle_rep['producto'] = detalle_venta.producto_id
 
         representation['detalle_ventas'] = detalle_ventas_representation
 
         return representation
+
+    def preparar_queryset(self, queryset):
+        # Relaciones que to_representation recorre además de las FK directas
+        if self.debe_expandir('usuario'):
+            queryset = queryset.select_related('usuario__rol').prefetch_related('usuario__rol__permisos')
+        if 'detalle_ventas' in self.fields:
+            detalles = DetalleVenta.objects.order_by('id')
+            if self.debe_expandir('detalle_ventas'):
+                detalles = detalles.select_related('producto__proveedor', 'producto__categoria', 'producto__marca')
+            queryset = queryset.prefetch_related(Prefetch('detalle_ventas', queryset=detalles))
+        return queryset
+
+    def _serializar_relacion(self, serializer_class, obj):
+        """
+        Serializa 'obj' con 'serializer_class' guardando el resultado por (clase, pk)
+        para no repetir el trabajo en las demás facturas de la misma respuesta.
+        """
+        if obj is None:
+            return None
+        cache = getattr(self, '_relaciones_serializadas', None)
+        if cache is None:
+            cache = self._relaciones_serializadas = {}
+        clave = (serializer_class, obj.pk)
+        if clave not in cache:
+            cache[clave] = serializer_class(obj).data
+        return cache[clave]
+
+
+class EnvioFacturaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = EnvioFactura
+        fields = ['id', 'destinatario', 'estado', 'intentos', 'max_intentos', 'proximo_intento',
+                  'ultimo_error', 'fecha_creacion', 'fecha_envio']
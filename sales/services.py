@@ -0,0 +1,59 @@
+# sales/services.py
+from decimal import Decimal
+
+from django.db import transaction
+
+from products.stock import cantidades_por_producto, descontar_stock
+from .models import Factura, DetalleVenta
+from .resumenes import sumar_factura
+
+
+def registrar_factura(factura_data, detalle_ventas_data):
+    """
+    Crea una factura con todos sus detalles en una sola transacción.
+    Descuenta el stock de todos los productos con descontar_stock (un bloqueo ordenado
+    y un solo UPDATE condicional), inserta los detalles con bulk_create y guarda el
+    total una sola vez.
+    Si algún producto no tiene stock suficiente lanza ValidationError y no se
+    guarda nada (todo o nada).
+    """
+    # Cantidad total pedida por producto (un producto puede venir en varias líneas)
+    cantidades = cantidades_por_producto(
+        (detalle_data['producto'].pk, detalle_data['cantidad']) for detalle_data in detalle_ventas_data
+    )
+
+    with transaction.atomic():
+        factura = Factura.objects.create(**factura_data)
+
+        if not cantidades:
+            sumar_factura(factura, [])
+            return factura
+
+        # Bloqueo ordenado, validación y un solo UPDATE condicional (products/stock.py)
+        productos = descontar_stock(cantidades, documento=factura.id_factura)
+
+        detalles = []
+        total_factura = Decimal('0.00')
+        for detalle_data in detalle_ventas_data:
+            producto = productos[detalle_data['producto'].pk]
+            precio_unitario = detalle_data.get('precio_unitario')
+            if precio_unitario is None:
+                precio_unitario = producto.precio_sugerido_venta
+            subtotal = detalle_data['cantidad'] * precio_unitario
+            total_factura += subtotal
+            detalles.append(DetalleVenta(
+                factura=factura,
+                producto=producto,
+                cantidad=detalle_data['cantidad'],
+                precio_unitario=precio_unitario,
+                subtotal=subtotal,
+                costo_unitario=producto.precio_costo,
+            ))
+        # bulk_create no llama a DetalleVenta.save(), así que el stock no se descuenta dos veces
+        DetalleVenta.objects.bulk_create(detalles)
+
+        factura.total = total_factura
+        factura.save(update_fields=['total'])
+        sumar_factura(factura, detalles)
+
+    return factura
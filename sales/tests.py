@@ -0,0 +1,709 @@
+# sales/tests.py
+import csv
+import io
+import json
+import os
+import smtplib
+import tempfile
+import threading
+import zipfile
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+
+from django.core import mail
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.mail import get_connection
+from django.core.mail.backends import locmem
+from django.db import connection, transaction
+from django.test import Client, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from products.models import MovimientoStock, Producto
+from uglobals.models import Categoria, FormaPago, Marca, Proveedor, Secuencia
+from users.models import Permiso, Rol, Usuario
+from sales.envios import procesar_pendientes
+from sales.lotes_pdf import datos_facturas, zip_facturas
+from sales.models import Cliente, DetalleVenta, EnvioFactura, Factura, ResumenDiarioProducto, ResumenDiarioUsuario
+from sales.resumenes import reconstruir
+from sales.services import registrar_factura
+from sales import cache_pdf, utils
+from uglobals import versiones
+from sales.utils import generate_invoice_pdf
+
+
+@skipUnlessDBFeature('has_select_for_update') # SQLite no soporta escrituras concurrentes reales
+class NumeracionFacturaConcurrenteTest(TransactionTestCase):
+    HILOS = 8
+    FACTURAS_POR_HILO = 250
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nombre='Cliente', email='cliente@keeplic.com')
+        self.forma_pago = FormaPago.objects.create(metodo='Efectivo')
+        self.usuario = Usuario.objects.create_user('cajero', 'cajero@keeplic.com', 'clave')
+
+    def _crear_facturas(self, errores):
+        try:
+            for _ in range(self.FACTURAS_POR_HILO):
+                Factura.objects.create(cliente=self.cliente, forma_pago=self.forma_pago, usuario=self.usuario)
+        except Exception as e:
+            errores.append(e)
+        finally:
+            connection.close()
+
+    def test_facturas_concurrentes_sin_duplicados_ni_huecos(self):
+        errores = []
+        hilos = [threading.Thread(target=self._crear_facturas, args=(errores,)) for _ in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        total = self.HILOS * self.FACTURAS_POR_HILO
+        numeros = sorted(int(n) for n in Factura.objects.values_list('id_factura', flat=True))
+        self.assertEqual(numeros, list(range(1, total + 1)))
+        self.assertEqual(Secuencia.objects.get(nombre='factura').valor, total)
+
+
+class NumeracionFacturaTest(TestCase):
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nombre='Cliente', email='cliente@keeplic.com')
+        self.forma_pago = FormaPago.objects.create(metodo='Efectivo')
+        self.usuario = Usuario.objects.create_user('cajero', 'cajero@keeplic.com', 'clave')
+
+    def test_rollback_no_deja_huecos(self):
+        Factura.objects.create(cliente=self.cliente, forma_pago=self.forma_pago, usuario=self.usuario)
+        try:
+            with transaction.atomic():
+                Factura.objects.create(cliente=self.cliente, forma_pago=self.forma_pago, usuario=self.usuario)
+                raise RuntimeError('venta cancelada')
+        except RuntimeError:
+            pass
+        factura = Factura.objects.create(cliente=self.cliente, forma_pago=self.forma_pago, usuario=self.usuario)
+        self.assertEqual(factura.id_factura, '00000000002')
+
+
+def _crear_datos_stock(stock):
+    cliente = Cliente.objects.create(nombre='Cliente', email='cliente@keeplic.com')
+    forma_pago = FormaPago.objects.create(metodo='Efectivo')
+    usuario = Usuario.objects.create_user('cajero', 'cajero@keeplic.com', 'clave')
+    producto = Producto.objects.create(
+        nombre='Producto', proveedor=Proveedor.objects.create(nombre='Proveedor'),
+        categoria=Categoria.objects.create(nombre='Categoria'), marca=Marca.objects.create(nombre='Marca'),
+        stock=stock, precio_sugerido_venta=Decimal('10.00'),
+    )
+    datos_factura = {'cliente': cliente, 'forma_pago': forma_pago, 'usuario': usuario}
+    return producto, datos_factura
+
+
+@skipUnlessDBFeature('has_select_for_update') # SQLite no soporta escrituras concurrentes reales
+class StockConcurrenteTest(TransactionTestCase):
+    HILOS = 8
+    FACTURAS_POR_HILO = 10
+
+    def setUp(self):
+        self.producto, datos_factura = _crear_datos_stock(1000)
+        self.facturas = [
+            registrar_factura(dict(datos_factura), [{'producto': self.producto, 'cantidad': 3}]).pk
+            for _ in range(self.HILOS * self.FACTURAS_POR_HILO)
+        ]
+
+    def _anular(self, ids, errores):
+        cliente_http = Client() # Uno por hilo
+        try:
+            for factura_id in ids:
+                respuesta = cliente_http.post(f'/api/facturas/{factura_id}/anular/')
+                if respuesta.status_code != 200:
+                    errores.append(respuesta.data)
+        except Exception as e:
+            errores.append(e)
+        finally:
+            connection.close()
+
+    def test_anulaciones_simultaneas_no_pierden_stock(self):
+        errores = []
+        hilos = [
+            threading.Thread(target=self._anular, args=(self.facturas[i::self.HILOS], errores))
+            for i in range(self.HILOS)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 1000)
+
+    def _en_paralelo(self, peticion, veces):
+        # Lanza 'veces' peticiones a la vez (cada una con su cliente y su conexión) y devuelve los códigos
+        codigos = []
+        barrera = threading.Barrier(veces)
+
+        def lanzar():
+            try:
+                barrera.wait()
+                codigos.append(peticion(Client()).status_code)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=lanzar) for _ in range(veces)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return sorted(codigos)
+
+    def test_anular_la_misma_factura_a_la_vez_devuelve_el_stock_una_vez(self):
+        factura_id = self.facturas[0]
+        codigos = self._en_paralelo(lambda cliente: cliente.post(f'/api/facturas/{factura_id}/anular/'), self.HILOS)
+        self.assertEqual(codigos, [200] + [400] * (self.HILOS - 1))
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 1000 - 3 * (len(self.facturas) - 1))
+        self.assertEqual(MovimientoStock.objects.filter(tipo=MovimientoStock.ANULACION).count(), 1)
+
+    def test_borrar_el_mismo_detalle_a_la_vez_devuelve_el_stock_una_vez(self):
+        detalle_id = DetalleVenta.objects.get(factura_id=self.facturas[0]).pk
+        codigos = self._en_paralelo(lambda cliente: cliente.delete(f'/api/detalles_venta/{detalle_id}/'), self.HILOS)
+        self.assertEqual(codigos[0], 204)
+        self.assertEqual(codigos[1:], [404] * (self.HILOS - 1))
+        self.assertEqual(MovimientoStock.objects.filter(tipo=MovimientoStock.DEVOLUCION).count(), 1)
+
+
+class StockFacturaTest(TestCase):
+    def setUp(self):
+        self.producto, self.datos_factura = _crear_datos_stock(50)
+
+    def _registrar(self, *cantidades):
+        return registrar_factura(
+            dict(self.datos_factura), [{'producto': self.producto, 'cantidad': c} for c in cantidades]
+        )
+
+    def _stock(self):
+        self.producto.refresh_from_db()
+        return self.producto.stock
+
+    def test_anular_devuelve_el_stock_en_un_solo_update(self):
+        factura = self._registrar(*[1] * 10)
+        self.assertEqual(self._stock(), 40)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.post(f'/api/facturas/{factura.pk}/anular/')
+        actualizaciones = [c for c in consultas.captured_queries if 'products_producto' in c['sql'] and c['sql'].startswith('UPDATE')]
+        self.assertEqual(len(actualizaciones), 1)
+        self.assertEqual(self._stock(), 50)
+
+    def test_eliminar_detalle_de_factura_anulada_no_devuelve_dos_veces(self):
+        factura = self._registrar(5)
+        self.client.post(f'/api/facturas/{factura.pk}/anular/')
+        detalle = factura.detalle_ventas.get()
+        self.assertEqual(self.client.delete(f'/api/detalles_venta/{detalle.pk}/').status_code, 204)
+        self.assertEqual(self._stock(), 50)
+
+    def test_anular_dos_veces_no_devuelve_el_stock_dos_veces(self):
+        factura = self._registrar(5)
+        self.assertEqual(self.client.post(f'/api/facturas/{factura.pk}/anular/').status_code, 200)
+        self.assertEqual(self.client.post(f'/api/facturas/{factura.pk}/anular/').status_code, 400)
+        self.assertEqual(self._stock(), 50)
+
+    def test_eliminar_factura_vigente_devuelve_el_stock(self):
+        factura = self._registrar(5, 2)
+        self.client.delete(f'/api/facturas/{factura.pk}/')
+        self.assertEqual(self._stock(), 50)
+
+    def test_editar_detalle_ajusta_solo_la_diferencia(self):
+        factura = self._registrar(5)
+        detalle = factura.detalle_ventas.get()
+        detalle.cantidad = 8
+        detalle.save()
+        self.assertEqual(self._stock(), 42)
+        detalle.cantidad = 1
+        detalle.save()
+        self.assertEqual(self._stock(), 49)
+
+    def test_detalle_sin_precio_usa_el_precio_sugerido(self):
+        datos = {clave: valor.pk for clave, valor in self.datos_factura.items()}
+        datos['detalle_ventas'] = [{'producto': self.producto.pk, 'cantidad': 3}]
+        respuesta = self.client.post('/api/facturas/', datos, content_type='application/json')
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+        detalle = DetalleVenta.objects.get(factura_id=respuesta.data['id_factura'])
+        self.assertEqual(detalle.precio_unitario, Decimal('10.00'))
+        self.assertEqual(detalle.subtotal, Decimal('30.00'))
+        self.assertEqual(self._stock(), 47)
+
+    def test_venta_sin_stock_suficiente_no_descuenta_nada(self):
+        with self.assertRaises(DjangoValidationError):
+            self._registrar(30, 30)
+        self.assertEqual(self._stock(), 50)
+
+
+class FacturaListadoConsultasTest(TestCase):
+    def setUp(self):
+        rol = Rol.objects.create(nombre='Cajero')
+        Permiso.objects.create(nombre='ventas', rol=rol)
+        Permiso.objects.create(nombre='reportes', rol=rol)
+        self.cliente = Cliente.objects.create(nombre='Cliente', email='cliente@keeplic.com')
+        self.forma_pago = FormaPago.objects.create(metodo='Efectivo')
+        self.usuario = Usuario.objects.create_user('cajero', 'cajero@keeplic.com', 'clave', rol=rol)
+        proveedor = Proveedor.objects.create(nombre='Proveedor')
+        categoria = Categoria.objects.create(nombre='Categoria')
+        marca = Marca.objects.create(nombre='Marca')
+        self.productos = [
+            Producto.objects.create(nombre=f'Producto {i}', proveedor=proveedor, categoria=categoria, marca=marca, stock=100)
+            for i in range(3)
+        ]
+
+    def _crear_facturas(self, cantidad):
+        for _ in range(cantidad):
+            factura = Factura.objects.create(cliente=self.cliente, forma_pago=self.forma_pago, usuario=self.usuario)
+            DetalleVenta.objects.bulk_create([
+                DetalleVenta(factura=factura, producto=producto, cantidad=1, precio_unitario=Decimal('10.00'), subtotal=Decimal('10.00'))
+                for producto in self.productos
+            ])
+
+    def test_consultas_constantes_sin_importar_el_tamano_de_pagina(self):
+        self._crear_facturas(20)
+        # Validador del ETag (facturas, versiones de las tablas pequeñas, productos) + count de
+        # la paginación + facturas + permisos del rol + detalles con sus productos
+        with self.assertNumQueries(7):
+            respuesta = self.client.get('/api/facturas/?limit=1')
+        self.assertEqual(len(respuesta.data['results']), 1)
+        with self.assertNumQueries(7):
+            respuesta = self.client.get('/api/facturas/?limit=20')
+        self.assertEqual(len(respuesta.data['results']), 20)
+
+    def test_detalle_incluye_el_producto_una_sola_vez(self):
+        self._crear_facturas(1)
+        detalle = self.client.get('/api/facturas/').data['results'][0]['detalle_ventas'][0]
+        self.assertEqual(detalle['producto']['nombre'], 'Producto 0')
+        self.assertEqual(detalle['producto']['proveedor_nombre'], 'Proveedor')
+        self.assertNotIn('producto_details', detalle)
+
+    def test_fields_limita_campos_y_consultas(self):
+        self._crear_facturas(5)
+        # Validador del ETag (3) + count de la paginación + facturas con el nombre del cliente
+        # (sin detalles ni usuario)
+        with self.assertNumQueries(5):
+            respuesta = self.client.get('/api/facturas/?limit=5&ordering=-fecha&fields=id,id_factura,fecha,cliente_nombre,total')
+        self.assertEqual(
+            set(respuesta.data['results'][0]),
+            {'id', 'id_factura', 'fecha', 'cliente_nombre', 'total'},
+        )
+
+    def test_paginacion_por_cursor_recorre_todas_las_facturas(self):
+        self._crear_facturas(7)
+        vistas = []
+        respuesta = self.client.get('/api/facturas/?limit=3&fields=id', HTTP_X_PAGINACION='cursor')
+        while True:
+            vistas += [factura['id'] for factura in respuesta.data['results']]
+            if not respuesta.data['next']:
+                break
+            respuesta = self.client.get(respuesta.data['next'])
+        self.assertEqual(vistas, sorted(Factura.objects.values_list('id', flat=True), reverse=True))
+
+
+# Listados de products, sales, uglobals y users (con los parámetros que cambian las consultas)
+LISTADOS = [
+    '/api/clientes/',
+    '/api/facturas/?limit=100',
+    '/api/facturas/?limit=100&expand=cliente',
+    '/api/detalles_venta/',
+    '/api/reportes/productos-mas-vendidos/',
+    '/api/reportes/ganancias-por-fecha/',
+    '/api/reportes/ingresos-detallados/',
+    '/api/reportes/productos-bajo-stock/',
+    '/api/reportes/rendimiento-empleados/',
+    '/api/reportes/ventas-por-cliente/',
+]
+
+
+@override_settings(CATALOGOS_CACHE_REVALIDAR_SEGUNDOS=3600)
+class ListadosConsultasTest(TestCase):
+    """
+    Cada listado hace las mismas consultas con pocas o muchas filas: si alguno vuelve a
+    consultar por fila (N+1) esta prueba falla y dice cuál.
+    """
+    def setUp(self):
+        versiones.limpiar()
+        self.addCleanup(versiones.limpiar)
+        self.creados = 0
+
+    def _agregar(self, cantidad):
+        # Cada vuelta suma una factura con dos detalles, con cliente, cajero y producto nuevos
+        for _ in range(cantidad):
+            i = self.creados = self.creados + 1
+            producto = Producto.objects.create(
+                nombre=f'Producto {i}', stock=10, proveedor=Proveedor.objects.create(nombre=f'Proveedor {i}'),
+                categoria=Categoria.objects.create(nombre=f'Categoria {i}'), marca=Marca.objects.create(nombre=f'Marca {i}'),
+            )
+            registrar_factura({
+                'cliente': Cliente.objects.create(nombre=f'Cliente {i}', email=f'cliente{i}@keeplic.com'),
+                'forma_pago': FormaPago.objects.create(metodo=f'Forma {i}'),
+                'usuario': Usuario.objects.create_user(f'cajero{i}', f'cajero{i}@keeplic.com', 'clave'),
+            }, [{'producto': producto, 'cantidad': 1}, {'producto': Producto.objects.earliest('id'), 'cantidad': 1}])
+
+    def _consultas(self, url):
+        self.client.get(url) # Las versiones de las tablas quedan recordadas en ambas mediciones
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200, url)
+        return len(consultas)
+
+    def test_consultas_no_crecen_con_las_filas(self):
+        self._agregar(2)
+        pocas = {url: self._consultas(url) for url in LISTADOS}
+        self._agregar(5)
+        for url in LISTADOS:
+            with self.subTest(url=url):
+                self.assertEqual(self._consultas(url), pocas[url])
+
+
+class GetCondicionalVentasTest(TestCase):
+    def setUp(self):
+        self.producto, datos_factura = _crear_datos_stock(50)
+        self.factura = registrar_factura(datos_factura, [{'producto': self.producto, 'cantidad': 2}])
+
+    def test_listado_responde_304_sin_serializar(self):
+        primera = self.client.get('/api/facturas/?limit=10')
+        self.assertEqual(primera.status_code, 200)
+        # Solo el validador: facturas, versiones de las tablas pequeñas y productos
+        with self.assertNumQueries(3):
+            repetida = self.client.get('/api/facturas/?limit=10', HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(repetida.status_code, 304)
+        self.assertEqual(repetida['ETag'], primera['ETag'])
+        # Otra URL (otra página, otros filtros) tiene otro ETag
+        self.assertNotEqual(self.client.get('/api/facturas/?limit=5')['ETag'], primera['ETag'])
+
+    def test_cambios_en_detalles_y_stock_cambian_el_etag(self):
+        etag = self.client.get('/api/facturas/')['ETag']
+        detalle = self.factura.detalle_ventas.get()
+        self.client.delete(f'/api/detalles_venta/{detalle.pk}/')
+        nuevo = self.client.get('/api/facturas/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(nuevo.status_code, 200)
+
+        etag_productos = self.client.get('/api/productos/')['ETag']
+        registrar_factura(
+            {'cliente': self.factura.cliente, 'forma_pago': self.factura.forma_pago, 'usuario': self.factura.usuario},
+            [{'producto': self.producto, 'cantidad': 1}],
+        )
+        self.assertEqual(self.client.get('/api/productos/', HTTP_IF_NONE_MATCH=etag_productos).status_code, 200)
+
+    def test_detalle_con_last_modified(self):
+        url = f'/api/productos/{self.producto.referencia_producto}/'
+        respuesta = self.client.get(url)
+        self.assertIn('Last-Modified', respuesta)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=respuesta['Last-Modified']).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
+        self.assertEqual(self.client.get('/api/productos/NOEXISTE/', HTTP_IF_NONE_MATCH='*').status_code, 404)
+
+
+class RangoFechasReportesTest(TestCase):
+    def setUp(self):
+        cliente = Cliente.objects.create(nombre='Cliente', email='cliente@keeplic.com')
+        forma_pago = FormaPago.objects.create(metodo='Efectivo')
+        usuario = Usuario.objects.create_user('cajero', 'cajero@keeplic.com', 'clave')
+        producto = Producto.objects.create(nombre='Producto', proveedor=Proveedor.objects.create(nombre='Proveedor'))
+        for dia, total in ((1, '10.00'), (15, '20.00'), (31, '40.00')):
+            factura = Factura.objects.create(cliente=cliente, forma_pago=forma_pago, usuario=usuario, total=Decimal(total))
+            DetalleVenta.objects.bulk_create([DetalleVenta(
+                factura=factura, producto=producto, cantidad=1, precio_unitario=Decimal(total), subtotal=Decimal(total)
+            )])
+            # fecha es auto_now_add: se ajusta con update
+            Factura.objects.filter(pk=factura.pk).update(fecha=datetime(2025, 1, dia, 23, 30, tzinfo=dt_timezone.utc))
+        # Las facturas se insertaron por fuera de registrar_factura: los reportes leen los resúmenes
+        reconstruir()
+
+    def test_ganancias_respeta_end_date_incluyendo_todo_el_dia(self):
+        respuesta = self.client.get('/api/reportes/ganancias-por-fecha/?start_date=2025-01-01&end_date=2025-01-15')
+        self.assertEqual(respuesta.data['numero_facturas'], 2)
+        self.assertEqual(respuesta.data['ganancia_bruta_total'], 30.0)
+
+    def test_ingresos_detallados_en_streaming(self):
+        url = '/api/reportes/ingresos-detallados/?start_date=2025-01-01&end_date=2025-01-15'
+        json_filas = self.client.get(url).json()
+
+        ndjson = self.client.get(url + '&format=ndjson')
+        self.assertTrue(ndjson.streaming)
+        lineas = b''.join(ndjson.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(linea) for linea in lineas], json_filas)
+
+        csv_respuesta = self.client.get(url + '&format=csv')
+        self.assertEqual(csv_respuesta['Content-Type'], 'text/csv; charset=utf-8')
+        filas = list(csv.DictReader(io.StringIO(b''.join(csv_respuesta.streaming_content).decode())))
+        self.assertEqual([fila['factura_id'] for fila in filas], [fila['factura_id'] for fila in json_filas])
+
+    def test_fecha_invalida(self):
+        respuesta = self.client.get('/api/reportes/ventas-por-cliente/?start_date=01-01-2025')
+        self.assertEqual(respuesta.status_code, 400)
+
+
+class ResumenesDiariosTest(TestCase):
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nombre='Cliente', email='cliente@keeplic.com')
+        self.forma_pago = FormaPago.objects.create(metodo='Efectivo')
+        self.usuario = Usuario.objects.create_user('cajero', 'cajero@keeplic.com', 'clave')
+        proveedor = Proveedor.objects.create(nombre='Proveedor')
+        self.productos = [
+            Producto.objects.create(nombre=f'Producto {i}', proveedor=proveedor, stock=100,
+                                    precio_costo=Decimal('4.00'), precio_sugerido_venta=Decimal('10.00'))
+            for i in range(2)
+        ]
+
+    def _registrar(self, *cantidades):
+        return registrar_factura(
+            {'cliente': self.cliente, 'forma_pago': self.forma_pago, 'usuario': self.usuario},
+            [{'producto': producto, 'cantidad': cantidad} for producto, cantidad in zip(self.productos, cantidades)],
+        )
+
+    def _resumen_usuario(self):
+        return ResumenDiarioUsuario.objects.values('ingresos', 'costo', 'cantidad', 'numero_facturas').get()
+
+    def test_registrar_y_anular_actualizan_los_resumenes(self):
+        self._registrar(2, 1)
+        factura = self._registrar(3)
+        self.assertEqual(self._resumen_usuario(), {
+            'ingresos': Decimal('60.00'), 'costo': Decimal('24.00'), 'cantidad': 6, 'numero_facturas': 2,
+        })
+        self.assertEqual(ResumenDiarioProducto.objects.get(producto=self.productos[0]).numero_facturas, 2)
+
+        self.client.post(f'/api/facturas/{factura.pk}/anular/')
+        self.assertEqual(self._resumen_usuario(), {
+            'ingresos': Decimal('30.00'), 'costo': Decimal('12.00'), 'cantidad': 3, 'numero_facturas': 1,
+        })
+        respuesta = self.client.get('/api/reportes/ganancias-por-fecha/')
+        self.assertEqual(respuesta.data['ganancia_bruta_total'], 30.0)
+        self.assertEqual(respuesta.data['numero_facturas'], 1)
+
+    def test_eliminar_detalle_resta_y_coincide_con_reconstruir(self):
+        factura = self._registrar(2, 1)
+        detalle = factura.detalle_ventas.get(producto=self.productos[1])
+        self.client.delete(f'/api/detalles_venta/{detalle.pk}/')
+
+        factura.refresh_from_db()
+        self.assertEqual(factura.total, Decimal('20.00'))
+        incremental = self._resumen_usuario()
+        productos = list(ResumenDiarioProducto.objects.order_by('producto_id').values_list('producto_id', 'cantidad', 'numero_facturas'))
+        reconstruir()
+        self.assertEqual(self._resumen_usuario(), incremental)
+        self.assertEqual(
+            list(ResumenDiarioProducto.objects.filter(cantidad__gt=0).order_by('producto_id').values_list('producto_id', 'cantidad', 'numero_facturas')),
+            [fila for fila in productos if fila[1] > 0],
+        )
+
+    def _resumen_productos(self):
+        return list(ResumenDiarioProducto.objects.filter(numero_facturas__gt=0).order_by('producto_id').values_list(
+            'producto_id', 'ingresos', 'costo', 'cantidad', 'numero_facturas'
+        ))
+
+    def test_agregar_y_editar_detalles_actualizan_los_resumenes(self):
+        factura = self._registrar(2)
+        # Alta de una línea fuera de registrar_factura (admin, formularios)
+        DetalleVenta(factura=factura, producto=self.productos[1], cantidad=1, precio_unitario=Decimal('10.00')).save()
+        detalle = factura.detalle_ventas.get(producto=self.productos[0])
+        respuesta = self.client.patch(f'/api/detalles_venta/{detalle.pk}/', {'cantidad': 5}, content_type='application/json')
+        self.assertEqual(respuesta.status_code, 200)
+
+        self.assertEqual(self._resumen_usuario(), {
+            'ingresos': Decimal('60.00'), 'costo': Decimal('24.00'), 'cantidad': 6, 'numero_facturas': 1,
+        })
+        self.assertEqual(Producto.objects.get(pk=self.productos[0].pk).stock, 95)
+        incremental = (self._resumen_usuario(), self._resumen_productos())
+        reconstruir()
+        self.assertEqual((self._resumen_usuario(), self._resumen_productos()), incremental)
+
+        # Cambiar el producto de la línea la mueve de fila en el resumen por producto
+        self.client.patch(f'/api/detalles_venta/{detalle.pk}/', {'producto': self.productos[1].pk}, content_type='application/json')
+        self.assertEqual(self._resumen_productos(), [
+            (self.productos[1].pk, Decimal('60.00'), Decimal('24.00'), 6, 1),
+        ])
+
+    def test_anular_despues_de_cambiar_el_costo_deja_los_resumenes_en_cero(self):
+        factura = self._registrar(2, 1)
+        Producto.objects.update(precio_costo=Decimal('9.00'))
+        self.client.post(f'/api/facturas/{factura.pk}/anular/')
+        self.assertEqual(self._resumen_usuario(), {
+            'ingresos': Decimal('0.00'), 'costo': Decimal('0.00'), 'cantidad': 0, 'numero_facturas': 0,
+        })
+        self.assertEqual(self._resumen_productos(), [])
+        self.assertFalse(ResumenDiarioProducto.objects.exclude(costo=0).exists())
+
+    def test_ingresos_detallados_usan_el_costo_de_la_venta(self):
+        self._registrar(2, 1)
+        Producto.objects.update(precio_costo=Decimal('9.00'))
+        filas = self.client.get('/api/reportes/ingresos-detallados/').json()
+        self.assertEqual({Decimal(str(fila['costo_unitario_producto'])) for fila in filas}, {Decimal('4.00')})
+        self.assertEqual(sum(Decimal(str(fila['costo_por_item'])) for fila in filas), self._resumen_usuario()['costo'])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), FACTURAS_PDF_CACHE_DIR=tempfile.mkdtemp())
+class EnvioFacturaTest(TestCase):
+    def setUp(self):
+        cliente = Cliente.objects.create(nombre='Cliente', email='cliente@keeplic.com')
+        usuario = Usuario.objects.create_user('cajero', 'cajero@keeplic.com', 'clave')
+        self.factura = Factura.objects.create(cliente=cliente, forma_pago=FormaPago.objects.create(metodo='Efectivo'), usuario=usuario)
+
+    def test_send_pdf_email_encola_y_el_worker_envia(self):
+        respuesta = self.client.post(f'/api/facturas/{self.factura.pk}/send_pdf_email/')
+        self.assertEqual(respuesta.status_code, 202)
+        self.assertEqual(respuesta.data['envio']['estado'], 'Pendiente')
+        self.assertEqual(len(mail.outbox), 0)
+        # Un segundo clic no duplica el envío
+        self.client.post(f'/api/facturas/{self.factura.pk}/send_pdf_email/')
+        self.assertEqual(EnvioFactura.objects.count(), 1)
+
+        self.assertEqual(procesar_pendientes(), (1, 1))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['cliente@keeplic.com'])
+        self.assertEqual(mail.outbox[0].attachments[0][2], 'application/pdf')
+
+        estado = self.client.get(f'/api/facturas/{self.factura.pk}/envios/')
+        self.assertEqual(estado.data[0]['estado'], 'Enviado')
+
+    @override_settings(FACTURAS_EMAILS_POR_SEGUNDO=0)
+    def test_envio_masivo_usa_una_conexion_y_aisla_errores(self):
+        facturas = [self.factura] + [
+            Factura.objects.create(
+                cliente=Cliente.objects.create(nombre=f'Cliente {i}', email=f'cliente{i}@keeplic.com'),
+                forma_pago=self.factura.forma_pago, usuario=self.factura.usuario,
+            )
+            for i in range(2)
+        ]
+        sin_email = Factura.objects.create(cliente=Cliente.objects.create(nombre='Sin email', email=''),
+                                           forma_pago=self.factura.forma_pago, usuario=self.factura.usuario)
+        ids = [f.pk for f in facturas] + [sin_email.pk, 999999]
+        respuesta = self.client.post('/api/facturas/send_pdf_email_bulk/', {'facturas': ids}, content_type='application/json')
+        self.assertEqual(respuesta.status_code, 202)
+        self.assertEqual(respuesta.data['encoladas'], 3)
+        self.assertEqual({o['factura'] for o in respuesta.data['omitidas']}, {sin_email.pk, 999999})
+
+        enviar = locmem.EmailBackend.send_messages
+        def falla_el_segundo(backend, mensajes):
+            if len(mail.outbox) == 1 and not getattr(backend, 'ya_fallo', False):
+                backend.ya_fallo = True
+                raise smtplib.SMTPRecipientsRefused({})
+            return enviar(backend, mensajes)
+
+        with mock.patch('sales.envios.get_connection', wraps=get_connection) as conexion, \
+                mock.patch.object(locmem.EmailBackend, 'send_messages', falla_el_segundo):
+            self.assertEqual(procesar_pendientes(), (3, 2))
+        self.assertEqual(conexion.call_count, 1)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(EnvioFactura.objects.filter(estado='Pendiente').count(), 1) # Se reintentará
+
+    def test_reintenta_con_espera_y_se_rinde_al_agotar_intentos(self):
+        envio = EnvioFactura.objects.create(factura=self.factura, destinatario='cliente@keeplic.com', max_intentos=2)
+        with mock.patch.object(locmem.EmailBackend, 'send_messages', side_effect=smtplib.SMTPException('SMTP caído')):
+            self.assertEqual(procesar_pendientes(), (1, 0))
+            envio.refresh_from_db()
+            self.assertEqual((envio.estado, envio.intentos), ('Pendiente', 1))
+            self.assertIn('SMTP caído', envio.ultimo_error)
+            self.assertGreater(envio.proximo_intento, timezone.now())
+            self.assertEqual(procesar_pendientes(), (0, 0)) # Aún no toca reintentar
+
+            EnvioFactura.objects.filter(pk=envio.pk).update(proximo_intento=timezone.now())
+            procesar_pendientes()
+        envio.refresh_from_db()
+        self.assertEqual((envio.estado, envio.intentos), ('Fallido', 2))
+
+    def test_pdf_en_memoria_reutiliza_la_plantilla_entre_facturas_largas(self):
+        producto = Producto.objects.create(nombre='Producto', proveedor=Proveedor.objects.create(nombre='Proveedor'))
+        DetalleVenta.objects.bulk_create([
+            DetalleVenta(factura=self.factura, producto=producto, cantidad=1, precio_unitario=Decimal('1.00'), subtotal=Decimal('1.00'))
+            for _ in range(60) # Más de una página
+        ])
+        for _ in range(3):
+            pdf, error = generate_invoice_pdf(self.factura.pk)
+            self.assertIsNone(error)
+            self.assertTrue(pdf.startswith(b'%PDF'))
+
+
+class CachePdfFacturaTest(TestCase):
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        ajustes = override_settings(FACTURAS_PDF_CACHE_DIR=self.directorio)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        cache_pdf.limpiar()
+        self.addCleanup(cache_pdf.limpiar)
+        cliente = Cliente.objects.create(nombre='Cliente', email='cliente@keeplic.com')
+        usuario = Usuario.objects.create_user('cajero', 'cajero@keeplic.com', 'clave')
+        self.factura = Factura.objects.create(cliente=cliente, forma_pago=FormaPago.objects.create(metodo='Efectivo'), usuario=usuario)
+        self.url = f'/api/facturas/{self.factura.pk}/pdf/'
+
+    def _archivos(self):
+        return sorted(os.listdir(os.path.join(self.directorio, str(self.factura.pk))))
+
+    def test_pdf_se_cachea_y_responde_304_con_el_mismo_etag(self):
+        with mock.patch('sales.utils.render_invoice_pdf', wraps=utils.render_invoice_pdf) as renderizar:
+            primera = self.client.get(self.url)
+            segunda = self.client.get(self.url, HTTP_ACCEPT='application/pdf')
+        self.assertEqual(renderizar.call_count, 1)
+        self.assertEqual(primera['Content-Type'], 'application/pdf')
+        self.assertEqual(primera.content, segunda.content)
+        self.assertEqual(primera['ETag'], segunda['ETag'])
+
+        no_modificado = self.client.get(self.url, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(no_modificado.status_code, 304)
+        self.assertEqual(no_modificado.content, b'')
+
+    def test_completar_invalida_y_cambia_el_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(len(self._archivos()), 1)
+
+        self.client.post(f'/api/facturas/{self.factura.pk}/completar/')
+        self.assertEqual(self._archivos(), [])
+        nueva = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(nueva.status_code, 200)
+        self.assertNotEqual(nueva['ETag'], etag)
+
+    def test_recortar_saca_los_menos_usados(self):
+        for factura_id, segundos in ((1, 100), (2, 200), (3, 300)):
+            cache_pdf.guardar(factura_id, 'abc', b'x' * 10)
+            ruta = os.path.join(self.directorio, str(factura_id), 'abc.pdf')
+            os.utime(ruta, (segundos, segundos))
+        cache_pdf.leer(1, 'abc') # Usado recién: pasa a ser el más nuevo
+        cache_pdf.recortar(max_bytes=20)
+        self.assertIsNotNone(cache_pdf.leer(1, 'abc'))
+        self.assertIsNone(cache_pdf.leer(2, 'abc'))
+        self.assertIsNotNone(cache_pdf.leer(3, 'abc'))
+
+    @override_settings(FACTURAS_PDF_CACHE_MAX_BYTES=25, FACTURAS_PDF_CACHE_REVISAR_SEGUNDOS=3600)
+    def test_guardar_solo_recorre_la_cache_al_pasar_el_maximo(self):
+        with mock.patch('sales.cache_pdf.os.walk', wraps=os.walk) as recorrido:
+            cache_pdf.guardar(1, 'abc', b'x' * 10) # Primer guardado del proceso: la mide
+            cache_pdf.guardar(2, 'abc', b'x' * 10)
+            cache_pdf.guardar(2, 'def', b'x' * 10) # Reemplaza la versión anterior: no crece
+            self.assertEqual(recorrido.call_count, 1)
+            cache_pdf.guardar(3, 'abc', b'x' * 10) # 30 > 25: recorta hasta el 90 %
+            self.assertEqual(recorrido.call_count, 2)
+        self.assertIsNone(cache_pdf.leer(1, 'abc'))
+        self.assertIsNotNone(cache_pdf.leer(2, 'def'))
+        self.assertIsNotNone(cache_pdf.leer(3, 'abc'))
+
+
+class LotesPdfTest(TestCase):
+    def setUp(self):
+        cliente = Cliente.objects.create(nombre='Cliente', email='cliente@keeplic.com')
+        forma_pago = FormaPago.objects.create(metodo='Efectivo')
+        usuario = Usuario.objects.create_user('cajero', 'cajero@keeplic.com', 'clave')
+        producto = Producto.objects.create(nombre='Producto', proveedor=Proveedor.objects.create(nombre='Proveedor'))
+        for _ in range(5):
+            factura = Factura.objects.create(cliente=cliente, forma_pago=forma_pago, usuario=usuario)
+            DetalleVenta.objects.bulk_create([
+                DetalleVenta(factura=factura, producto=producto, cantidad=2, precio_unitario=Decimal('3.00'), subtotal=Decimal('6.00'))
+                for _ in range(3)
+            ])
+
+    def test_datos_se_leen_con_consultas_constantes(self):
+        with self.assertNumQueries(3): # ids, facturas del lote y sus detalles
+            datos = list(datos_facturas(Factura.objects.all()))
+        self.assertEqual(len(datos), 5)
+        self.assertEqual(datos[0]['items'][0][2:], ['2', '$3.00', '$6.00'])
+
+    def test_zip_en_paralelo_con_un_pdf_por_factura(self):
+        contenido = b''.join(zip_facturas(Factura.objects.all(), procesos=2))
+        with zipfile.ZipFile(io.BytesIO(contenido)) as archivo_zip:
+            nombres = archivo_zip.namelist()
+            self.assertEqual(nombres, [f'factura_{f.id_factura}.pdf' for f in Factura.objects.order_by('fecha', 'id')])
+            self.assertTrue(all(archivo_zip.read(nombre).startswith(b'%PDF') for nombre in nombres))
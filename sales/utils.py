@@ -4,14 +4,22 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, Tabl
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib import colors
+from reportlab.lib.enums import TA_RIGHT
 from django.core.mail import EmailMessage
 from django.conf import settings
+import copy
+import functools
+import hashlib
+import io
+import json
 import os
+import threading
 from decimal import Decimal
 
 # Importar modelos de las aplicaciones correspondientes
 from sales.models import Factura, DetalleVenta
 from products.models import Producto
+from sales import cache_pdf
 
 # --- CONFIGURACIÓN DE LA EMPRESA (AJUSTA ESTO A TUS DATOS) ---
 COMPANY_NAME = "Keeplic Prueba Online"
@@ -25,27 +33,17 @@ COMPANY_POLICY = "El comprador ha de examinar inmediatamente el producto para co
 COMPANY_LOGO_PATH = os.path.join(settings.MEDIA_ROOT, 'logo', 'logo.png')
 
 
-def generate_invoice_pdf(invoice_id):
-    """
-    Genera un PDF de la factura con un diseño profesional, incluyendo logo,
-    colores corporativos y políticas de garantía.
-    Retorna la ruta del PDF generado o None y un mensaje de error.
-    """
-    try:
-        invoice = Factura.objects.select_related('cliente', 'forma_pago', 'usuario').get(id=invoice_id)
-    except Factura.DoesNotExist:
-        return None, "Factura no encontrada para generar PDF."
+# --- PLANTILLA DE LA FACTURA (se arma una vez por proceso) ---
+# Los estilos, el logo y los bloques fijos (encabezado, título, políticas y pie) no dependen
+# de la factura: se construyen la primera vez y se reutilizan en cada PDF. Los flowables
+# guardan estado mientras se dibujan (p. ej. si pasaron a otra página), así que cada PDF
+# usa copias superficiales de los bloques, y estos se cachean por hilo.
+_plantilla_local = threading.local()
 
-    pdf_dir = os.path.join(settings.MEDIA_ROOT, 'invoices_temp')
-    os.makedirs(pdf_dir, exist_ok=True)
-    pdf_filename = f"factura_{invoice.id_factura}.pdf"
-    pdf_path = os.path.join(pdf_dir, pdf_filename)
 
-    doc = SimpleDocTemplate(pdf_path, pagesize=letter,
-                            rightMargin=50, leftMargin=50,
-                            topMargin=50, bottomMargin=50)
+@functools.lru_cache(maxsize=None)
+def _estilos():
     styles = getSampleStyleSheet()
-    story = []
 
     # --- Definir Estilos Personalizados con Colores Corporativos ---
     styles.add(ParagraphStyle(name='InvoiceTitle', parent=styles['h1'],
@@ -70,27 +68,56 @@ def generate_invoice_pdf(invoice_id):
                               spaceBefore=10, spaceAfter=10,
                               textColor=colors.HexColor('#000000')))
 
-    # NUEVO ESTILO: Para el total alineado a la derecha
-    from reportlab.lib.enums import TA_RIGHT
+    # Para el total alineado a la derecha
     styles.add(ParagraphStyle(name='TotalAmountStyle', parent=styles['h2'],
                               alignment=TA_RIGHT, # Alineación a la derecha
                               textColor=colors.HexColor('#00b45c'), # Verde corporativo
                               fontName='Helvetica-Bold'))
+    return styles
 
 
-    # --- Encabezado de la Empresa (Logo a la izquierda, Info a la derecha) ---
-    header_data = []
+@functools.lru_cache(maxsize=None)
+def _logo_bytes():
+    """
+    Contenido del logo leído una sola vez (None si no existe o no se puede leer).
+    """
+    if not os.path.exists(COMPANY_LOGO_PATH):
+        print(f"Advertencia: El archivo de logo no se encontró en {COMPANY_LOGO_PATH}. Usando nombre de empresa como fallback.")
+        return None
+    try:
+        with open(COMPANY_LOGO_PATH, 'rb') as logo_file:
+            return logo_file.read()
+    except OSError as e:
+        print(f"Error al cargar la imagen del logo desde {COMPANY_LOGO_PATH}: {e}")
+        return None
+
 
+def _plantilla():
+    """
+    Copias de los bloques fijos de la factura, construidos una vez por hilo.
+    """
+    plantilla = getattr(_plantilla_local, 'bloques', None)
+    if plantilla is None:
+        plantilla = _plantilla_local.bloques = _construir_plantilla(_estilos())
+    return {
+        nombre: [copy.copy(f) for f in bloque] if isinstance(bloque, list) else copy.copy(bloque)
+        for nombre, bloque in plantilla.items()
+    }
+
+
+def _construir_plantilla(styles):
+    # --- Encabezado de la Empresa (Logo a la izquierda, Info a la derecha) ---
     logo_cell = []
-    if os.path.exists(COMPANY_LOGO_PATH):
+    logo_data = _logo_bytes()
+    logo = None
+    if logo_data:
         try:
-            logo = Image(COMPANY_LOGO_PATH, width=150, height=50)
-            logo_cell.append(logo)
+            logo = Image(io.BytesIO(logo_data), width=150, height=50)
         except Exception as e:
             print(f"Error al cargar la imagen del logo desde {COMPANY_LOGO_PATH}: {e}")
-            logo_cell.append(Paragraph(f"<font size=18 color='#00b45c'><b>{COMPANY_NAME}</b></font>", styles['Normal']))
+    if logo is not None:
+        logo_cell.append(logo)
     else:
-        print(f"Advertencia: El archivo de logo no se encontró en {COMPANY_LOGO_PATH}. Usando nombre de empresa como fallback.")
         logo_cell.append(Paragraph(f"<font size=18 color='#00b45c'><b>{COMPANY_NAME}</b></font>", styles['Normal']))
 
     company_info_cell = [
@@ -101,137 +128,233 @@ def generate_invoice_pdf(invoice_id):
         Paragraph(f"Web: {COMPANY_WEBSITE}", styles['BodyTextCustom']),
     ]
 
-    header_data.append([logo_cell, company_info_cell])
-
-    header_table = Table(header_data, colWidths=[2.5*inch, 3.5*inch])
+    header_table = Table([[logo_cell, company_info_cell]], colWidths=[2.5*inch, 3.5*inch])
     header_table.setStyle(TableStyle([
         ('ALIGN', (0,0), (0,-1), 'LEFT'),
         ('ALIGN', (1,0), (1,-1), 'RIGHT'),
         ('VALIGN', (0,0), (-1,-1), 'TOP'),
         ('BOTTOMPADDING', (0,0), (-1,0), 10),
     ]))
-    story.append(header_table)
-    story.append(Spacer(1, 0.2 * inch))
 
-    # --- Línea Separadora ---
-    story.append(Paragraph("<hr/>", styles['Normal']))
-    story.append(Spacer(1, 0.1 * inch))
+    encabezado = [
+        header_table,
+        Spacer(1, 0.2 * inch),
+        # --- Línea Separadora ---
+        Paragraph("<hr/>", styles['Normal']),
+        Spacer(1, 0.1 * inch),
+        # --- Título de la Factura ---
+        Paragraph(f"<b>FACTURA DE VENTA</b>", styles['InvoiceTitle']),
+        Spacer(1, 0.2 * inch),
+    ]
 
-    # --- Título de la Factura ---
-    story.append(Paragraph(f"<b>FACTURA DE VENTA</b>", styles['InvoiceTitle']))
-    story.append(Spacer(1, 0.2 * inch))
+    pie = [
+        # --- Políticas de Garantía ---
+        Paragraph("<b>POLÍTICAS DE GARANTÍA Y DEVOLUCIÓN:</b>", styles['SectionHeader']),
+        Paragraph(COMPANY_POLICY, styles['PolicyText']),
+        Spacer(1, 0.4 * inch),
+        # --- Pie de Página ---
+        Paragraph("¡Gracias por tu compra!", styles['FooterText']),
+        Paragraph(f"{COMPANY_NAME} | {COMPANY_PHONE} | {COMPANY_EMAIL}", styles['FooterText']),
+        Paragraph("Este es un documento generado automáticamente y es válido sin firma.", styles['FooterText']),
+    ]
+
+    return {
+        'encabezado': encabezado,
+        'pie': pie,
+        'productos_titulo': Paragraph("<b>Productos Adquiridos:</b>", styles['SectionHeader']),
+        'venta_titulo': Paragraph("<b>Detalles de la Venta:</b>", styles['SectionHeader']),
+        'cliente_titulo': Paragraph("<b>Detalles del Cliente:</b>", styles['SectionHeader']),
+    }
+
+
+ITEMS_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#00b45c')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#ffffff')),
+    ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#000000')),
+    ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#000000')),
+    ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+    ('LEFTPADDING', (0,0), (-1,-1), 6),
+    ('RIGHTPADDING', (0,0), (-1,-1), 6),
+])
+
+TOTAL_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0,0), (-1,-1), 'RIGHT'),
+    ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+    ('TOPPADDING', (0,0), (-1,-1), 10),
+    ('BOTTOMPADDING', (0,0), (-1,-1), 10),
+    ('LINEBELOW', (0,0), (-1,-1), 1, colors.HexColor('#000000')),
+])
+
+INFO_TABLE_STYLE = TableStyle([
+    ('VALIGN', (0,0), (-1,-1), 'TOP'),
+    ('BOTTOMPADDING', (0,0), (-1,0), 10),
+])
+
+
+def invoice_pdf_filename(invoice):
+    return pdf_filename(invoice.id_factura)
+
+
+def pdf_filename(id_factura):
+    return f"factura_{id_factura}.pdf"
+
+
+def invoice_pdf_data(invoice, items):
+    """
+    Todo lo que se imprime en el PDF de la factura, como un dict de textos ya formateados
+    (sin objetos del ORM): se puede pasar a otro proceso y sirve para calcular la huella.
+    'invoice' debe traer cliente, forma_pago y usuario cargados; 'items' son sus DetalleVenta con el producto.
+    """
+    return {
+        'id': invoice.pk,
+        'id_factura': invoice.id_factura,
+        'fecha': invoice.fecha.strftime('%d/%m/%Y %H:%M:%S'),
+        'estado': invoice.estado,
+        'total': f"${invoice.total:,.2f}",
+        'cliente_nombre': invoice.cliente.nombre if invoice.cliente else 'N/A',
+        'cliente_telefono': invoice.cliente.telefono if invoice.cliente else 'N/A',
+        'cliente_email': invoice.cliente.email if invoice.cliente else 'N/A',
+        'forma_pago': invoice.forma_pago.metodo if invoice.forma_pago else 'N/A',
+        'usuario': invoice.usuario.username if invoice.usuario else 'N/A',
+        'items': [
+            [
+                item.producto.referencia_producto if item.producto else 'N/A',
+                item.producto.nombre if item.producto else 'Producto Eliminado',
+                str(item.cantidad),
+                f"${item.precio_unitario:,.2f}",
+                f"${item.subtotal:,.2f}",
+            ]
+            for item in items
+        ],
+    }
+
+
+def render_invoice_pdf(invoice, items=None):
+    """
+    Renderiza el PDF de la factura en memoria y devuelve sus bytes.
+    'invoice' debe traer cliente, forma_pago y usuario cargados; 'items' son sus
+    DetalleVenta con el producto (si no se pasan se consultan en una sola query).
+    """
+    if items is None:
+        items = get_invoice_items(invoice)
+    return render_invoice_pdf_data(invoice_pdf_data(invoice, items))
+
+
+def render_invoice_pdf_data(data):
+    """
+    Renderiza el PDF a partir de invoice_pdf_data(). No consulta la base de datos.
+    """
+    styles = _estilos()
+    plantilla = _plantilla()
+    story = plantilla['encabezado']
 
     # --- Información de la Factura y Cliente (en dos columnas) ---
-    invoice_client_data = []
     invoice_info = [
-        Paragraph(f"<b>No. Factura:</b> {invoice.id_factura}", styles['BodyTextCustom']),
-        Paragraph(f"<b>Fecha de Emisión:</b> {invoice.fecha.strftime('%d/%m/%Y %H:%M:%S')}", styles['BodyTextCustom']),
-        Paragraph(f"<b>Estado:</b> {invoice.estado}", styles['BodyTextCustom']),
+        Paragraph(f"<b>No. Factura:</b> {data['id_factura']}", styles['BodyTextCustom']),
+        Paragraph(f"<b>Fecha de Emisión:</b> {data['fecha']}", styles['BodyTextCustom']),
+        Paragraph(f"<b>Estado:</b> {data['estado']}", styles['BodyTextCustom']),
     ]
     client_info = [
-        Paragraph("<b>Detalles del Cliente:</b>", styles['SectionHeader']),
-        Paragraph(f"<b>Nombre:</b> {invoice.cliente.nombre if invoice.cliente else 'N/A'}", styles['BodyTextCustom']),
-        Paragraph(f"<b>Teléfono:</b> {invoice.cliente.telefono if invoice.cliente else 'N/A'}", styles['BodyTextCustom']),
-        Paragraph(f"<b>Email:</b> {invoice.cliente.email if invoice.cliente else 'N/A'}", styles['BodyTextCustom']),
+        plantilla['cliente_titulo'],
+        Paragraph(f"<b>Nombre:</b> {data['cliente_nombre']}", styles['BodyTextCustom']),
+        Paragraph(f"<b>Teléfono:</b> {data['cliente_telefono']}", styles['BodyTextCustom']),
+        Paragraph(f"<b>Email:</b> {data['cliente_email']}", styles['BodyTextCustom']),
     ]
-    invoice_client_data.append([invoice_info, client_info])
-
-    invoice_client_table = Table(invoice_client_data, colWidths=[3*inch, 3*inch])
-    invoice_client_table.setStyle(TableStyle([
-        ('VALIGN', (0,0), (-1,-1), 'TOP'),
-        ('BOTTOMPADDING', (0,0), (-1,0), 10),
-    ]))
+    invoice_client_table = Table([[invoice_info, client_info]], colWidths=[3*inch, 3*inch])
+    invoice_client_table.setStyle(INFO_TABLE_STYLE)
     story.append(invoice_client_table)
     story.append(Spacer(1, 0.2 * inch))
 
     # --- Detalles de la Venta (Forma de Pago, Atendido por) ---
-    story.append(Paragraph("<b>Detalles de la Venta:</b>", styles['SectionHeader']))
-    story.append(Paragraph(f"<b>Forma de Pago:</b> {invoice.forma_pago.metodo if invoice.forma_pago else 'N/A'}", styles['BodyTextCustom']))
-    story.append(Paragraph(f"<b>Atendido por:</b> {invoice.usuario.username if invoice.usuario else 'N/A'}", styles['BodyTextCustom']))
+    story.append(plantilla['venta_titulo'])
+    story.append(Paragraph(f"<b>Forma de Pago:</b> {data['forma_pago']}", styles['BodyTextCustom']))
+    story.append(Paragraph(f"<b>Atendido por:</b> {data['usuario']}", styles['BodyTextCustom']))
     story.append(Spacer(1, 0.2 * inch))
 
     # --- Tabla de Ítems ---
-    story.append(Paragraph("<b>Productos Adquiridos:</b>", styles['SectionHeader']))
-
-    data = [['Referencia', 'Producto', 'Cantidad', 'Precio Unitario', 'Subtotal']]
-    
-    for item in invoice.detalle_ventas.all():
-        product_ref = item.producto.referencia_producto if item.producto else 'N/A'
-        product_name = item.producto.nombre if item.producto else 'Producto Eliminado'
-        data.append([
-            product_ref,
-            product_name,
-            str(item.cantidad),
-            f"${item.precio_unitario:,.2f}",
-            f"${item.subtotal:,.2f}"
-        ])
-
-    table_style = TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#00b45c')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#ffffff')),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#000000')),
-        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#000000')),
-        ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-        ('LEFTPADDING', (0,0), (-1,-1), 6),
-        ('RIGHTPADDING', (0,0), (-1,-1), 6),
-    ])
-
-    table = Table(data, colWidths=[1.2*inch, 2.5*inch, 0.8*inch, 1.2*inch, 1.2*inch])
-    table.setStyle(table_style)
+    story.append(plantilla['productos_titulo'])
+
+    table_data = [['Referencia', 'Producto', 'Cantidad', 'Precio Unitario', 'Subtotal']] + data['items']
+    table = Table(table_data, colWidths=[1.2*inch, 2.5*inch, 0.8*inch, 1.2*inch, 1.2*inch])
+    table.setStyle(ITEMS_TABLE_STYLE)
     story.append(table)
     story.append(Spacer(1, 0.2 * inch))
 
     # --- Resumen de Totales ---
-    # Usar el nuevo estilo TotalAmountStyle para el párrafo del total
     total_data = [
-        [Paragraph(f"<b>Total Factura:</b> <font color='#00b45c'><b>${invoice.total:,.2f}</b></font>", styles['TotalAmountStyle'])]
+        [Paragraph(f"<b>Total Factura:</b> <font color='#00b45c'><b>{data['total']}</b></font>", styles['TotalAmountStyle'])]
     ]
     total_table = Table(total_data, colWidths=[6*inch])
-    total_table.setStyle(TableStyle([
-        ('ALIGN', (0,0), (-1,-1), 'RIGHT'),
-        ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-        ('TOPPADDING', (0,0), (-1,-1), 10),
-        ('BOTTOMPADDING', (0,0), (-1,-1), 10),
-        ('LINEBELOW', (0,0), (-1,-1), 1, colors.HexColor('#000000')),
-    ]))
+    total_table.setStyle(TOTAL_TABLE_STYLE)
     story.append(total_table)
     story.append(Spacer(1, 0.4 * inch))
 
-    # --- Políticas de Garantía ---
-    story.append(Paragraph("<b>POLÍTICAS DE GARANTÍA Y DEVOLUCIÓN:</b>", styles['SectionHeader']))
-    story.append(Paragraph(COMPANY_POLICY, styles['PolicyText']))
-    story.append(Spacer(1, 0.4 * inch))
+    story.extend(plantilla['pie'])
 
-    # --- Pie de Página ---
-    story.append(Paragraph("¡Gracias por tu compra!", styles['FooterText']))
-    story.append(Paragraph(f"{COMPANY_NAME} | {COMPANY_PHONE} | {COMPANY_EMAIL}", styles['FooterText']))
-    story.append(Paragraph("Este es un documento generado automáticamente y es válido sin firma.", styles['FooterText']))
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter,
+                            rightMargin=50, leftMargin=50,
+                            topMargin=50, bottomMargin=50)
+    doc.build(story)
+    return buffer.getvalue()
 
 
-    try:
-        doc.build(story)
-        return pdf_path, None
-    except Exception as e:
-        return None, f"Error al construir el PDF: {e}"
+def invoice_pdf_fingerprint(invoice, items):
+    """
+    Huella (sha256) de todo lo que se imprime en el PDF de la factura. Sirve de clave en
+    la caché de PDFs y de ETag: si cambia una línea, el total o el estado, cambia la huella.
+    """
+    return invoice_pdf_data_fingerprint(invoice_pdf_data(invoice, items))
+
 
-def send_invoice_email(invoice_id, recipient_email, pdf_path):
+def invoice_pdf_data_fingerprint(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def get_invoice_items(invoice):
+    return list(invoice.detalle_ventas.select_related('producto').order_by('id'))
+
+
+def get_invoice_pdf(invoice, items=None):
     """
-    Envía el PDF de la factura por email al destinatario especificado.
-    Retorna True si el envío fue exitoso, False y un mensaje de error si falló.
+    Devuelve (bytes del PDF, huella): de la caché si está al día, si no lo renderiza y lo guarda.
+    'invoice' debe traer cliente, forma_pago y usuario cargados.
     """
-    if not recipient_email:
-        return False, "No se proporcionó un email de destinatario."
+    if items is None:
+        items = get_invoice_items(invoice)
+    huella = invoice_pdf_fingerprint(invoice, items)
+    contenido = cache_pdf.leer(invoice.pk, huella)
+    if contenido is None:
+        contenido = render_invoice_pdf(invoice, items)
+        cache_pdf.guardar(invoice.pk, huella, contenido)
+    return contenido, huella
+
 
+def generate_invoice_pdf(invoice_id):
+    """
+    Genera el PDF de la factura con un diseño profesional, incluyendo logo,
+    colores corporativos y políticas de garantía (o lo toma de la caché de PDFs).
+    Retorna los bytes del PDF (sin pasar por disco) o None y un mensaje de error.
+    """
     try:
-        invoice = Factura.objects.get(id=invoice_id)
+        invoice = Factura.objects.select_related('cliente', 'forma_pago', 'usuario').get(id=invoice_id)
     except Factura.DoesNotExist:
-        return False, "Factura no encontrada para enviar email."
+        return None, "Factura no encontrada para generar PDF."
+
+    try:
+        return get_invoice_pdf(invoice)[0], None
+    except Exception as e:
+        return None, f"Error al construir el PDF: {e}"
 
+def build_invoice_email(invoice, recipient_email, pdf_content, connection=None):
+    """
+    Arma (sin enviar) el EmailMessage con el PDF de la factura adjunto.
+    """
     subject = f"Tu Factura de Compra - No. {invoice.id_factura} de {COMPANY_NAME}"
     email_body = f"""
 Hola {invoice.cliente.nombre if invoice.cliente else 'Cliente'},
@@ -255,11 +378,31 @@ El equipo de {COMPANY_NAME}
         email_body,
         settings.DEFAULT_FROM_EMAIL,
         [recipient_email],
+        connection=connection,
     )
-    if pdf_path and os.path.exists(pdf_path):
-        email.attach_file(pdf_path)
-    else:
+    email.attach(invoice_pdf_filename(invoice), pdf_content, 'application/pdf')
+    return email
+
+
+def send_invoice_email(invoice, recipient_email, pdf_content):
+    """
+    Envía el PDF de la factura (bytes) por email al destinatario especificado.
+    'invoice' es la Factura (o su id, y entonces se consulta).
+    Retorna True si el envío fue exitoso, False y un mensaje de error si falló.
+    Para muchas facturas usar sales.envios.enviar_lote, que reutiliza la conexión SMTP.
+    """
+    if not recipient_email:
+        return False, "No se proporcionó un email de destinatario."
+
+    if not isinstance(invoice, Factura):
+        try:
+            invoice = Factura.objects.select_related('cliente').get(id=invoice)
+        except Factura.DoesNotExist:
+            return False, "Factura no encontrada para enviar email."
+
+    if not pdf_content:
         return False, "PDF de factura no encontrado para adjuntar."
+    email = build_invoice_email(invoice, recipient_email, pdf_content)
 
     try:
         email.send()
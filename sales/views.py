@@ -3,45 +3,84 @@ from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django.db import transaction
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 from rest_framework.views import APIView
-from django.db.models import F, Sum, Count, ExpressionWrapper, fields
+from django.db.models import F, Sum, ExpressionWrapper, fields
 from django.db.models.functions import Coalesce
 from rest_framework.filters import SearchFilter
 from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.settings import api_settings
 # Importa tus modelos
 from .models import Cliente, Factura, DetalleVenta, FormaPago
-from products.models import Producto
+from .models import ResumenDiarioCliente, ResumenDiarioProducto, ResumenDiarioUsuario
+from products.models import MovimientoStock, Producto
 from users.models import Usuario
 
 # Importa tus serializadores
-from .serializers import ClienteSerializer, FacturaSerializer, DetalleVentaSerializer
+from .serializers import ClienteSerializer, FacturaSerializer, DetalleVentaSerializer, EnvioFacturaSerializer
 # Asegúrate de que estos imports sean correctos según la ubicación de tus serializadores
 from uglobals.serializers import FormaPagoSerializer
 from users.serializers import UsuarioSerializer
+from uglobals.campos import CamposDinamicosViewMixin
+from uglobals.condicional import GetCondicionalMixin
+from uglobals.models import Categoria, Marca, Proveedor
+from users.models import Permiso, Rol
+from uglobals.paginacion import PaginacionKeyset, PaginacionOpcional
+from uglobals.exportacion import (
+    CSVRenderer, NDJSONRenderer, PDFRenderer, FORMATOS_STREAMING, iterar_en_lotes, respuesta_streaming,
+)
 
-# Importa datetime y time para manejar fechas
-from datetime import datetime, time
 from django.shortcuts import get_object_or_404 # Para obtener objetos o lanzar 404
-import os # Para manejar archivos temporales
-
-# Importar las funciones de utilidad que crearemos en sales/utils.py
-from .utils import generate_invoice_pdf, send_invoice_email
-
-
-class ClienteViewSet(viewsets.ModelViewSet):
+from django.http import HttpResponse
+from django.utils.http import parse_etags
+
+# Cola de envíos de facturas por email (el PDF se genera en el worker, ver sales/envios.py)
+from .envios import encolar_envio, encolar_envios
+# PDF de la factura con caché en disco
+from .utils import get_invoice_items, get_invoice_pdf, invoice_pdf_filename, invoice_pdf_fingerprint
+# Rango de fechas compartido por todos los reportes (filtros sobre la columna, usan índice)
+from .reportes import leer_rango_fechas, filtrar_rango_fechas, leer_dias, filtrar_dias
+# Resúmenes diarios que alimentan los reportes agregados
+from .resumenes import restar_detalle, restar_factura, sumar_factura
+# Cambios de stock atómicos (UPDATE con F())
+from products.stock import cantidades_por_producto, devolver_stock
+
+
+# Los ViewSet de ventas responden GET condicionales (ETag/304, ver uglobals/condicional.py)
+class ClienteViewSet(GetCondicionalMixin, viewsets.ModelViewSet):
     queryset = Cliente.objects.all().order_by('nombre')
     serializer_class = ClienteSerializer
 
 class CustomFacturaPagination(LimitOffsetPagination):
     default_limit = 2500 # Por si no se especifica 'limit' en la URL
-    max_limit = 100 # Limite máximo que se puede pedir
+    max_limit = 2500 # Limite máximo que se puede pedir (igual al default, para que sea coherente)
+
+# Modo cursor (cabecera X-Paginacion: cursor): keyset sobre (fecha, id), usa el índice factura_fecha_id_idx
+class FacturaCursorPagination(PaginacionKeyset):
+    ordenamiento = ('-fecha', '-id')
+
+class FacturaPagination(PaginacionOpcional):
+    paginacion_clasica = CustomFacturaPagination
+    paginacion_cursor = FacturaCursorPagination
 
-class FacturaViewSet(viewsets.ModelViewSet):
-    queryset = Factura.objects.all().order_by('-fecha') # Ordenar por fecha descendente
+class DetalleVentaCursorPagination(PaginacionKeyset):
+    ordenamiento = ('-id',)
+
+# Sin la cabecera la lista sale completa, como siempre
+class DetalleVentaPagination(PaginacionOpcional):
+    paginacion_cursor = DetalleVentaCursorPagination
+
+# En lecturas acepta ?fields= y ?expand=; el queryset (select_related/prefetch/only) lo arma
+# FacturaSerializer según lo que se vaya a devolver, con un número de consultas constante.
+class FacturaViewSet(GetCondicionalMixin, CamposDinamicosViewMixin, viewsets.ModelViewSet):
+    queryset = Factura.objects.all().order_by('-fecha', '-id') # Ordenar por fecha descendente (id desempata)
     serializer_class = FacturaSerializer
-    pagination_class = CustomFacturaPagination
+    pagination_class = FacturaPagination
+    # Los detalles tocan la fecha_actualizacion de su factura; lo demás sale de estas tablas
+    campo_modificacion = 'fecha_actualizacion'
+    modelos_relacionados = (Cliente, FormaPago, Usuario, Rol, Permiso, Producto, Proveedor, Categoria, Marca)
 
     filter_backends = [DjangoFilterBackend, SearchFilter, filters.OrderingFilter]
     filterset_fields = {
@@ -54,31 +93,45 @@ class FacturaViewSet(viewsets.ModelViewSet):
     ordering_fields = ['fecha', 'total']
 
     # Sobreescribir el método create para manejar los detalles de venta
-    # La lógica de stock ya está en DetalleVenta.save(), así que solo creamos los detalles.
+    # FacturaSerializer.create delega en registrar_factura (sales/services.py), que bloquea
+    # los productos, descuenta el stock y crea los detalles en bloque dentro de una transacción.
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        detalle_ventas_data = serializer.validated_data.pop('detalle_ventas', [])
-
-        with transaction.atomic():
-            factura = serializer.save() # Guarda la factura principal
-
-            # Procesar los detalles de venta
-            for detalle_data in detalle_ventas_data:
-                # La lógica de descuento de stock está en DetalleVenta.save()
-                # Si DetalleVenta.save() lanza una ValidationError (por stock),
-                # la transacción se revertirá automáticamente.
-                DetalleVenta.objects.create(factura=factura, **detalle_data)
-
-            # Recalcular el total de la factura después de crear todos los detalles
-            # Esto es importante si el total no se calcula en el modelo Factura.save()
-            factura.total = sum(item.subtotal for item in factura.detalle_ventas.all())
-            factura.save() # Guardar el total actualizado
+        try:
+            serializer.save()
+        except DjangoValidationError as e:
+            # Stock insuficiente: la transacción ya se revirtió completa
+            return Response({'detalle_ventas': e.messages}, status=status.HTTP_400_BAD_REQUEST)
 
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
+    # Si cambian la fecha, el cliente o el usuario, la factura se mueve de fila en los resúmenes
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            if serializer.instance.estado != 'Anulada':
+                restar_factura(serializer.instance)
+            factura = serializer.save()
+            if factura.estado != 'Anulada':
+                sumar_factura(factura, factura.detalle_ventas.all())
+
+    # Una factura eliminada deja de contar en los resúmenes diarios y devuelve su stock
+    # (las anuladas ya se restaron y ya lo devolvieron)
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            # Con bloqueo, como al anular: una anulación simultánea no devuelve el stock otra vez
+            instance = Factura.objects.select_for_update().get(pk=instance.pk)
+            if instance.estado != 'Anulada':
+                detalles = list(instance.detalle_ventas.all())
+                restar_factura(instance, detalles)
+                devolver_stock(
+                    cantidades_por_producto((d.producto_id, d.cantidad) for d in detalles),
+                    MovimientoStock.DEVOLUCION, instance.id_factura,
+                )
+            instance.delete()
+
     # Acción personalizada para completar una factura
     @action(detail=True, methods=['post'], url_path='completar')
     def completar_factura(self, request, pk=None):
@@ -102,27 +155,31 @@ class FacturaViewSet(viewsets.ModelViewSet):
         except Factura.DoesNotExist:
             return Response({'error': 'Factura no encontrada.'}, status=status.HTTP_404_NOT_FOUND)
 
-        if factura.estado == 'Anulada':
-            return Response({'error': 'La factura ya está Anulada y no se puede anular de nuevo.'}, status=status.HTTP_400_BAD_REQUEST)
-
         with transaction.atomic():
-            # Devolver stock
-            # Esta lógica asume que el stock se descontó al crear el DetalleVenta.
-            for detalle in factura.detalle_ventas.all():
-                producto = detalle.producto
-                producto.stock += detalle.cantidad
-                producto.save()
-            
+            # Se relee con bloqueo: de dos anulaciones simultáneas solo una devuelve el stock
+            # y resta de los resúmenes; la otra espera y ya la ve anulada
+            factura = Factura.objects.select_for_update().get(pk=factura.pk)
+            if factura.estado == 'Anulada':
+                return Response({'error': 'La factura ya está Anulada y no se puede anular de nuevo.'}, status=status.HTTP_400_BAD_REQUEST)
+            detalles = list(factura.detalle_ventas.all())
+            # Las facturas anuladas no cuentan en los reportes
+            restar_factura(factura, detalles)
+            # Devolver stock: un solo UPDATE stock = stock + cantidad para todos los productos
+            devolver_stock(
+                cantidades_por_producto((d.producto_id, d.cantidad) for d in detalles),
+                MovimientoStock.ANULACION, factura.id_factura,
+            )
             factura.estado = 'Anulada'
             factura.save()
 
         return Response({'message': 'Factura marcada como Anulada y stock devuelto exitosamente.'}, status=status.HTTP_200_OK)
 
-    # NUEVA ACCIÓN: Enviar PDF de Factura por Email
+    # Enviar PDF de Factura por Email: se encola y responde 202 sin esperar al servidor de correo.
+    # El worker 'manage.py procesar_envios' genera el PDF y lo envía (sales/envios.py).
     @action(detail=True, methods=['post'], url_path='send_pdf_email')
     def send_pdf_email(self, request, pk=None):
         """
-        Genera un PDF de la factura y lo envía por email al cliente asociado.
+        Encola el envío del PDF de la factura al email del cliente asociado.
         """
         try:
             invoice = self.get_object() # Obtiene la factura por su ID (pk)
@@ -133,60 +190,112 @@ class FacturaViewSet(viewsets.ModelViewSet):
         if not invoice.cliente or not invoice.cliente.email:
             return Response({'error': 'El cliente de esta factura no tiene un email registrado.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # 1. Generar el PDF
-        pdf_path, pdf_error = generate_invoice_pdf(invoice.id)
-        if pdf_error:
-            return Response({'error': f'Error al generar el PDF: {pdf_error}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        # 2. Enviar el Email
-        email_sent, email_error = send_invoice_email(invoice.id, invoice.cliente.email, pdf_path)
-
-        # Opcional: Limpiar el archivo PDF temporal después de enviarlo
-        if os.path.exists(pdf_path):
-            try:
-                os.remove(pdf_path)
-            except Exception as e:
-                print(f"Advertencia: No se pudo eliminar el archivo PDF temporal {pdf_path}: {e}")
-
-        if email_sent:
-            return Response({'message': 'PDF de factura enviado por email exitosamente.'}, status=status.HTTP_200_OK)
+        envio = encolar_envio(invoice, invoice.cliente.email)
+        return Response({
+            'message': 'El PDF de la factura se enviará por email en unos momentos.',
+            'envio': EnvioFacturaSerializer(envio).data,
+        }, status=status.HTTP_202_ACCEPTED)
+
+    # PDF de la factura para ver o reimprimir. Sale de la caché de PDFs (sales/cache_pdf.py) y
+    # lleva como ETag la huella de su contenido: con If-None-Match igual responde 304 sin cuerpo.
+    @action(detail=True, methods=['get'], url_path='pdf',
+            renderer_classes=api_settings.DEFAULT_RENDERER_CLASSES + [PDFRenderer])
+    def pdf(self, request, pk=None):
+        factura = get_object_or_404(Factura.objects.select_related('cliente', 'forma_pago', 'usuario'), pk=pk)
+        self.check_object_permissions(request, factura)
+
+        items = get_invoice_items(factura)
+        etag = f'"{invoice_pdf_fingerprint(factura, items)}"'
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            respuesta = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
         else:
-            return Response({'error': f'Error al enviar el email: {email_error}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-
-class DetalleVentaViewSet(viewsets.ModelViewSet):
-    queryset = DetalleVenta.objects.all()
+            contenido, _ = get_invoice_pdf(factura, items)
+            respuesta = HttpResponse(contenido, content_type='application/pdf')
+            respuesta['Content-Disposition'] = f'inline; filename="{invoice_pdf_filename(factura)}"'
+        respuesta['ETag'] = etag
+        respuesta['Cache-Control'] = 'private, no-cache' # El navegador guarda el PDF pero revalida cada vez
+        return respuesta
+
+    # Envío masivo: encola el PDF de varias facturas ({"facturas": [id, ...]}) y responde 202.
+    # El worker los manda por lotes sobre una sola conexión SMTP, con límite de correos por segundo.
+    @action(detail=False, methods=['post'], url_path='send_pdf_email_bulk')
+    def send_pdf_email_bulk(self, request):
+        ids = request.data.get('facturas')
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, int) for i in ids):
+            return Response({'error': 'Envíe "facturas" como una lista de ids.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        facturas = Factura.objects.select_related('cliente').in_bulk(ids)
+        encoladas, ya_en_cola, omitidas = encolar_envios(facturas.values())
+        omitidas = [{'factura': factura.pk, 'error': motivo} for factura, motivo in omitidas]
+        omitidas += [{'factura': i, 'error': 'Factura no encontrada.'} for i in dict.fromkeys(ids) if i not in facturas]
+        return Response({
+            'message': f'{encoladas + ya_en_cola} facturas se enviarán por email en unos momentos.',
+            'encoladas': encoladas,
+            'ya_en_cola': ya_en_cola,
+            'omitidas': omitidas,
+        }, status=status.HTTP_202_ACCEPTED)
+
+    # Estado de los envíos por email de la factura (el más reciente primero)
+    @action(detail=True, methods=['get'], url_path='envios')
+    def envios(self, request, pk=None):
+        factura = self.get_object()
+        envios = factura.envios.order_by('-fecha_creacion', '-id')
+        return Response(EnvioFacturaSerializer(envios, many=True).data, status=status.HTTP_200_OK)
+
+
+class DetalleVentaViewSet(GetCondicionalMixin, viewsets.ModelViewSet):
+    # producto_details lleva el producto con los nombres de proveedor, categoría y marca
+    queryset = DetalleVenta.objects.select_related('producto__proveedor', 'producto__categoria', 'producto__marca')
     serializer_class = DetalleVentaSerializer
-    pagination_class = None
+    pagination_class = DetalleVentaPagination
+    # Cada alta, cambio o baja de un detalle actualiza la fecha de su factura
+    campo_modificacion = 'factura__fecha_actualizacion'
+    modelos_relacionados = (Producto, Proveedor, Categoria, Marca)
 
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         with transaction.atomic():
-            try:
-                producto = instance.producto
-                producto.stock += instance.cantidad
-                producto.save()
-                print(f"Stock de {producto.nombre} devuelto por eliminación de detalle. Nuevo stock: {producto.stock}")
-                self.perform_destroy(instance)
-                return Response(status=status.HTTP_204_NO_CONTENT)
-            except Exception as e:
-                return Response({'detail': f'Error al eliminar detalle de venta y devolver stock: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            # Factura y detalle se releen con bloqueo (la factura primero, como al anular): dos
+            # DELETE del mismo detalle, o un DELETE y una anulación, no devuelven el stock dos veces
+            factura = Factura.objects.select_for_update().filter(pk=instance.factura_id).first()
+            instance = DetalleVenta.objects.select_for_update().filter(pk=instance.pk).first()
+            if factura is None or instance is None:
+                return Response({'detail': 'Detalle de venta no encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+            instance.factura = factura
+            # Si la factura está anulada su stock ya se devolvió y ya no cuenta en los resúmenes
+            if factura.estado != 'Anulada':
+                devolver_stock({instance.producto_id: instance.cantidad}, MovimientoStock.DEVOLUCION, factura.id_factura)
+                # El detalle deja de sumar en los resúmenes y en el total de su factura
+                restar_detalle(instance)
+                Factura.objects.filter(pk=factura.pk).update(total=F('total') - instance.subtotal)
+            self.perform_destroy(instance)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 # REPORTES DE AQUI HACIA ABAJO----------------->
 #
+# Los reportes agregados (más vendidos, ganancias, rendimiento por empleado y ventas por
+# cliente) leen los resúmenes diarios (ResumenDiario*): suman una fila por día y clave en
+# lugar de recorrer todas las facturas del rango. Las facturas anuladas no cuentan.
 class ProductosMasVendidosAPIView(APIView):
     """
     API para obtener los productos más vendidos por cantidad.
+    Acepta opcionalmente 'start_date' y 'end_date' (YYYY-MM-DD).
     """
     def get(self, request, format=None):
         try:
-            productos_vendidos = DetalleVenta.objects.values(
+            dia_inicio, dia_fin = leer_dias(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            resumenes = filtrar_dias(ResumenDiarioProducto.objects.all(), dia_inicio, dia_fin)
+            productos_vendidos = resumenes.values(
                 'producto__referencia_producto',
                 'producto__nombre',
                 'producto__precio_sugerido_venta'
             ).annotate(
                 cantidad_total_vendida=Sum('cantidad')
-            ).order_by('-cantidad_total_vendida')
+            ).filter(cantidad_total_vendida__gt=0).order_by('-cantidad_total_vendida')
 
             data = []
             for item in productos_vendidos:
@@ -210,27 +319,17 @@ class GananciasPorFechaAPIView(APIView):
         start_date_str = request.query_params.get('start_date')
         end_date_str = request.query_params.get('end_date')
 
-        facturas = Factura.objects.all()
+        try:
+            dia_inicio, dia_fin = leer_dias(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        if start_date_str:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                facturas = facturas.filter(fecha__date__gte=start_date)
-            except ValueError:
-                return Response({"error": "Formato de fecha de inicio inválido. Use YYYY-MM-DD."},
-                                status=status.HTTP_400_BAD_REQUEST)
+        resumenes = filtrar_dias(ResumenDiarioUsuario.objects.all(), dia_inicio, dia_fin)
+        totales = resumenes.aggregate(total_ventas=Sum('ingresos'), numero_facturas=Sum('numero_facturas'))
 
-        if end_date_str:
-            try:
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                end_date = datetime.combine(end_date, time.max).date()
-            except ValueError:
-                return Response({"error": "Formato de fecha de fin inválido. Use YYYY-MM-DD."},
-                                status=status.HTTP_400_BAD_REQUEST)
-        
-        ganancia_total = facturas.aggregate(total_ventas=Sum('total'))['total_ventas'] or 0
+        ganancia_total = totales['total_ventas'] or 0
 
-        num_facturas = facturas.count()
+        num_facturas = totales['numero_facturas'] or 0
 
         data = {
             'ganancia_bruta_total': float(ganancia_total),
@@ -246,62 +345,69 @@ class IngresosDetalladosAPIView(APIView):
     """
     API para obtener ingresos detallados por producto, por día y por factura.
     Incluye costo unitario y ganancia unitaria.
+    Con '?format=csv' o '?format=ndjson' la respuesta se envía en streaming (las filas se
+    leen por lotes y se escriben una a una), para rangos grandes; sin él sale en JSON como siempre.
     """
-    def get(self, request, format=None):
-        start_date_str = request.query_params.get('start_date')
-        end_date_str = request.query_params.get('end_date')
-
-        detalles_ventas = DetalleVenta.objects.all()
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [CSVRenderer, NDJSONRenderer]
+    columnas = [
+        'id_detalle_venta', 'factura_id', 'fecha_factura', 'nombre_cliente', 'referencia_producto',
+        'nombre_producto', 'cantidad', 'precio_unitario_venta', 'costo_unitario_producto',
+        'ingreso_por_item', 'costo_por_item', 'ganancia_por_item',
+    ]
 
-        if start_date_str:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                detalles_ventas = detalles_ventas.filter(factura__fecha__date__gte=start_date)
-            except ValueError:
-                return Response({"error": "Formato de fecha de inicio inválido. Use %Y-%MM-DD."},
-                                status=status.HTTP_400_BAD_REQUEST)
+    def get(self, request, format=None):
+        try:
+            desde, hasta = leer_rango_fechas(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        if end_date_str:
-            try:
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                detalles_ventas = detalles_ventas.filter(factura__fecha__date__lte=end_date)
-            except ValueError:
-                return Response({"error": "Formato de fecha de fin inválido. Use %Y-%MM-DD."},
-                                status=status.HTTP_400_BAD_REQUEST)
+        detalles_ventas = filtrar_rango_fechas(DetalleVenta.objects.all(), 'factura__fecha', desde, hasta)
         
         detalles_con_ganancia = detalles_ventas.annotate(
             ingreso_por_item=ExpressionWrapper(
                 F('cantidad') * F('precio_unitario'),
                 output_field=fields.DecimalField(max_digits=10, decimal_places=2)
             ),
+            # Con el costo guardado en la línea: coincide con los resúmenes aunque después
+            # cambie el precio_costo del producto
             costo_por_item=ExpressionWrapper(
-                F('cantidad') * F('producto__precio_costo'),
+                F('cantidad') * F('costo_unitario'),
                 output_field=fields.DecimalField(max_digits=10, decimal_places=2)
             ),
             ganancia_por_item=ExpressionWrapper(
-                (F('cantidad') * F('precio_unitario')) - (F('cantidad') * F('producto__precio_costo')),
+                (F('cantidad') * F('precio_unitario')) - (F('cantidad') * F('costo_unitario')),
                 output_field=fields.DecimalField(max_digits=10, decimal_places=2)
             )
-        ).select_related('producto', 'factura', 'factura__cliente')
+        ).values(
+            'id', 'factura__id_factura', 'factura__fecha', 'factura__cliente__nombre',
+            'producto__referencia_producto', 'producto__nombre', 'cantidad', 'precio_unitario',
+            'costo_unitario', 'ingreso_por_item', 'costo_por_item', 'ganancia_por_item',
+        )
 
-        data = []
-        for detalle in detalles_con_ganancia:
-            data.append({
-                'id_detalle_venta': detalle.id,
-                'factura_id': detalle.factura.id_factura,
-                'fecha_factura': detalle.factura.fecha.isoformat(),
-                'nombre_cliente': detalle.factura.cliente.nombre if detalle.factura.cliente else 'N/A',
-                'referencia_producto': detalle.producto.referencia_producto,
-                'nombre_producto': detalle.producto.nombre,
-                'cantidad': detalle.cantidad,
-                'precio_unitario_venta': detalle.precio_unitario,
-                'costo_unitario_producto': detalle.producto.precio_costo,
-                'ingreso_por_item': detalle.ingreso_por_item,
-                'costo_por_item': detalle.costo_por_item,
-                'ganancia_por_item': detalle.ganancia_por_item,
-            })
+        if request.accepted_renderer.format in FORMATOS_STREAMING:
+            filas = (self.fila(item) for item in iterar_en_lotes(detalles_con_ganancia))
+            return respuesta_streaming(filas, self.columnas, request.accepted_renderer.format, 'ingresos-detallados')
+
+        data = [self.fila(item) for item in detalles_con_ganancia]
         
         return Response(data, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def fila(item):
+        return {
+            'id_detalle_venta': item['id'],
+            'factura_id': item['factura__id_factura'],
+            'fecha_factura': item['factura__fecha'].isoformat(),
+            'nombre_cliente': item['factura__cliente__nombre'] or 'N/A',
+            'referencia_producto': item['producto__referencia_producto'],
+            'nombre_producto': item['producto__nombre'],
+            'cantidad': item['cantidad'],
+            'precio_unitario_venta': item['precio_unitario'],
+            'costo_unitario_producto': item['costo_unitario'],
+            'ingreso_por_item': item['ingreso_por_item'],
+            'costo_por_item': item['costo_por_item'],
+            'ganancia_por_item': item['ganancia_por_item'],
+        }
     
 class ProductosBajoStockAPIView(APIView):
     """
@@ -319,21 +425,24 @@ class ProductosBajoStockAPIView(APIView):
             except ValueError:
                 return Response({"error": "El umbral debe ser un número entero válido."}, status=status.HTTP_400_BAD_REQUEST)
 
+        # Una sola consulta con los nombres de categoría y proveedor ya unidos
         productos_bajo_stock = Producto.objects.filter(
             stock__lte=umbral_stock,
             activo=True
-        ).order_by('stock', 'nombre')
+        ).order_by('stock', 'nombre').values(
+            'referencia_producto', 'nombre', 'stock', 'categoria__nombre', 'proveedor__nombre', 'precio_costo',
+        )
 
         data = []
         for producto in productos_bajo_stock:
             data.append({
-                'id_producto': producto.referencia_producto,
-                'nombre': producto.nombre,
-                'referencia_producto': producto.referencia_producto,
-                'stock_actual': producto.stock,
-                'categoria': producto.categoria.nombre if producto.categoria else 'Sin Categoría',
-                'proveedor': producto.proveedor.nombre if producto.proveedor else 'Sin Proveedor',
-                'precio_costo': producto.precio_costo,
+                'id_producto': producto['referencia_producto'],
+                'nombre': producto['nombre'],
+                'referencia_producto': producto['referencia_producto'],
+                'stock_actual': producto['stock'],
+                'categoria': producto['categoria__nombre'] or 'Sin Categoría',
+                'proveedor': producto['proveedor__nombre'] or 'Sin Proveedor',
+                'precio_costo': producto['precio_costo'],
             })
         
         return Response(data, status=status.HTTP_200_OK)
@@ -345,35 +454,17 @@ class RendimientoEmpleadosAPIView(APIView):
     Los resultados se ordenan por las ventas totales de forma descendente.
     """
     def get(self, request, format=None):
-        start_date_str = request.query_params.get('start_date')
-        end_date_str = request.query_params.get('end_date')
-
-        start_date = None
-        end_date = None
-
-        if start_date_str:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-            except ValueError:
-                return Response({"error": "Formato de fecha de inicio incorrecto. Usa AAAA-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if end_date_str:
-            try:
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                end_date = datetime.combine(end_date, time.max).date()
-            except ValueError:
-                return Response({"error": "Formato de fecha de fin incorrecto. Usa AAAA-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            dia_inicio, dia_fin = leer_dias(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        facturas_queryset = Factura.objects.all()
-        if start_date:
-            facturas_queryset = facturas_queryset.filter(fecha__date__gte=start_date)
-        if end_date:
-            facturas_queryset = facturas_queryset.filter(fecha__date__lte=end_date)
+        resumenes = filtrar_dias(ResumenDiarioUsuario.objects.all(), dia_inicio, dia_fin)
         
-        rendimiento = facturas_queryset.values('usuario__id', 'usuario__username').annotate(
-            total_ventas=Sum('total'),
-            numero_facturas=Count('id')
-        ).order_by('-total_ventas')
+        rendimiento = resumenes.values('usuario__id', 'usuario__username').annotate(
+            total_ventas=Sum('ingresos'),
+            numero_facturas=Sum('numero_facturas')
+        ).filter(numero_facturas__gt=0).order_by('-total_ventas')
 
         data = []
         for item in rendimiento:
@@ -399,35 +490,17 @@ class VentasPorClienteAPIView(APIView):
     en un rango de fechas.
     """
     def get(self, request, format=None):
-        start_date_str = request.query_params.get('start_date')
-        end_date_str = request.query_params.get('end_date')
-
-        start_date = None
-        end_date = None
-
-        if start_date_str:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-            except ValueError:
-                return Response({"error": "Formato de fecha de inicio incorrecto. Usa AAAA-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if end_date_str:
-            try:
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                end_date = datetime.combine(end_date, time.max).date()
-            except ValueError:
-                return Response({"error": "Formato de fecha de fin incorrecto. Usa AAAA-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            dia_inicio, dia_fin = leer_dias(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        facturas_queryset = Factura.objects.all()
-        if start_date:
-            facturas_queryset = facturas_queryset.filter(fecha__date__gte=start_date)
-        if end_date:
-            facturas_queryset = facturas_queryset.filter(fecha__date__lte=end_date)
+        resumenes = filtrar_dias(ResumenDiarioCliente.objects.all(), dia_inicio, dia_fin)
         
-        rendimiento_clientes = facturas_queryset.values('cliente__id', 'cliente__nombre').annotate(
-            total_ventas=Sum('total'),
-            numero_facturas=Count('id')
-        ).order_by('-total_ventas')
+        rendimiento_clientes = resumenes.values('cliente__id', 'cliente__nombre').annotate(
+            total_ventas=Sum('ingresos'),
+            numero_facturas=Sum('numero_facturas')
+        ).filter(numero_facturas__gt=0).order_by('-total_ventas')
 
         data = []
         for item in rendimiento_clientes:
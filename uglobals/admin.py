@@ -1,8 +1,9 @@
 # zglobals/admin.py
 from django.contrib import admin
-from .models import Proveedor, Marca, Categoria, FormaPago
+from .models import Proveedor, Marca, Categoria, FormaPago, Secuencia
 
 admin.site.register(Proveedor)
 admin.site.register(Marca)
 admin.site.register(Categoria)
-admin.site.register(FormaPago)
\ No newline at end of file
+admin.site.register(FormaPago)
+admin.site.register(Secuencia)
\ No newline at end of file
@@ -0,0 +1,107 @@
+# uglobals/campos.py
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.permissions import SAFE_METHODS
+
+
+def leer_lista_parametro(request, nombre):
+    """
+    Devuelve el conjunto de valores de '?nombre=a,b,c' o None si el parámetro no viene.
+    """
+    if request is None or nombre not in request.query_params:
+        return None
+    return {valor.strip() for valor in request.query_params.get(nombre, '').split(',') if valor.strip()}
+
+
+class CamposDinamicosSerializerMixin:
+    """
+    Mixin para ModelSerializer que atiende '?fields=' y '?expand=' en las lecturas.
+    - fields: lista de campos a devolver (sin el parámetro se devuelven todos).
+    - expand: relaciones de 'campos_expandibles' que se devuelven como objeto anidado;
+      las demás salen como id. Sin el parámetro se usa 'expandir_por_defecto'.
+    En escrituras (POST/PUT/PATCH) el serializer queda intacto.
+    """
+    campos_expandibles = ()
+    expandir_por_defecto = None # None = todas las de campos_expandibles
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        self.campos_pedidos = None
+        if self.expandir_por_defecto is None:
+            self.expandir = set(self.campos_expandibles)
+        else:
+            self.expandir = set(self.expandir_por_defecto)
+
+        if request is None or request.method not in SAFE_METHODS:
+            return
+
+        self.campos_pedidos = leer_lista_parametro(request, 'fields')
+        if self.campos_pedidos is not None:
+            for nombre in list(self.fields):
+                if nombre not in self.campos_pedidos:
+                    self.fields.pop(nombre)
+
+        expandir = leer_lista_parametro(request, 'expand')
+        if expandir is not None:
+            self.expandir = expandir & set(self.campos_expandibles)
+
+    def debe_expandir(self, nombre):
+        return nombre in self.expandir and nombre in self.fields
+
+    def optimizar_queryset(self, queryset):
+        """
+        Ajusta el queryset a los campos que este serializer va a devolver:
+        select_related solo para las relaciones que se leen, y only() con las
+        columnas necesarias cuando el cliente pidió '?fields='.
+        """
+        opciones = queryset.model._meta
+        columnas = {opciones.pk.name}
+        relaciones = {} # relación -> columnas leídas de ella (None = el objeto completo)
+
+        for nombre, campo in self.fields.items():
+            if campo.write_only or campo.source == '*':
+                continue
+            partes = campo.source.split('.')
+            try:
+                campo_modelo = opciones.get_field(partes[0])
+            except FieldDoesNotExist:
+                continue
+            if not campo_modelo.is_relation:
+                columnas.add(partes[0])
+            elif campo_modelo.many_to_one or campo_modelo.one_to_one:
+                columnas.add(partes[0])
+                if self.debe_expandir(nombre) or len(partes) > 2:
+                    relaciones[partes[0]] = None
+                elif len(partes) == 2 and relaciones.get(partes[0], set()) is not None:
+                    relaciones.setdefault(partes[0], set()).add(partes[1])
+
+        if relaciones:
+            queryset = queryset.select_related(*relaciones)
+        queryset = self.preparar_queryset(queryset)
+
+        if self.campos_pedidos is not None:
+            for relacion, campos_relacion in relaciones.items():
+                if campos_relacion is not None:
+                    columnas.discard(relacion)
+                    columnas.update(f'{relacion}__{campo}' for campo in campos_relacion)
+            queryset = queryset.only(*columnas)
+        return queryset
+
+    def preparar_queryset(self, queryset):
+        """
+        Punto de extensión para prefetch/select_related adicionales según lo que
+        se vaya a serializar (por ejemplo relaciones inversas).
+        """
+        return queryset
+
+
+class CamposDinamicosViewMixin:
+    """
+    Mixin para ViewSets cuyo serializer usa CamposDinamicosSerializerMixin: en las
+    lecturas el queryset se arma según '?fields=' y '?expand='.
+    """
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return queryset
+        return self.get_serializer().optimizar_queryset(queryset)
@@ -0,0 +1,147 @@
+# uglobals/catalogos.py
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.utils.http import parse_etags
+from rest_framework import serializers, status
+from rest_framework.response import Response
+
+from . import versiones
+from .models import Categoria, FormaPago, Marca, Proveedor
+from .serializers import CategoriaSerializer, FormaPagoSerializer, MarcaSerializer, ProveedorSerializer
+
+# Caché de lectura de los catálogos (proveedores, marcas, categorías, formas de pago): tablas
+# pequeñas que cada pantalla del POS vuelve a pedir y que los serializers consultan al validar
+# cada escritura. Las entradas se guardan por (catálogo, versión de su tabla, ver versiones.py),
+# así que después de un cambio se deja de leer la anterior sin borrar nada.
+# Dos niveles: un LRU en memoria por proceso y, si CATALOGOS_CACHE_ALIAS nombra un backend
+# de CACHES, ese caché compartido entre procesos. Cada proceso vuelve a mirar la versión como
+# mucho cada CATALOGOS_CACHE_REVALIDAR_SEGUNDOS; el proceso que hizo el cambio lo ve al instante.
+
+_lock = threading.Lock()
+_entradas = OrderedDict() # (catálogo, versión) -> Catalogo, en orden de uso
+
+
+class Catalogo:
+    """
+    Contenido de un catálogo en una versión: las filas serializadas (en el orden del
+    listado), las instancias por pk (para validar claves foráneas) y el ETag.
+    """
+    def __init__(self, nombre, version, objetos, datos):
+        self.nombre = nombre
+        self.version = version
+        self.objetos = objetos
+        self.datos = datos
+
+    @property
+    def etag(self):
+        return f'"{self.nombre}-{self.version}"'
+
+
+# Orden del listado y serializer de cada catálogo
+CATALOGOS = {
+    Proveedor: ('nombre', ProveedorSerializer),
+    Marca: ('nombre', MarcaSerializer),
+    Categoria: ('nombre', CategoriaSerializer),
+    FormaPago: ('metodo', FormaPagoSerializer),
+}
+
+
+def _nombre(modelo):
+    return f'catalogo:{modelo._meta.label_lower}'
+
+
+def _cache_compartido():
+    alias = settings.CATALOGOS_CACHE_ALIAS
+    return caches[alias] if alias else None
+
+
+def obtener(modelo, construir=True):
+    """
+    Devuelve el Catalogo vigente del modelo (memoria, luego caché compartido, luego la base
+    de datos). Dentro de una transacción no se guarda nada en caché: lo leído podría
+    revertirse. Con construir=False devuelve None si habría que ir a la base de datos y no
+    se podría guardar el resultado.
+    """
+    nombre = _nombre(modelo)
+    clave = (nombre, versiones.version(modelo))
+    with _lock:
+        catalogo = _entradas.get(clave)
+        if catalogo is not None:
+            _entradas.move_to_end(clave)
+            return catalogo
+
+    compartido = _cache_compartido()
+    clave_compartida = f'{nombre}:{clave[1]}'
+    catalogo = compartido.get(clave_compartida) if compartido else None
+    if catalogo is None:
+        if connection.in_atomic_block:
+            return _construir(modelo, clave[1]) if construir else None
+        catalogo = _construir(modelo, clave[1])
+        if compartido:
+            compartido.set(clave_compartida, catalogo, timeout=None)
+
+    with _lock:
+        _entradas[clave] = catalogo
+        _entradas.move_to_end(clave)
+        while len(_entradas) > settings.CATALOGOS_CACHE_MAX_LOCAL:
+            _entradas.popitem(last=False)
+    return catalogo
+
+
+def _construir(modelo, version_actual):
+    orden, serializer_class = CATALOGOS[modelo]
+    objetos = list(modelo.objects.order_by(orden, 'pk'))
+    # dict() en vez de ReturnDict: se guardan tal cual en el caché compartido
+    datos = [dict(fila) for fila in serializer_class(objetos, many=True).data]
+    return Catalogo(_nombre(modelo), version_actual, {objeto.pk: objeto for objeto in objetos}, datos)
+
+
+def limpiar():
+    """
+    Vacía el caché en memoria de este proceso (útil en pruebas, donde la base de datos
+    se reinicia y las versiones vuelven a empezar).
+    """
+    with _lock:
+        _entradas.clear()
+    versiones.limpiar()
+
+
+class CatalogoRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField que resuelve el id contra el caché del catálogo en lugar de
+    hacer una consulta por cada escritura. Si el id no está (un alta reciente que este
+    proceso aún no ve) se consulta la base de datos como siempre.
+    """
+    def to_internal_value(self, data):
+        if self.pk_field is None:
+            modelo = self.get_queryset().model
+            try:
+                pk = modelo._meta.pk.to_python(data)
+            except Exception:
+                pk = None
+            # Dentro de una transacción, sin el catálogo en caché, una consulta por pk sale más barata
+            catalogo = obtener(modelo, construir=False) if pk is not None else None
+            objeto = catalogo.objetos.get(pk) if catalogo else None
+            if objeto is not None:
+                return objeto
+        return super().to_internal_value(data)
+
+
+class CatalogoCacheadoMixin:
+    """
+    Para los ViewSet de catálogos: el listado sale del caché con ETag (la versión del
+    catálogo); si el cliente envía If-None-Match con ese ETag se responde 304 sin cuerpo.
+    """
+    def list(self, request, *args, **kwargs):
+        catalogo = obtener(self.get_queryset().model)
+        if catalogo.etag in parse_etags(request.headers.get('If-None-Match', '')):
+            respuesta = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            respuesta = Response(catalogo.datos)
+        respuesta['ETag'] = catalogo.etag
+        respuesta['Cache-Control'] = 'private, no-cache'
+        return respuesta
@@ -0,0 +1,104 @@
+# uglobals/condicional.py
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import versiones
+
+# Campo con la fecha de la última modificación en las tablas grandes (auto_now). Las tablas
+# pequeñas no lo tienen: se validan con la versión de la tabla (versiones.py).
+CAMPO_ACTUALIZACION = 'fecha_actualizacion'
+
+
+def _tiene_fecha_actualizacion(modelo):
+    return any(campo.name == CAMPO_ACTUALIZACION for campo in modelo._meta.get_fields())
+
+
+def sellos_tablas(modelos):
+    """
+    Valores baratos que cambian cuando cambia cualquier fila de cada tabla: (última
+    modificación, cantidad de filas) si tiene fecha_actualizacion, o su versión si no
+    (todas las versiones en una consulta).
+    """
+    con_fecha = [modelo for modelo in modelos if _tiene_fecha_actualizacion(modelo)]
+    sin_fecha = [modelo for modelo in modelos if modelo not in con_fecha]
+    sellos = versiones.actuales(sin_fecha) if sin_fecha else {}
+    for modelo in con_fecha:
+        sello = modelo.objects.aggregate(ultima=Max(CAMPO_ACTUALIZACION), filas=Count('pk'))
+        sellos[modelo] = (sello['ultima'], sello['filas'])
+    return tuple(sellos[modelo] for modelo in modelos)
+
+
+class GetCondicionalMixin:
+    """
+    GET condicional (ETag, y Last-Modified en el detalle) para listados y detalles.
+    Antes de leer y serializar se calcula un validador barato; si coincide con el que
+    envía el cliente (If-None-Match / If-Modified-Since) se responde 304 sin cuerpo.
+
+    - campo_modificacion: campo (o lookup, p. ej. 'factura__fecha_actualizacion') con la
+      fecha de la última modificación. El listado usa su máximo y la cantidad de filas del
+      queryset filtrado; el detalle, el valor de la fila. Sin él se usa la versión de la tabla.
+    - modelos_relacionados: modelos que también salen en la respuesta (nombres, objetos
+      anidados); cualquier cambio en ellos cambia el ETag.
+    """
+    campo_modificacion = None
+    modelos_relacionados = ()
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.campo_modificacion:
+            sello = queryset.aggregate(ultima=Max(self.campo_modificacion), filas=Count('pk'))
+            validador = (sello['ultima'], sello['filas'])
+        else:
+            validador = None # La versión de la tabla va con las de los relacionados
+        respuesta = self._respuesta_condicional(request, validador)
+        return respuesta or super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        ultima = None
+        if self.campo_modificacion:
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            fila = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            ).values_list('pk', self.campo_modificacion).first()
+            if fila is None:
+                return super().retrieve(request, *args, **kwargs) # 404 como siempre
+            validador, ultima = fila, fila[1]
+        else:
+            validador = None
+        respuesta = self._respuesta_condicional(request, validador, ultima)
+        return respuesta or super().retrieve(request, *args, **kwargs)
+
+    def _respuesta_condicional(self, request, validador, ultima=None):
+        # El ETag cubre la URL completa (filtros, paginación, ?fields=) y el formato pedido
+        modelo = self.get_queryset().model
+        tablas = tuple(self.modelos_relacionados) if validador is not None else (modelo, *self.modelos_relacionados)
+        partes = (
+            modelo._meta.label_lower, request.get_full_path(), request.accepted_media_type,
+            validador, sellos_tablas(tablas),
+        )
+        self.etag_condicional = '"%s"' % hashlib.sha1(repr(partes).encode()).hexdigest()
+        self.ultima_modificacion = int(ultima.timestamp()) if ultima else None
+        respuesta = get_conditional_response(
+            request, etag=self.etag_condicional, last_modified=self.ultima_modificacion,
+        )
+        if respuesta is None or respuesta.status_code != status.HTTP_304_NOT_MODIFIED:
+            return None
+        return self._con_validadores(Response(status=status.HTTP_304_NOT_MODIFIED))
+
+    def _con_validadores(self, respuesta):
+        respuesta['ETag'] = self.etag_condicional
+        if self.ultima_modificacion:
+            respuesta['Last-Modified'] = http_date(self.ultima_modificacion)
+        respuesta['Cache-Control'] = 'private, no-cache'
+        return respuesta
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'etag_condicional', None) and response.status_code == status.HTTP_200_OK:
+            self._con_validadores(response)
+        return response
@@ -0,0 +1,95 @@
+# uglobals/exportacion.py
+import csv
+import json
+
+from django.db import connection
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+TAMANO_LOTE = 2000
+
+
+class _RendererExportacion(BaseRenderer):
+    """
+    Renderer que solo existe para que DRF acepte '?format=csv' / '?format=ndjson' o un
+    Accept como 'application/pdf' (sin él responde 404 o 406). La vista arma la respuesta
+    por su cuenta y este render no se usa; si responde un error (dict) sale como JSON.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, cls=JSONEncoder, ensure_ascii=False).encode(self.charset)
+
+
+class CSVRenderer(_RendererExportacion):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(_RendererExportacion):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class PDFRenderer(_RendererExportacion):
+    media_type = 'application/pdf'
+    format = 'pdf'
+
+
+FORMATOS_STREAMING = (CSVRenderer.format, NDJSONRenderer.format)
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve la línea en vez de guardarla."""
+    def write(self, valor):
+        return valor
+
+
+def iterar_en_lotes(queryset, tamano=TAMANO_LOTE, campo_clave='id'):
+    """
+    Recorre un queryset (normalmente de values()) sin cargarlo entero en memoria.
+    PostgreSQL y SQLite usan cursores de servidor con iterator(chunk_size); el driver de
+    MySQL lee el resultado completo en el cliente, así que allí se pide por lotes
+    ordenados por 'campo_clave' (campo_clave > último visto), que debe venir en las filas.
+    """
+    if connection.vendor != 'mysql':
+        yield from queryset.iterator(chunk_size=tamano)
+        return
+    queryset = queryset.order_by(campo_clave)
+    ultimo = None
+    while True:
+        lote = queryset if ultimo is None else queryset.filter(**{f'{campo_clave}__gt': ultimo})
+        filas = list(lote[:tamano])
+        yield from filas
+        if len(filas) < tamano:
+            return
+        fila = filas[-1]
+        ultimo = fila[campo_clave] if isinstance(fila, dict) else getattr(fila, campo_clave)
+
+
+def respuesta_streaming(filas, columnas, formato, nombre_archivo):
+    """
+    StreamingHttpResponse que escribe 'filas' (iterable de dicts) como CSV (con cabecera
+    'columnas') o NDJSON (un objeto JSON por línea, con el mismo encoder que las
+    respuestas JSON de DRF), fila a fila: la memoria no crece con el tamaño del resultado.
+    """
+    if formato == CSVRenderer.format:
+        escritor = csv.writer(_Eco())
+
+        def lineas():
+            yield escritor.writerow(columnas)
+            for fila in filas:
+                yield escritor.writerow([fila[columna] for columna in columnas])
+        tipo = CSVRenderer.media_type
+    else:
+        def lineas():
+            for fila in filas:
+                yield json.dumps(fila, cls=JSONEncoder, ensure_ascii=False) + '\n'
+        tipo = NDJSONRenderer.media_type
+
+    respuesta = StreamingHttpResponse(lineas(), content_type=f'{tipo}; charset=utf-8')
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre_archivo}.{formato}"'
+    return respuesta
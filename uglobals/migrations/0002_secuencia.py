@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uglobals', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Secuencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('valor', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
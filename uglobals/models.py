@@ -1,5 +1,7 @@
 # uglobals/models.py
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 # Modelo Proveedor
 class Proveedor(models.Model):
@@ -30,4 +32,27 @@ class FormaPago(models.Model):
     metodo = models.CharField(max_length=100)
     def __str__(self):
         return self.metodo
-    
\ No newline at end of file
+    
+# Modelo Secuencia: contador atómico para numeraciones (facturas, referencias de producto, ...)
+class Secuencia(models.Model):
+    nombre = models.CharField(max_length=50, unique=True)
+    valor = models.BigIntegerField(default=0) # Último número entregado
+
+    def __str__(self):
+        return f"{self.nombre}: {self.valor}"
+
+
+# Cualquier alta, cambio o baja en un catálogo sube la versión de su tabla (al confirmarse
+# la transacción), así el caché de catálogos y los ETag dejan de servir la anterior.
+from . import versiones # noqa: E402 (versiones usa Secuencia, definida arriba)
+
+@receiver(post_save, sender=Proveedor)
+@receiver(post_delete, sender=Proveedor)
+@receiver(post_save, sender=Marca)
+@receiver(post_delete, sender=Marca)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_save, sender=FormaPago)
+@receiver(post_delete, sender=FormaPago)
+def invalidar_catalogo(sender, **kwargs):
+    versiones.invalidar(sender)
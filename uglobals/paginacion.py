@@ -0,0 +1,127 @@
+# uglobals/paginacion.py
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+# Cabecera con la que el cliente pide paginación por cursor: 'X-Paginacion: cursor'
+CABECERA_PAGINACION = 'HTTP_X_PAGINACION'
+
+
+def usa_cursor(request):
+    """
+    El modo cursor es opcional: se activa con la cabecera X-Paginacion: cursor o
+    cuando la URL ya trae ?cursor= (los enlaces 'next' lo incluyen).
+    """
+    return (
+        request.META.get(CABECERA_PAGINACION, '').strip().lower() == 'cursor'
+        or 'cursor' in request.query_params
+    )
+
+
+class PaginacionKeyset(BasePagination):
+    """
+    Paginación por cursor (keyset) sobre 'ordenamiento', que debe terminar en una
+    columna única (normalmente el id). Cada página filtra por "después de la última
+    fila vista" en lugar de usar OFFSET, así que cuesta lo mismo en cualquier
+    profundidad y no se desplaza cuando entran filas nuevas.
+    Respuesta: {'next': url o None, 'results': [...]}.
+    """
+    ordenamiento = ('-id',)
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    default_limit = 100
+    max_limit = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limite = self.get_limit(request)
+        modelo = queryset.model
+        campos = [orden.lstrip('-') for orden in self.ordenamiento]
+
+        queryset = queryset.order_by(*self.ordenamiento)
+        posicion = self.decodificar_cursor(request, modelo, campos)
+        if posicion is not None:
+            queryset = queryset.filter(self.filtro_despues_de(posicion))
+
+        resultados = list(queryset[:self.limite + 1])
+        self.siguiente = None
+        if len(resultados) > self.limite:
+            resultados = resultados[:self.limite]
+            ultimo = resultados[-1]
+            self.siguiente = [modelo._meta.get_field(campo).value_to_string(ultimo) for campo in campos]
+        return resultados
+
+    def get_limit(self, request):
+        try:
+            limite = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+        if limite <= 0:
+            return self.default_limit
+        return min(limite, self.max_limit)
+
+    def filtro_despues_de(self, posicion):
+        """
+        Para ('-fecha', '-id') y la posición (f, i) genera:
+        fecha <= f AND (fecha < f OR (fecha = f AND id < i)).
+        El primer término deja al motor recorrer el índice compuesto como un rango.
+        """
+        filtro = Q()
+        iguales = {}
+        for orden, valor in zip(self.ordenamiento, posicion):
+            campo = orden.lstrip('-')
+            comparacion = 'lt' if orden.startswith('-') else 'gt'
+            filtro |= Q(**iguales, **{f'{campo}__{comparacion}': valor})
+            iguales[campo] = valor
+        primero = self.ordenamiento[0]
+        rango = 'lte' if primero.startswith('-') else 'gte'
+        return Q(**{f'{primero.lstrip("-")}__{rango}': posicion[0]}) & filtro
+
+    def decodificar_cursor(self, request, modelo, campos):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            valores = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+            if len(valores) != len(campos):
+                raise ValueError
+            return [modelo._meta.get_field(campo).to_python(valor) for campo, valor in zip(campos, valores)]
+        except Exception:
+            raise NotFound('Cursor inválido.')
+
+    def codificar_cursor(self, valores):
+        return base64.urlsafe_b64encode(json.dumps(valores).encode('utf-8')).decode('ascii')
+
+    def get_next_link(self):
+        if self.siguiente is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.codificar_cursor(self.siguiente))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+
+class PaginacionOpcional(BasePagination):
+    """
+    Usa 'paginacion_cursor' cuando el cliente lo pide (ver usa_cursor) y
+    'paginacion_clasica' en los demás casos; si esta es None la respuesta sale sin
+    paginar, como antes. Así los clientes existentes siguen funcionando igual.
+    """
+    paginacion_clasica = None
+    paginacion_cursor = PaginacionKeyset
+
+    def paginate_queryset(self, queryset, request, view=None):
+        clase = self.paginacion_cursor if usa_cursor(request) else self.paginacion_clasica
+        self.paginador = clase() if clase else None
+        if self.paginador is None:
+            return None
+        return self.paginador.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginador.get_paginated_response(data)
@@ -0,0 +1,35 @@
+# uglobals/secuencias.py
+from django.db import transaction
+from django.db.models import F
+
+from .models import Secuencia
+
+
+def reservar(nombre, cantidad=1):
+    """
+    Reserva 'cantidad' números consecutivos de la secuencia 'nombre' con un único
+    UPDATE atómico (valor = valor + cantidad) y devuelve el range reservado.
+    El UPDATE bloquea solo la fila del contador hasta que termina la transacción
+    que lo envuelve: si se llama dentro de un transaction.atomic() y este se revierte,
+    el contador también se revierte y la numeración queda sin huecos.
+    """
+    if cantidad < 1:
+        raise ValueError("La cantidad a reservar debe ser mayor que cero.")
+
+    with transaction.atomic():
+        actualizados = Secuencia.objects.filter(nombre=nombre).update(valor=F('valor') + cantidad)
+        if not actualizados:
+            # Primera vez que se usa la secuencia: se crea y se vuelve a incrementar
+            # (si otro proceso la creó primero, get_or_create simplemente la obtiene)
+            Secuencia.objects.get_or_create(nombre=nombre)
+            Secuencia.objects.filter(nombre=nombre).update(valor=F('valor') + cantidad)
+        ultimo = Secuencia.objects.filter(nombre=nombre).values_list('valor', flat=True).get()
+
+    return range(ultimo - cantidad + 1, ultimo + 1)
+
+
+def siguiente(nombre):
+    """
+    Devuelve el siguiente número de la secuencia 'nombre'.
+    """
+    return reservar(nombre)[0]
@@ -0,0 +1,101 @@
+# uglobals/tests.py
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from products.models import Producto
+from uglobals import catalogos, versiones
+from uglobals.models import Categoria, FormaPago, Marca, Proveedor
+
+
+class CatalogosCacheTest(TransactionTestCase):
+    def setUp(self):
+        # Cada prueba vacía la base de datos: las versiones vuelven a empezar
+        catalogos.limpiar()
+        self.addCleanup(catalogos.limpiar)
+        self.proveedor = Proveedor.objects.create(nombre='Proveedor')
+        self.categoria = Categoria.objects.create(nombre='Categoria')
+        Marca.objects.create(nombre='Marca B')
+
+    def test_listado_desde_cache_con_etag_y_304(self):
+        primera = self.client.get('/api/marcas/')
+        self.assertEqual([m['nombre'] for m in primera.data], ['Marca B'])
+        with self.assertNumQueries(0):
+            repetida = self.client.get('/api/marcas/', HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(repetida.status_code, 304)
+        self.assertEqual(repetida['ETag'], primera['ETag'])
+
+    def test_un_cambio_invalida_el_catalogo(self):
+        etag = self.client.get('/api/marcas/')['ETag']
+        Marca.objects.create(nombre='Marca A')
+        respuesta = self.client.get('/api/marcas/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        self.assertEqual([m['nombre'] for m in respuesta.data], ['Marca A', 'Marca B'])
+
+        Marca.objects.get(nombre='Marca A').delete()
+        self.assertEqual([m['nombre'] for m in self.client.get('/api/marcas/').data], ['Marca B'])
+
+    def test_validacion_de_relaciones_sin_consultar_catalogos(self):
+        datos = {'nombre': 'Producto', 'proveedor': self.proveedor.pk, 'categoria': self.categoria.pk}
+        self.client.post('/api/productos/', datos) # Llena el caché
+        # Solo la referencia (BEGIN, UPDATE y SELECT de la secuencia, COMMIT), el INSERT y el
+        # documento de búsqueda (BEGIN, INSERT ... ON CONFLICT, COMMIT): proveedor y categoría
+        # no se consultan
+        with self.assertNumQueries(8):
+            respuesta = self.client.post('/api/productos/', datos)
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(Producto.objects.count(), 2)
+
+    def test_id_inexistente_sigue_siendo_un_error(self):
+        respuesta = self.client.post('/api/productos/', {'nombre': 'Producto', 'proveedor': 999, 'categoria': self.categoria.pk})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('proveedor', respuesta.data)
+
+    @override_settings(CATALOGOS_CACHE_ALIAS='default',
+                       CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_cache_compartido_entre_procesos(self):
+        etag = self.client.get('/api/marcas/')['ETag']
+        catalogos.limpiar() # Otro proceso: memoria vacía, mismo caché compartido
+        with self.assertNumQueries(0):
+            respuesta = self.client.get('/api/marcas/')
+        self.assertEqual(respuesta['ETag'], etag)
+
+
+@override_settings(CATALOGOS_CACHE_REVALIDAR_SEGUNDOS=3600)
+class ListadosConsultasCatalogosTest(TestCase):
+    """
+    Los listados de catálogos hacen las mismas consultas con pocas o muchas filas (sin N+1).
+    """
+    LISTADOS = ['/api/proveedores/', '/api/marcas/', '/api/categorias/', '/api/formas_pago/']
+
+    def setUp(self):
+        catalogos.limpiar()
+        versiones.limpiar()
+        self.addCleanup(catalogos.limpiar)
+        self.addCleanup(versiones.limpiar)
+        self.creados = 0
+
+    def _agregar(self, cantidad):
+        for _ in range(cantidad):
+            i = self.creados = self.creados + 1
+            Proveedor.objects.create(nombre=f'Proveedor {i}')
+            Marca.objects.create(nombre=f'Marca {i}')
+            Categoria.objects.create(nombre=f'Categoria {i}')
+            FormaPago.objects.create(metodo=f'Forma {i}')
+
+    def _consultas(self, url):
+        self.client.get(url) # Las versiones de las tablas quedan recordadas en ambas mediciones
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200, url)
+        return len(consultas)
+
+    def test_consultas_no_crecen_con_las_filas(self):
+        self._agregar(2)
+        pocas = {url: self._consultas(url) for url in self.LISTADOS}
+        self._agregar(5)
+        for url in self.LISTADOS:
+            with self.subTest(url=url):
+                self.assertEqual(self._consultas(url), pocas[url])
+
@@ -0,0 +1,98 @@
+# uglobals/versiones.py
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+
+from .models import Secuencia
+from .secuencias import reservar
+
+# Versión por tabla: la secuencia 'version:<app.modelo>' sube después de cada commit que
+# modifica la tabla (receivers post_save/post_delete en los models.py de cada app). Sirve
+# para cachear o validar respuestas (ETag) de tablas pequeñas sin recorrerlas. Si se revierte
+# la transacción la tabla no cambió y la versión tampoco.
+# Con CATALOGOS_CACHE_ALIAS la versión también se publica en ese caché compartido, así los
+# demás procesos la leen de allí en vez de la base de datos.
+
+_lock = threading.Lock()
+_memoria = {} # tabla -> (versión, momento hasta el que vale sin volver a mirarla)
+
+
+def _nombre(modelo):
+    return f'version:{modelo._meta.label_lower}'
+
+
+def _cache_compartido():
+    alias = settings.CATALOGOS_CACHE_ALIAS
+    return caches[alias] if alias else None
+
+
+def actual(modelo):
+    """
+    Versión vigente de la tabla, leída del caché compartido o de la base de datos.
+    """
+    return actuales([modelo])[modelo]
+
+
+def actuales(modelos):
+    """
+    Versiones vigentes de varias tablas ({modelo: versión}) con una sola lectura del caché
+    compartido y, para las que falten, una sola consulta.
+    """
+    nombres = {_nombre(modelo): modelo for modelo in modelos}
+    compartido = _cache_compartido()
+    valores = compartido.get_many(list(nombres)) if compartido else {}
+    faltantes = [nombre for nombre in nombres if nombre not in valores]
+    if faltantes:
+        leidos = dict(Secuencia.objects.filter(nombre__in=faltantes).values_list('nombre', 'valor'))
+        leidos = {nombre: leidos.get(nombre, 0) for nombre in faltantes}
+        if compartido and not connection.in_atomic_block:
+            for nombre, valor in leidos.items():
+                compartido.add(nombre, valor, timeout=None)
+        valores.update(leidos)
+    return {modelo: valores[nombre] for nombre, modelo in nombres.items()}
+
+
+def version(modelo):
+    """
+    Como actual(), pero recordada en el proceso durante CATALOGOS_CACHE_REVALIDAR_SEGUNDOS:
+    un cambio hecho por otro proceso se ve como mucho con ese retraso.
+    """
+    nombre = _nombre(modelo)
+    ahora = time.monotonic()
+    with _lock:
+        memorizada = _memoria.get(nombre)
+    if memorizada and memorizada[1] > ahora:
+        return memorizada[0]
+    valor = actual(modelo)
+    with _lock:
+        _memoria[nombre] = (valor, ahora + settings.CATALOGOS_CACHE_REVALIDAR_SEGUNDOS)
+    return valor
+
+
+def invalidar(modelo):
+    """
+    Sube la versión de la tabla cuando la transacción actual se confirma.
+    """
+    transaction.on_commit(lambda: _subir(modelo))
+
+
+def _subir(modelo):
+    nombre = _nombre(modelo)
+    nueva = reservar(nombre)[0]
+    compartido = _cache_compartido()
+    if compartido:
+        compartido.set(nombre, nueva, timeout=None)
+    with _lock:
+        _memoria.pop(nombre, None)
+
+
+def limpiar():
+    """
+    Olvida las versiones recordadas por este proceso (útil en pruebas, donde la base de
+    datos se reinicia y las versiones vuelven a empezar).
+    """
+    with _lock:
+        _memoria.clear()
@@ -2,20 +2,24 @@
 from rest_framework import viewsets
 from .models import Proveedor, Marca, Categoria, FormaPago # Importa modelos desde su propio models.py
 from .serializers import ProveedorSerializer,MarcaSerializer, CategoriaSerializer, FormaPagoSerializer # Importa serializadores
+from .catalogos import CatalogoCacheadoMixin
+from .condicional import GetCondicionalMixin
 
-class ProveedorViewSet(viewsets.ModelViewSet):
+# Los listados salen del caché de catálogos con ETag/304 (ver catalogos.py); el detalle
+# responde GET condicionales con la versión de la tabla (condicional.py)
+class ProveedorViewSet(CatalogoCacheadoMixin, GetCondicionalMixin, viewsets.ModelViewSet):
     queryset = Proveedor.objects.all().order_by('nombre')
     serializer_class = ProveedorSerializer
 
-class MarcaViewSet(viewsets.ModelViewSet):
+class MarcaViewSet(CatalogoCacheadoMixin, GetCondicionalMixin, viewsets.ModelViewSet):
     queryset = Marca.objects.all().order_by('nombre')
     serializer_class = MarcaSerializer
 
-class CategoriaViewSet(viewsets.ModelViewSet):
+class CategoriaViewSet(CatalogoCacheadoMixin, GetCondicionalMixin, viewsets.ModelViewSet):
     queryset = Categoria.objects.all().order_by('nombre')
     serializer_class = CategoriaSerializer
 
-class FormaPagoViewSet(viewsets.ModelViewSet):
+class FormaPagoViewSet(CatalogoCacheadoMixin, GetCondicionalMixin, viewsets.ModelViewSet):
     queryset = FormaPago.objects.all().order_by('metodo')
     serializer_class = FormaPagoSerializer
    
\ No newline at end of file
@@ -1,6 +1,9 @@
 # users/models.py
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager # <-- IMPORTA ESTOS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from uglobals import versiones
 
 # Manager personalizado para tu modelo Usuario
 class UsuarioManager(BaseUserManager):
@@ -92,4 +95,16 @@ class Usuario(AbstractBaseUser, PermissionsMixin): # <--- HEREDA DE ESTOS DOS
         # Simplificado: Un superusuario tiene permisos para todos los módulos
         if self.is_active and self.is_superuser:
             return True
-        return False
\ No newline at end of file
+        return False
+
+
+# Roles, permisos y usuarios son tablas pequeñas: la API las valida (ETag) con su versión
+# (uglobals/versiones.py), que sube con cada cambio.
+@receiver(post_save, sender=Rol)
+@receiver(post_delete, sender=Rol)
+@receiver(post_save, sender=Permiso)
+@receiver(post_delete, sender=Permiso)
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def invalidar_version_usuarios(sender, **kwargs):
+    versiones.invalidar(sender)
@@ -0,0 +1,43 @@
+# users/tests.py
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from uglobals import versiones
+from users.models import Permiso, Rol, Usuario
+
+
+@override_settings(CATALOGOS_CACHE_REVALIDAR_SEGUNDOS=3600)
+class ListadosConsultasUsuarioTest(TestCase):
+    """
+    Roles, permisos y usuarios hacen las mismas consultas con pocas o muchas filas (sin N+1).
+    """
+    LISTADOS = ['/api/roles/', '/api/permisos/', '/api/usuarios/']
+
+    def setUp(self):
+        versiones.limpiar()
+        self.addCleanup(versiones.limpiar)
+        self.creados = 0
+
+    def _agregar(self, cantidad):
+        # Cada vuelta suma un rol con dos permisos y un usuario con ese rol
+        for _ in range(cantidad):
+            i = self.creados = self.creados + 1
+            rol = Rol.objects.create(nombre=f'Rol {i}')
+            Permiso.objects.bulk_create([Permiso(nombre=f'permiso {i}.{j}', rol=rol) for j in range(2)])
+            Usuario.objects.create_user(f'cajero{i}', f'cajero{i}@keeplic.com', 'clave', rol=rol)
+
+    def _consultas(self, url):
+        self.client.get(url) # Las versiones de las tablas quedan recordadas en ambas mediciones
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200, url)
+        return len(consultas)
+
+    def test_consultas_no_crecen_con_las_filas(self):
+        self._agregar(2)
+        pocas = {url: self._consultas(url) for url in self.LISTADOS}
+        self._agregar(5)
+        for url in self.LISTADOS:
+            with self.subTest(url=url):
+                self.assertEqual(self._consultas(url), pocas[url])
@@ -6,25 +6,30 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated # Puedes descomentar y usar estas líneas más adelante para controlar el acceso a los ViewSets
 
 from .models import Rol, Permiso, Usuario # Importa modelos desde su propio models.py
+from uglobals.condicional import GetCondicionalMixin
 # Importa tus serializadores, incluyendo el personalizado para JWT:
 from .serializers import RolSerializer, PermisoSerializer, UsuarioSerializer, MyTokenObtainPairSerializer # <--- IMPORTA MyTokenObtainPairSerializer
 
+# Los tres ViewSet responden GET condicionales (ETag/304) con la versión de sus tablas
 # ViewSet para la gestión de Roles (CRUD)
-class RolViewSet(viewsets.ModelViewSet):
+class RolViewSet(GetCondicionalMixin, viewsets.ModelViewSet):
     queryset = Rol.objects.all().order_by('nombre')
     serializer_class = RolSerializer
     # permission_classes = [IsAdminUser] # Ejemplo: solo administradores pueden gestionar roles
 
 # ViewSet para la gestión de Permisos (CRUD)
-class PermisoViewSet(viewsets.ModelViewSet):
-    queryset = Permiso.objects.all().order_by('nombre')
+class PermisoViewSet(GetCondicionalMixin, viewsets.ModelViewSet):
+    queryset = Permiso.objects.select_related('rol').order_by('nombre') # El rol sale anidado
     serializer_class = PermisoSerializer
+    modelos_relacionados = (Rol,)
     # permission_classes = [IsAdminUser] # Ejemplo: solo administradores pueden gestionar permisos
 
 # ViewSet para la gestión de Usuarios (CRUD)
-class UsuarioViewSet(viewsets.ModelViewSet):
-    queryset = Usuario.objects.all().order_by('username')
+class UsuarioViewSet(GetCondicionalMixin, viewsets.ModelViewSet):
+    # rol_nombre y rol_data (el rol con sus permisos) salen de una sola carga por listado
+    queryset = Usuario.objects.select_related('rol').prefetch_related('rol__permisos').order_by('username')
     serializer_class = UsuarioSerializer
+    modelos_relacionados = (Rol, Permiso)
     # permission_classes = [IsAuthenticated, IsAdminUser] # Ejemplo: solo administradores autenticados pueden gestionar usuarios
 
 # Vista personalizada para el endpoint de inicio de sesión JWT